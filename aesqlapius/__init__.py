@@ -20,22 +20,69 @@
 
 import functools
 import importlib
+from concurrent.futures import Executor
 from typing import (
     Any,
+    List,
     Literal,
     Optional,
+    Sequence,
     TypeVar,
     Union,
     overload
 )
 
+from aesqlapius.batched import (
+    check_batch_method,
+    generate_batched_method,
+    get_batched_settings
+)
+from aesqlapius.cache import (
+    AbstractCacheStore,
+    CacheRegistry,
+    MemoryCacheStore,
+    ResultCache,
+    generate_cached_method,
+    generate_invalidating_method,
+    get_cache_settings,
+    get_invalidated_tags
+)
+from aesqlapius.executor import (
+    generate_executor_iterator_method,
+    generate_executor_method,
+    get_executor_chunk_size
+)
 from aesqlapius.hook import QueryHook, default_query_hook
+from aesqlapius.inlist import generate_in_list_hook
+from aesqlapius.memo import clear_memo, generate_memoized_method, is_memoizable
+from aesqlapius.memo import memo_scope as memo_scope
 from aesqlapius.namespace import Namespace as Namespace
 from aesqlapius.namespace import inject_method
+from aesqlapius.parallel import ParallelRunner, get_pool_size
+from aesqlapius.pool import is_connection_pool
 from aesqlapius.querydir import iter_queries
+from aesqlapius.replicas import (
+    ReplicaSet,
+    generate_replicated_methods,
+    generate_write_marking_method
+)
+from aesqlapius.sharding import (
+    ShardedMethodGenerator,
+    ShardRouter,
+    default_shard_router
+)
+from aesqlapius.singleflight import (
+    generate_singleflight_method,
+    is_singleflight
+)
+from aesqlapius.snapshot import generate_snapshot_method, get_snapshot_settings
+from aesqlapius.writebehind import (
+    generate_write_behind_method,
+    get_write_behind_settings
+)
 
 
-__all__ = ['Namespace', 'generate_api']
+__all__ = ['Namespace', 'generate_api', 'memo_scope']
 
 __version__ = '0.0.9'
 
@@ -45,6 +92,12 @@ NAMESPACE_MODE = Literal['dirs', 'files', 'flat']
 DRIVER = Literal['psycopg2', 'sqlite3', 'mysql', 'aiopg']
 
 
+def _resolve_method(root: Any, path: List[str]) -> Any:
+    for name in path:
+        root = getattr(root, name)
+    return root
+
+
 @overload
 def generate_api(
     path: str,
@@ -55,6 +108,12 @@ def generate_api(
     namespace_mode: NAMESPACE_MODE = 'dirs',
     namespace_root: str = '__init__',
     hook: Optional[QueryHook] = None,
+    cache_store: Optional[AbstractCacheStore] = None,
+    executor: Optional[Executor] = None,
+    shards: Optional[Sequence[Any]] = None,
+    shard_router: Optional[ShardRouter] = None,
+    replicas: Optional[Sequence[Any]] = None,
+    read_your_writes: float = 1.0,
 ) -> Namespace:
     ...  # pragma: no cover
 
@@ -70,6 +129,12 @@ def generate_api(
     namespace_mode: NAMESPACE_MODE = 'dirs',
     namespace_root: str = '__init__',
     hook: Optional[QueryHook] = None,
+    cache_store: Optional[AbstractCacheStore] = None,
+    executor: Optional[Executor] = None,
+    shards: Optional[Sequence[Any]] = None,
+    shard_router: Optional[ShardRouter] = None,
+    replicas: Optional[Sequence[Any]] = None,
+    read_your_writes: float = 1.0,
 ) -> T:
     ...  # pragma: no cover
 
@@ -84,6 +149,12 @@ def generate_api(
     namespace_mode: NAMESPACE_MODE = 'dirs',
     namespace_root: str = '__init__',
     hook: Optional[QueryHook] = None,
+    cache_store: Optional[AbstractCacheStore] = None,
+    executor: Optional[Executor] = None,
+    shards: Optional[Sequence[Any]] = None,
+    shard_router: Optional[ShardRouter] = None,
+    replicas: Optional[Sequence[Any]] = None,
+    read_your_writes: float = 1.0,
 ) -> Union[T, Namespace]:
     ns: Union[T, Namespace]
     if target is None:
@@ -94,7 +165,44 @@ def generate_api(
     if hook is None:
         hook = default_query_hook
 
+    if cache_store is None:
+        cache_store = MemoryCacheStore()
+
     driver_module = importlib.import_module(f'aesqlapius.drivers.{driver}')
+    is_async = driver_module.IS_ASYNC
+
+    if executor is not None:
+        if is_async:
+            raise TypeError(f'executor is not supported by asynchronous {driver} driver')
+        is_async = True  # methods are converted to coroutines below
+
+    sharded_generator = None
+    if shards is not None:
+        if db is not None:
+            raise TypeError('db and shards are mutually exclusive')
+        # fan-out mode is defined by the driver, not by the executor
+        sharded_generator = ShardedMethodGenerator(shards, shard_router or default_shard_router, driver_module.IS_ASYNC)
+    elif shard_router is not None:
+        raise TypeError('shard_router requires shards')
+
+    replica_set = None
+    if replicas is not None:
+        if db is None:
+            raise TypeError('replicas require primary database connection to be passed as db')
+        replica_set = ReplicaSet(db, replicas, read_your_writes)
+
+    # methods have either a connection or a set of shards bound
+    is_bound = db is not None or shards is not None
+
+    # background writers and refreshers require connections which are
+    # not shared with callers
+    is_pool = getattr(driver_module, 'is_pool', is_connection_pool)
+    is_pooled = is_bound and all(is_pool(conn) for conn in (shards if shards is not None else [db]))
+
+    cache_registry = CacheRegistry()
+
+    func_defs = {}
+    batched_methods = []
 
     for entry, queries in iter_queries(path, extension):
         if namespace_mode == 'flat':
@@ -105,12 +213,95 @@ def generate_api(
             namespace_path = entry.namespace_path[:-1]
 
         for query in queries:
-            method_func = driver_module.generate_method(query, hook)
+            query_hook = generate_in_list_hook(query.func_def, hook, driver_module.IN_LIST_STYLE)
+            method_func = driver_module.generate_method(query, query_hook)
+            variants = driver_module.generate_variants(query, query_hook)
 
-            if db is not None:
+            if db is not None and replica_set is None:
                 method_func = functools.partial(method_func, db)
+                variants = {name: functools.partial(variant, db) for name, variant in variants.items()}
+            elif sharded_generator is not None:
+                method_func, variants = sharded_generator.generate(query.func_def, method_func, variants)
+
+            if executor is not None:
+                if (chunk_size := get_executor_chunk_size(query.func_def)) is not None:
+                    method_func = generate_executor_iterator_method(method_func, executor, chunk_size)
+                else:
+                    method_func = generate_executor_method(method_func, executor)
+                variants = {name: generate_executor_method(variant, executor) for name, variant in variants.items()}
+
+            # applied after the executor conversion, so writes are
+            # recorded in the context of the caller
+            if replica_set is not None:
+                method_func, variants = generate_replicated_methods(replica_set, query.func_def, method_func, variants)
+
+            if invalidated_tags := get_invalidated_tags(query.func_def):
+                invalidate = functools.partial(cache_registry.invalidate, invalidated_tags)
+                method_func = generate_invalidating_method(invalidate, method_func, is_async)
+                variants = {name: generate_invalidating_method(invalidate, variant, is_async) for name, variant in variants.items()}
+
+            if is_singleflight(query.func_def, is_async):
+                if not is_bound:
+                    raise TypeError(f'{query.func_def.name}: @singleflight requires database connection to be passed to generate_api')
+                method_func = generate_singleflight_method(query.func_def, method_func)
+
+            if (batched_settings := get_batched_settings(query.func_def, is_async)) is not None:
+                if not is_bound:
+                    raise TypeError(f'{query.func_def.name}: @batched requires database connection to be passed to generate_api')
+                # the batch method may be defined later, so it's resolved on first call
+                batch_method_path = namespace_path + [batched_settings.method]
+                method_func = generate_batched_method(query.func_def, batched_settings, method_func, functools.partial(_resolve_method, ns, batch_method_path))
+                batched_methods.append((query.func_def, batched_settings, tuple(batch_method_path)))
+
+            if (cache_settings := get_cache_settings(query.func_def)) is not None:
+                if not is_bound:
+                    raise TypeError(f'{query.func_def.name}: @cached requires database connection to be passed to generate_api')
+                cache_backend = cache_store.create_backend('.'.join(namespace_path + [query.func_def.name]), cache_settings)
+                cache = ResultCache(query.func_def, cache_settings, cache_backend)
+                cache_registry.register(cache, cache_settings.tags)
+                method_func = generate_cached_method(cache, method_func, is_async)
+                variants['cache_info'] = cache.info
+                variants['cache_clear'] = cache.clear
+
+            if (write_behind_settings := get_write_behind_settings(query.func_def)) is not None:
+                if not is_pooled:
+                    raise TypeError(f'{query.func_def.name}: @write_behind requires connection pool to be passed to generate_api')
+                if shards is not None:
+                    # a failed batch may be partially committed on some
+                    # shards, so it cannot be safely retried row by row
+                    raise TypeError(f'{query.func_def.name}: @write_behind is not supported for sharded APIs')
+                method_func, variants['flush'], variants['stop'] = generate_write_behind_method(query.func_def, write_behind_settings, variants['many'], is_async)
+                if replica_set is not None:
+                    # batch is written in the background, so the write
+                    # is marked in the context of the caller when queued
+                    method_func = generate_write_marking_method(replica_set, method_func)
+
+            if (snapshot_settings := get_snapshot_settings(query.func_def)) is not None:
+                if not is_bound:
+                    raise TypeError(f'{query.func_def.name}: @snapshot requires database connection to be passed to generate_api')
+                listen = getattr(driver_module, 'listen', None)
+                if snapshot_settings.channel is not None and listen is None:
+                    raise TypeError(f'{query.func_def.name}: @snapshot channel is not supported by {driver} driver')
+                if (snapshot_settings.interval is not None or snapshot_settings.channel is not None) and not is_pooled:
+                    raise TypeError(f'{query.func_def.name}: @snapshot background refresh requires connection pool to be passed to generate_api')
+                if snapshot_settings.channel is not None and db is None:
+                    raise TypeError(f'{query.func_def.name}: @snapshot channel is not supported for sharded APIs')
+                method_func, variants['refresh'], variants['stop'], variants['snapshot_info'] = generate_snapshot_method(
+                    snapshot_settings, method_func, is_async, None if listen is None or db is None else functools.partial(listen, db)
+                )
+
+            if is_bound and snapshot_settings is None:
+                if query.func_def.returns is None or invalidated_tags:
+                    method_func = generate_invalidating_method(clear_memo, method_func, is_async)
+                    variants = {name: generate_invalidating_method(clear_memo, variant, is_async) for name, variant in variants.items()}
+                elif is_memoizable(query.func_def):
+                    method_func = generate_memoized_method(query.func_def, method_func, is_async)
 
             method_func.aesqlapius_method = True
+            method_func.aesqlapius_variants = tuple(variants.keys())
+
+            for name, variant in variants.items():
+                setattr(method_func, name, variant)
 
             inject_method(
                 ns,
@@ -118,4 +309,23 @@ def generate_api(
                 method_func
             )
 
+            func_defs[tuple(namespace_path + [query.func_def.name])] = query.func_def
+
+    # connection pinning scopes for asynchronous drivers, only useful
+    # with pools, as a plain connection is always the same one
+    if target is None and db is not None and hasattr(driver_module, 'pin_connection') and is_pool(db):
+        inject_method(ns, ['connection'], functools.partial(driver_module.pin_connection, db))
+        inject_method(ns, ['transaction'], functools.partial(driver_module.pin_transaction, db))
+
+    # replica health status
+    if target is None and replica_set is not None:
+        inject_method(ns, ['replicas'], replica_set)
+
+    # parallel execution of calls for synchronous drivers over a pool
+    if target is None and db is not None and not is_async and is_connection_pool(db):
+        inject_method(ns, ['parallel'], ParallelRunner(ns, get_pool_size(db)))
+
+    for func_def, batched_settings, batch_path in batched_methods:
+        check_batch_method(func_def, batched_settings, func_defs.get(batch_path))
+
     return ns
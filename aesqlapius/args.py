@@ -18,12 +18,25 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from typing import Any, Dict, Iterator, List, Tuple
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple
+)
 
 from aesqlapius.function_def import ArgumentDefinition, FunctionDefinition
 
+DEFAULT_BATCH_PAGE_SIZE = 1000
 
-def _iter_args(func_def: FunctionDefinition, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Iterator[Tuple[ArgumentDefinition, Any]]:
+
+def _iter_args(func_def: FunctionDefinition, args: Tuple[Any, ...], kwargs: Mapping[str, Any]) -> Iterator[Tuple[ArgumentDefinition, Any]]:
     for narg, arg in enumerate(func_def.args):
         value: Any = None
         if narg < len(args):
@@ -40,9 +53,115 @@ def _iter_args(func_def: FunctionDefinition, args: Tuple[Any, ...], kwargs: Dict
         yield arg, value
 
 
-def prepare_args_as_dict(func_def: FunctionDefinition, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+def prepare_args_as_dict(func_def: FunctionDefinition, args: Tuple[Any, ...], kwargs: Mapping[str, Any]) -> Dict[str, Any]:
     return {arg.name: value for arg, value in _iter_args(func_def, args, kwargs)}
 
 
-def prepare_args_as_list(func_def: FunctionDefinition, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> List[Any]:
+def prepare_args_as_list(func_def: FunctionDefinition, args: Tuple[Any, ...], kwargs: Mapping[str, Any]) -> List[Any]:
     return [value for arg, value in _iter_args(func_def, args, kwargs)]
+
+
+def prepare_args_as_key(func_def: FunctionDefinition, args: Tuple[Any, ...], kwargs: Mapping[str, Any]) -> Optional[Hashable]:
+    key = tuple(prepare_args_as_list(func_def, args, kwargs))
+    try:
+        hash(key)
+    except TypeError:
+        return None  # unhashable arguments
+    return key
+
+
+def iter_batch_args_as_dicts(func_def: FunctionDefinition, batch: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    for item in batch:
+        if isinstance(item, Mapping):
+            yield prepare_args_as_dict(func_def, (), item)
+        else:
+            yield prepare_args_as_dict(func_def, tuple(item), {})
+
+
+def iter_batch_args_as_lists(func_def: FunctionDefinition, batch: Iterable[Any]) -> Iterator[List[Any]]:
+    for item in batch:
+        if isinstance(item, Mapping):
+            yield prepare_args_as_list(func_def, (), item)
+        else:
+            yield prepare_args_as_list(func_def, tuple(item), {})
+
+
+def iter_chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def is_columnar(func_def: FunctionDefinition) -> bool:
+    if (decorator := func_def.decorators.get('columnar')) is None:
+        return False
+
+    if func_def.returns is not None:
+        raise TypeError(f'{func_def.name}: @columnar is only supported for methods returning None')
+
+    if decorator.args or decorator.kwargs:
+        raise TypeError(f'{func_def.name}: @columnar does not accept arguments')
+
+    return True
+
+
+def _to_list(values: Any) -> List[Any]:
+    # NumPy arrays and alike are converted into lists of Python scalars
+    if (tolist := getattr(values, 'tolist', None)) is not None:
+        return list(tolist())
+    return list(values)
+
+
+def _iter_columnar_chunks(func_def: FunctionDefinition, columns: Mapping[str, Any], size: int) -> Iterator[List[List[Any]]]:
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError(f'{func_def.name} got columns of different lengths')
+    length = lengths.pop() if lengths else 0
+
+    for arg in func_def.args:
+        if arg.name not in columns and not arg.has_default:
+            raise TypeError(f"{func_def.name} missing required argument '{arg.name}'")
+
+    for start in range(0, length, size):
+        chunk_length = min(size, length - start)
+        yield [
+            _to_list(columns[arg.name][start:start + chunk_length]) if arg.name in columns else [arg.default] * chunk_length
+            for arg in func_def.args
+        ]
+
+
+def iter_batch_chunks_as_dicts(func_def: FunctionDefinition, batch: Any, size: int) -> Iterator[List[Dict[str, Any]]]:
+    # batch is either an iterable of rows (sequences of positional or
+    # mappings of keyword arguments), or a mapping of argument names
+    # to sliceable columns of values
+    if isinstance(batch, Mapping):
+        names = [arg.name for arg in func_def.args]
+        for columns in _iter_columnar_chunks(func_def, batch, size):
+            # DB-API drivers only accept dicts for named parameters, but
+            # these are built from transposed column chunks at C speed
+            yield [dict(zip(names, row)) for row in zip(*columns)]
+    else:
+        yield from iter_chunks(iter_batch_args_as_dicts(func_def, batch), size)
+
+
+def iter_batch_chunks_as_lists(func_def: FunctionDefinition, batch: Any, size: int) -> Iterator[List[Sequence[Any]]]:
+    if isinstance(batch, Mapping):
+        for columns in _iter_columnar_chunks(func_def, batch, size):
+            yield list(zip(*columns))
+    else:
+        yield from iter_chunks(iter_batch_args_as_lists(func_def, batch), size)
+
+
+def iter_batch_chunks_as_columns(func_def: FunctionDefinition, batch: Any, size: int) -> Iterator[Dict[str, List[Any]]]:
+    names = [arg.name for arg in func_def.args]
+    if isinstance(batch, Mapping):
+        for columns in _iter_columnar_chunks(func_def, batch, size):
+            yield dict(zip(names, columns))
+    else:
+        for rows in iter_chunks(iter_batch_args_as_lists(func_def, batch), size):
+            yield {name: list(column) for name, column in zip(names, zip(*rows))}
@@ -0,0 +1,145 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+from aesqlapius.args import prepare_args_as_list
+from aesqlapius.function_def import FunctionDefinition, ReturnValueOuterFormat
+from aesqlapius.pinning import create_unpinned_task, is_pinned
+
+
+@dataclass
+class BatchedSettings:
+    method: str
+    max_batch: Optional[int] = None
+
+
+def get_batched_settings(func_def: FunctionDefinition, is_async: bool) -> Optional[BatchedSettings]:
+    if (decorator := func_def.decorators.get('batched')) is None:
+        return None
+
+    if not is_async:
+        raise TypeError(f'{func_def.name}: @batched is only supported for asynchronous drivers')
+
+    if func_def.returns is None or func_def.returns.outer_format != ReturnValueOuterFormat.SINGLE:
+        raise TypeError(f'{func_def.name}: @batched is only supported for methods returning Single')
+
+    if len(func_def.args) != 1:
+        raise TypeError(f'{func_def.name}: @batched method must have single argument')
+
+    settings = BatchedSettings(*decorator.args, **decorator.kwargs)
+
+    if not isinstance(settings.method, str) or (settings.max_batch is not None and settings.max_batch < 1):
+        raise TypeError(f'{func_def.name}: invalid @batched arguments')
+
+    return settings
+
+
+def check_batch_method(func_def: FunctionDefinition, settings: BatchedSettings, batch_func_def: Optional[FunctionDefinition]) -> None:
+    if batch_func_def is None:
+        raise TypeError(f"{func_def.name}: @batched method '{settings.method}' not found in the same namespace")
+
+    if batch_func_def.returns is None or batch_func_def.returns.outer_format != ReturnValueOuterFormat.DICT or len(batch_func_def.args) != 1:
+        raise TypeError(f"{func_def.name}: @batched method '{settings.method}' must have single argument and return Dict")
+
+
+class _BatchLoader:
+    # keys requested within an event loop iteration are deduplicated
+    # and passed to the batch method as a single list; callers get None
+    # for keys missing from the returned dict
+
+    def __init__(self, settings: BatchedSettings, get_batch_method: Callable[[], Callable[..., Any]]) -> None:
+        self._settings = settings
+        self._get_batch_method = get_batch_method
+        self._pending: Dict[Hashable, 'asyncio.Future[Any]'] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set['asyncio.Task[None]'] = set()
+
+    def load(self, key: Hashable) -> 'asyncio.Future[Any]':
+        loop = asyncio.get_running_loop()
+
+        if self._loop is not loop:
+            self._pending = {}
+            self._loop = loop
+
+        if (future := self._pending.get(key)) is None:
+            if not self._pending:
+                loop.call_soon(self._dispatch)
+            future = self._pending[key] = loop.create_future()
+
+        return future
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        keys = list(pending)
+        size = self._settings.max_batch or len(keys)
+
+        for offset in range(0, len(keys), size):
+            batch = {key: pending[key] for key in keys[offset:offset + size]}
+            task = create_unpinned_task(self._load_batch(batch))
+            # event loop only keeps weak references to tasks
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            # if the task is cancelled (possibly before it even starts),
+            # waiters must not be left hanging
+            task.add_done_callback(partial(_cancel_pending, batch))
+
+    async def _load_batch(self, batch: Dict[Hashable, 'asyncio.Future[Any]']) -> None:
+        try:
+            result = await self._get_batch_method()(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for key, future in batch.items():
+                if not future.done():
+                    future.set_result(result.get(key))
+
+
+def _cancel_pending(batch: Dict[Hashable, 'asyncio.Future[Any]'], task: 'asyncio.Task[None]') -> None:
+    for future in batch.values():
+        if not future.done():
+            future.cancel()
+
+
+def generate_batched_method(func_def: FunctionDefinition, settings: BatchedSettings, method_func: Callable[..., Any], get_batch_method: Callable[[], Callable[..., Any]]) -> Callable[..., Any]:
+    loader = _BatchLoader(settings, get_batch_method)
+
+    async def method_batched(*args: Any, **kwargs: Any) -> Any:
+        if is_pinned():
+            # pinned connection (and its transaction) is not to be
+            # shared with other callers
+            return await method_func(*args, **kwargs)
+
+        key = prepare_args_as_list(func_def, args, kwargs)[0]
+        try:
+            hash(key)
+        except TypeError:
+            return await method_func(*args, **kwargs)  # unhashable key cannot be batched
+
+        # shielded, so a cancelled caller does not affect other
+        # callers waiting for the same key
+        return await asyncio.shield(loader.load(key))
+
+    return method_batched
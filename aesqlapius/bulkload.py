@@ -0,0 +1,126 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+from aesqlapius.function_def import FunctionDefinition
+
+_CHUNK_ROWS = 100
+
+_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+})
+
+
+@dataclass
+class CopySettings:
+    table: str
+    columns: Optional[List[str]] = None
+    schema: Optional[str] = None
+
+
+def get_copy_settings(func_def: FunctionDefinition) -> Optional[CopySettings]:
+    if (decorator := func_def.decorators.get('copy_into')) is None:
+        return None
+
+    if func_def.returns is not None:
+        raise TypeError(f'{func_def.name}: @copy_into is only supported for methods returning None')
+
+    settings = CopySettings(*decorator.args, **decorator.kwargs)
+
+    if settings.columns is None:
+        settings.columns = [arg.name for arg in func_def.args]
+
+    if not settings.columns:
+        raise TypeError(f'{func_def.name}: @copy_into requires columns list or method arguments')
+
+    return settings
+
+
+def _encode_array_element(value: Any) -> str:
+    if value is None:
+        return 'NULL'
+    elif isinstance(value, list):
+        return _encode_array(value)
+    elif value is True:
+        return 't'
+    elif value is False:
+        return 'f'
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        text = '\\x' + bytes(value).hex()
+    elif isinstance(value, dict):
+        text = json.dumps(value)
+    else:
+        text = str(value)
+
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _encode_array(values: List[Any]) -> str:
+    return '{' + ','.join(map(_encode_array_element, values)) + '}'
+
+
+def encode_copy_value(value: Any) -> str:
+    if value is None:
+        return '\\N'
+    elif value is True:
+        return 't'
+    elif value is False:
+        return 'f'
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return '\\\\x' + bytes(value).hex()
+    elif isinstance(value, dict):
+        return json.dumps(value).translate(_ESCAPES)
+    elif isinstance(value, list):
+        return _encode_array(value).translate(_ESCAPES)
+    else:
+        return str(value).translate(_ESCAPES)
+
+
+def encode_copy_row(row: Sequence[Any]) -> str:
+    return '\t'.join(map(encode_copy_value, row)) + '\n'
+
+
+class CopyTextReader:
+    # file-like object encoding rows into COPY text format as it is read
+
+    def __init__(self, rows: Iterable[Sequence[Any]]) -> None:
+        self._rows: Optional[Iterator[Sequence[Any]]] = iter(rows)
+        self._buffer = ''
+
+    def read(self, size: int = -1) -> str:
+        while self._rows is not None and (size < 0 or len(self._buffer) < size):
+            if lines := [encode_copy_row(row) for row in islice(self._rows, _CHUNK_ROWS)]:
+                self._buffer += ''.join(lines)
+            else:
+                self._rows = None
+
+        if size < 0:
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+
+        return data
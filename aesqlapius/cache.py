@@ -0,0 +1,266 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple
+)
+
+from aesqlapius.args import prepare_args_as_key
+from aesqlapius.function_def import GENERATOR_FORMATS, FunctionDefinition
+
+
+@dataclass
+class CacheSettings:
+    ttl: Optional[float] = None
+    maxsize: int = 1024
+    tags: List[str] = field(default_factory=list)
+
+
+def get_cache_settings(func_def: FunctionDefinition) -> Optional[CacheSettings]:
+    if (decorator := func_def.decorators.get('cached')) is None:
+        return None
+
+    if func_def.returns is None or func_def.returns.outer_format in GENERATOR_FORMATS:
+        raise TypeError(f'{func_def.name}: @cached is not supported for methods returning None or iterators')
+
+    settings = CacheSettings(*decorator.args, **decorator.kwargs)
+
+    if settings.maxsize < 1 or (settings.ttl is not None and settings.ttl <= 0):
+        raise TypeError(f'{func_def.name}: invalid @cached limits')
+
+    return settings
+
+
+def get_invalidated_tags(func_def: FunctionDefinition) -> List[str]:
+    if (decorator := func_def.decorators.get('invalidates')) is None:
+        return []
+
+    if func_def.returns is not None and func_def.returns.outer_format in GENERATOR_FORMATS:
+        raise TypeError(f'{func_def.name}: @invalidates is not supported for methods returning iterators')
+
+    if not decorator.args or decorator.kwargs or not all(isinstance(tag, str) for tag in decorator.args):
+        raise TypeError(f'{func_def.name}: @invalidates requires one or more tag names')
+
+    return list(decorator.args)
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class AbstractCacheBackend(ABC):
+    @abstractmethod
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def put(self, key: Hashable, value: Any) -> None:
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass  # pragma: no cover
+
+
+class MemoryCacheBackend(AbstractCacheBackend):
+    # in-process LRU cache with optional expiration
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: OrderedDict[Hashable, Tuple[Optional[float], Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                return False, None
+
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return False, None
+
+            self._entries.move_to_end(key)
+            return True, value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        expires = None if self._ttl is None else time.monotonic() + self._ttl
+
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class AbstractCacheStore(ABC):
+    # factory of cache backends for individual methods
+
+    @abstractmethod
+    def create_backend(self, name: str, settings: CacheSettings) -> AbstractCacheBackend:
+        pass  # pragma: no cover
+
+
+class MemoryCacheStore(AbstractCacheStore):
+    def create_backend(self, name: str, settings: CacheSettings) -> AbstractCacheBackend:
+        return MemoryCacheBackend(settings.maxsize, settings.ttl)
+
+
+class ResultCache:
+    # cached values are returned as is, so all callers share the same
+    # object; generation is bumped on each invalidation, so results of
+    # queries started before it (possibly stale) are not stored
+
+    def __init__(self, func_def: FunctionDefinition, settings: CacheSettings, backend: AbstractCacheBackend) -> None:
+        self._func_def = func_def
+        self._settings = settings
+        self._backend = backend
+        self._hits = 0
+        self._misses = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Optional[Hashable]:
+        return prepare_args_as_key(self._func_def, args, kwargs)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        found, value = self._backend.get(key)
+        with self._lock:
+            if found:
+                self._hits += 1
+            else:
+                self._misses += 1
+        return found, value
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def put(self, key: Hashable, value: Any, generation: int) -> None:
+        with self._lock:
+            if generation == self._generation:
+                self._backend.put(key, value)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self._hits, self._misses, self._settings.maxsize, len(self._backend))
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+        self._backend.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._hits = 0
+            self._misses = 0
+        self._backend.clear()
+
+
+class CacheRegistry:
+    def __init__(self) -> None:
+        self._caches: Dict[str, List[ResultCache]] = defaultdict(list)
+
+    def register(self, cache: ResultCache, tags: List[str]) -> None:
+        for tag in tags:
+            self._caches[tag].append(cache)
+
+    def invalidate(self, tags: List[str]) -> None:
+        for tag in tags:
+            for cache in self._caches.get(tag, []):
+                # counters are kept, so these describe the whole
+                # lifetime of the cache and not the time since the
+                # last write
+                cache.invalidate()
+
+
+def generate_cached_method(cache: ResultCache, method_func: Callable[..., Any], is_async: bool) -> Callable[..., Any]:
+    if is_async:
+        async def method_cached_async(*args: Any, **kwargs: Any) -> Any:
+            if (key := cache.make_key(args, kwargs)) is None:
+                return await method_func(*args, **kwargs)
+
+            generation = cache.generation
+            found, value = cache.get(key)
+            if not found:
+                value = await method_func(*args, **kwargs)
+                cache.put(key, value, generation)
+            return value
+
+        return method_cached_async
+
+    else:
+        def method_cached(*args: Any, **kwargs: Any) -> Any:
+            if (key := cache.make_key(args, kwargs)) is None:
+                return method_func(*args, **kwargs)
+
+            generation = cache.generation
+            found, value = cache.get(key)
+            if not found:
+                value = method_func(*args, **kwargs)
+                cache.put(key, value, generation)
+            return value
+
+        return method_cached
+
+
+def generate_invalidating_method(invalidate: Callable[[], None], method_func: Callable[..., Any], is_async: bool) -> Callable[..., Any]:
+    if is_async:
+        async def method_invalidating_async(*args: Any, **kwargs: Any) -> Any:
+            result = await method_func(*args, **kwargs)
+            invalidate()
+            return result
+
+        return method_invalidating_async
+
+    else:
+        def method_invalidating(*args: Any, **kwargs: Any) -> Any:
+            result = method_func(*args, **kwargs)
+            invalidate()
+            return result
+
+        return method_invalidating
@@ -18,28 +18,205 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from contextlib import AsyncExitStack
-from typing import Any, AsyncIterator, Callable, Dict
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple
+)
 
 import aiopg
+import psycopg2.extensions
 
 from aesqlapius.asyncmethod import (
     AbstractDriverDetail,
-    generate_method_generic
+    generate_method_generic,
+    generate_variants_generic
+)
+from aesqlapius.drivers.psycopg2 import (
+    disable_json_decoding,
+    generate_cursor_name,
+    split_values_clause
 )
-from aesqlapius.hook import QueryHook
+from aesqlapius.hook import QueryPreparer
+from aesqlapius.inlist import InListStyle
+from aesqlapius.pinning import get_pinned_connection, pin
 from aesqlapius.query import Query
+from aesqlapius.staging import StageSettings
+
+
+class _ServerSideCursor:
+    # aiopg does not support named cursors, so these are emulated
+    # with explicit DECLARE and FETCH statements
+
+    def __init__(self, cur: aiopg.Cursor) -> None:
+        self._cur = cur
+        self._name = generate_cursor_name()
+        self._own_transaction = False
+
+    @property
+    def cursor(self) -> aiopg.Cursor:
+        return self._cur
+
+    @property
+    def description(self) -> Any:
+        return self._cur.description
+
+    async def execute(self, operation: str, parameters: Any = None) -> None:
+        if self._cur.raw.connection.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            await self._cur.execute('BEGIN')
+            self._own_transaction = True
+
+        await self._cur.execute(f'DECLARE {self._name} NO SCROLL CURSOR FOR {operation}', parameters)
+
+        # fetches no rows, but fills cursor description
+        await self._cur.execute(f'FETCH FORWARD 0 FROM {self._name}')
+
+    async def fetchmany(self, size: Optional[int] = None) -> List[Any]:
+        await self._cur.execute(f'FETCH FORWARD {size or self._cur.arraysize} FROM {self._name}')
+        return await self._cur.fetchall()
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        while rows := await self.fetchmany():
+            for row in rows:
+                yield row
+
+    async def finish(self, success: bool) -> None:
+        if self._own_transaction:
+            await self._cur.execute('COMMIT' if success else 'ROLLBACK')
 
 
 class AiopgDetail(AbstractDriverDetail):
-    async def yield_cursor(self, db: Any, **kwargs: Dict[str, Any]) -> AsyncIterator[Any]:
+    async def yield_cursor(self, db: Any, **kwargs: Any) -> AsyncIterator[Any]:
         async with AsyncExitStack() as stack:
             if isinstance(db, aiopg.Pool):
-                db = await stack.enter_async_context(db.acquire())
+                if (pinned := get_pinned_connection(db)) is not None:
+                    db = pinned
+                else:
+                    db = await stack.enter_async_context(db.acquire())
 
             async with db.cursor() as cur:
-                yield cur
+                if kwargs.get('raw_json'):
+                    disable_json_decoding(cur.raw)
+
+                if kwargs.get('server_side'):
+                    server_side_cur = _ServerSideCursor(cur)
+                    try:
+                        yield server_side_cur
+                    except BaseException:
+                        await server_side_cur.finish(False)
+                        raise
+                    await server_side_cur.finish(True)
+                else:
+                    yield cur
+
+    async def execute_many(self, cur: Any, text: str, batch: List[Any]) -> None:
+        # aiopg lacks execute_values/execute_batch, so these are
+        # emulated by binding the arguments on the client side
+        raw = cur.raw
+        if (split := split_values_clause(text)) is not None:
+            statement, template = split
+            encoding = psycopg2.extensions.encodings[raw.connection.encoding]
+            rows = b','.join(raw.mogrify(template, args) for args in batch)
+            await cur.execute(raw.mogrify(statement, (psycopg2.extensions.AsIs(rows.decode(encoding)),)))
+        else:
+            await cur.execute(b';'.join(raw.mogrify(text, args) for args in batch))
+
+    async def stage_rows(self, cur: Any, settings: StageSettings, rows: Iterator[Tuple[Any, ...]]) -> None:
+        if isinstance(cur, _ServerSideCursor):
+            cur = cur.cursor
+        await super().stage_rows(cur, settings, rows)
+        # temporary tables are not analyzed automatically
+        await cur.execute(f'ANALYZE {settings.table}')
+
+    async def clear_staged_rows(self, cur: Any, settings: StageSettings) -> None:
+        if isinstance(cur, _ServerSideCursor):
+            cur = cur.cursor
+        await super().clear_staged_rows(cur, settings)
+
+
+IS_ASYNC = True
 
+IN_LIST_STYLE = InListStyle('pyformat', use_any=True)
 
-def generate_method(query: Query, hook: QueryHook) -> Callable[..., Any]:
+
+def generate_method(query: Query, hook: QueryPreparer) -> Callable[..., Any]:
     return generate_method_generic(query, AiopgDetail(), hook)
+
+
+def generate_variants(query: Query, hook: QueryPreparer) -> Dict[str, Callable[..., Any]]:
+    return generate_variants_generic(query, AiopgDetail(), hook)
+
+
+def is_pool(db: Any) -> bool:
+    return isinstance(db, aiopg.Pool)
+
+
+async def listen(db: Any, channel: str, callback: Callable[[], None]) -> Callable[[], Awaitable[None]]:
+    # notifications are delivered to a connection, so one is held
+    # out of the pool until unsubscribed
+    conn = await db.acquire() if isinstance(db, aiopg.Pool) else db
+    quoted_channel = '"' + channel.replace('"', '""') + '"'
+
+    async with conn.cursor() as cur:
+        await cur.execute(f'LISTEN {quoted_channel}')
+
+    async def receive() -> None:
+        while True:
+            await conn.notifies.get()
+            callback()
+
+    task = asyncio.create_task(receive())
+
+    async def unlisten() -> None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        async with conn.cursor() as cur:
+            await cur.execute(f'UNLISTEN {quoted_channel}')
+        if conn is not db:
+            await db.release(conn)
+
+    return unlisten
+
+
+@asynccontextmanager
+async def pin_connection(db: Any) -> AsyncIterator[Any]:
+    async with AsyncExitStack() as stack:
+        if not isinstance(db, aiopg.Pool):
+            conn = db
+        elif (conn := get_pinned_connection(db)) is None:
+            conn = await stack.enter_async_context(db.acquire())
+
+        with pin(db, conn):
+            yield conn
+
+
+@asynccontextmanager
+async def pin_transaction(db: Any) -> AsyncIterator[Any]:
+    async def execute(conn: Any, statement: str) -> None:
+        async with conn.cursor() as cur:
+            await cur.execute(statement)
+
+    async with pin_connection(db) as conn:
+        # aiopg connections are always in autocommit mode, so
+        # transactions are controlled explicitly
+        if conn.raw.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            begin, commit, rollback = 'BEGIN', 'COMMIT', 'ROLLBACK'
+        else:
+            savepoint = generate_cursor_name()
+            begin, commit, rollback = f'SAVEPOINT {savepoint}', f'RELEASE SAVEPOINT {savepoint}', f'ROLLBACK TO SAVEPOINT {savepoint}'
+
+        await execute(conn, begin)
+        try:
+            yield conn
+        except BaseException:
+            await execute(conn, rollback)
+            raise
+        await execute(conn, commit)
@@ -19,19 +19,61 @@
 # THE SOFTWARE.
 
 from contextlib import AsyncExitStack, asynccontextmanager
-from typing import Any, AsyncIterator, Callable, Dict, List, Tuple, Union
+from functools import partial
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union
+)
 
 import asyncpg
 
-from aesqlapius.args import prepare_args_as_dict, prepare_args_as_list
+from aesqlapius.args import (
+    DEFAULT_BATCH_PAGE_SIZE,
+    is_columnar,
+    iter_batch_chunks_as_columns,
+    iter_batch_chunks_as_lists,
+    prepare_args_as_dict,
+    prepare_args_as_list
+)
+from aesqlapius.bulkload import CopySettings, get_copy_settings
+from aesqlapius.export import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    AbstractRowWriter
+)
 from aesqlapius.function_def import (
+    PAGES_KEY_ARGUMENT,
+    PAGES_LIMIT_ARGUMENT,
+    FunctionDefinition,
     ReturnValueInnerFormat,
     ReturnValueOuterFormat
 )
-from aesqlapius.hook import QueryHook
-from aesqlapius.query import Query
+from aesqlapius.hook import QueryPreparer
+from aesqlapius.inlist import InListStyle
+from aesqlapius.nesting import NestedAssembler
+from aesqlapius.pinning import get_pinned_connection, pin
+from aesqlapius.query import Query, strip_statement_terminator
+from aesqlapius.spill import DictBuilder, ListBuilder, get_spill_limits
+from aesqlapius.staging import (
+    StageSettings,
+    get_stage_settings,
+    iter_stage_rows
+)
 
 
+# asyncpg does not decode json and jsonb values unless a codec is
+# explicitly configured, so Json row format is handled same as Value
 def _generate_row_processor(inner_format: Union[ReturnValueInnerFormat, str]) -> Callable[[Tuple[Any]], Any]:
     if inner_format == ReturnValueInnerFormat.TUPLE:
         def process_row_tuple(row: asyncpg.Record) -> Tuple[Any, ...]:
@@ -41,7 +83,7 @@ def _generate_row_processor(inner_format: Union[ReturnValueInnerFormat, str]) ->
         def process_row_dict(row: asyncpg.Record) -> Dict[str, Any]:
             return dict(row)
         return process_row_dict
-    elif inner_format == ReturnValueInnerFormat.VALUE:
+    elif inner_format in (ReturnValueInnerFormat.VALUE, ReturnValueInnerFormat.JSON):
         def process_row_single(row: asyncpg.Record) -> Any:
             return row[0] if len(row) > 0 else None
         return process_row_single
@@ -60,7 +102,7 @@ def _generate_row_processor_removing_index(inner_format: Union[ReturnValueInnerF
             del d[list(row.keys())[remove]]
             return d
         return process_row_dict
-    elif inner_format == ReturnValueInnerFormat.VALUE:
+    elif inner_format in (ReturnValueInnerFormat.VALUE, ReturnValueInnerFormat.JSON):
         def process_row_single(row: asyncpg.Record) -> Any:
             return row[0 if remove > 0 else 1] if len(row) > 1 else None
         return process_row_single
@@ -81,7 +123,7 @@ def _generate_row_processor_removing_name(inner_format: Union[ReturnValueInnerFo
             del d[remove]
             return d
         return process_row_dict
-    elif inner_format == ReturnValueInnerFormat.VALUE:
+    elif inner_format in (ReturnValueInnerFormat.VALUE, ReturnValueInnerFormat.JSON):
         def process_row_single(row: asyncpg.Record) -> Any:
             return row[0 if next(iter(row.keys())) != remove else 1] if len(row) > 1 else None
         return process_row_single
@@ -89,11 +131,23 @@ def _generate_row_processor_removing_name(inner_format: Union[ReturnValueInnerFo
         raise NotImplementedError(f"unsupported inner return type format '{inner_format}'")  # pragma: no cover
 
 
+def _generate_keyed_row_processor(inner_format: Union[ReturnValueInnerFormat, str], key: Union[str, int], remove_key_column: bool) -> Callable[[Tuple[Any]], Any]:
+    if not remove_key_column:
+        return _generate_row_processor(inner_format)
+    elif isinstance(key, int):
+        return _generate_row_processor_removing_index(inner_format, key)
+    else:
+        return _generate_row_processor_removing_name(inner_format, key)
+
+
 @asynccontextmanager
 async def _get_connection(conn: Union[asyncpg.Connection, asyncpg.pool.Pool], force_transaction: bool = False) -> asyncpg.Connection:
     async with AsyncExitStack() as stack:
         if isinstance(conn, asyncpg.pool.Pool):
-            conn = await stack.enter_async_context(conn.acquire())
+            if (pinned := get_pinned_connection(conn)) is not None:
+                conn = pinned
+            else:
+                conn = await stack.enter_async_context(conn.acquire())
 
         if force_transaction and not conn.is_in_transaction():
             await stack.enter_async_context(conn.transaction())
@@ -101,17 +155,56 @@ async def _get_connection(conn: Union[asyncpg.Connection, asyncpg.pool.Pool], fo
         yield conn
 
 
-def generate_method(query: Query, hook: QueryHook) -> Callable[..., Any]:
+IS_ASYNC = True
+
+IN_LIST_STYLE = InListStyle('numeric', use_any=True)
+
+
+@asynccontextmanager
+async def _get_staging_connection(settings: Optional[StageSettings], args: Dict[str, Any], conn: Union[asyncpg.Connection, asyncpg.pool.Pool], force_transaction: bool = False) -> asyncpg.Connection:
+    async with _get_connection(conn, force_transaction) as conn:
+        if settings is None:
+            yield conn
+            return
+
+        await conn.execute(settings.create_statement)
+        await conn.execute(settings.clear_statement)
+        await conn.copy_records_to_table(settings.table, records=iter_stage_rows(settings, args[settings.arg]), columns=list(settings.columns))
+        # temporary tables are not analyzed automatically
+        await conn.execute(f'ANALYZE {settings.table}')
+
+        yield conn
+
+        # not done on failure, as staged rows are cleared before use anyway
+        await conn.execute(settings.clear_statement)
+
+
+def _generate_query_args_preparer(func_def: FunctionDefinition, stage_settings: Optional[StageSettings]) -> Callable[[Tuple[Any, ...], Dict[str, Any]], List[Any]]:
+    def prepare_query_args_as_list(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> List[Any]:
+        args_list = prepare_args_as_list(func_def, args, kwargs)
+        if stage_settings is not None:
+            # staged argument is not passed to the query
+            del args_list[[arg.name for arg in func_def.args].index(stage_settings.arg)]
+        return args_list
+
+    return prepare_query_args_as_list
+
+
+def generate_method(query: Query, hook: QueryPreparer) -> Callable[..., Any]:
     func_def = query.func_def
     returns = func_def.returns
+    spill_limits = get_spill_limits(func_def)
+    stage_settings = get_stage_settings(func_def)
+    get_connection = partial(_get_staging_connection, stage_settings)
+    prepare_query_args_as_list = _generate_query_args_preparer(func_def, stage_settings)
 
     if returns is None:
         async def method_returning_none(db: Any, *args: Any, **kwargs: Any) -> None:
             prepared_args = prepare_args_as_dict(func_def, args, kwargs)
-            prepared_args_list = prepare_args_as_list(func_def, args, kwargs)
+            prepared_args_list = prepare_query_args_as_list(args, kwargs)
 
-            async with _get_connection(db) as conn:
-                await conn.execute(hook(query.text, prepared_args), *prepared_args_list)
+            async with get_connection(prepared_args, db) as conn:
+                await conn.execute(hook(query.text, prepared_args)[0], *prepared_args_list)
 
         return method_returning_none
 
@@ -119,25 +212,41 @@ def generate_method(query: Query, hook: QueryHook) -> Callable[..., Any]:
         async def method_returning_iterator(db: Any, *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
             assert returns is not None  # mypy bug
             prepared_args = prepare_args_as_dict(func_def, args, kwargs)
-            prepared_args_list = prepare_args_as_list(func_def, args, kwargs)
+            prepared_args_list = prepare_query_args_as_list(args, kwargs)
             process_row = _generate_row_processor(returns.inner_format)
 
-            async with _get_connection(db, True) as conn:
-                async for row in conn.cursor(hook(query.text, prepared_args), *prepared_args_list):
+            async with get_connection(prepared_args, db, True) as conn:
+                async for row in conn.cursor(hook(query.text, prepared_args)[0], *prepared_args_list):
                     yield process_row(row)
 
         return method_returning_iterator
 
+    elif returns.outer_format == ReturnValueOuterFormat.LIST and spill_limits is not None:
+        async def method_returning_spilled_list(db: Any, *args: Any, **kwargs: Any) -> Sequence[Any]:
+            assert returns is not None  # mypy bug
+            assert spill_limits is not None
+            prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+            prepared_args_list = prepare_query_args_as_list(args, kwargs)
+            process_row = _generate_row_processor(returns.inner_format)
+
+            builder = ListBuilder(spill_limits)
+            async with get_connection(prepared_args, db, True) as conn:
+                async for row in conn.cursor(hook(query.text, prepared_args)[0], *prepared_args_list):
+                    builder.append(process_row(row))
+            return builder.finish()
+
+        return method_returning_spilled_list
+
     elif returns.outer_format == ReturnValueOuterFormat.LIST:
         async def method_returning_list(db: Any, *args: Any, **kwargs: Any) -> List[Any]:
             assert returns is not None  # mypy bug
             prepared_args = prepare_args_as_dict(func_def, args, kwargs)
-            prepared_args_list = prepare_args_as_list(func_def, args, kwargs)
+            prepared_args_list = prepare_query_args_as_list(args, kwargs)
             process_row = _generate_row_processor(returns.inner_format)
-            async with _get_connection(db) as conn:
+            async with get_connection(prepared_args, db) as conn:
                 return [
                     process_row(row)
-                    for row in await conn.fetch(hook(query.text, prepared_args), *prepared_args_list)
+                    for row in await conn.fetch(hook(query.text, prepared_args)[0], *prepared_args_list)
                 ]
 
         return method_returning_list
@@ -146,35 +255,267 @@ def generate_method(query: Query, hook: QueryHook) -> Callable[..., Any]:
         async def method_returning_single(db: Any, *args: Any, **kwargs: Any) -> Any:
             assert returns is not None  # mypy bug
             prepared_args = prepare_args_as_dict(func_def, args, kwargs)
-            prepared_args_list = prepare_args_as_list(func_def, args, kwargs)
+            prepared_args_list = prepare_query_args_as_list(args, kwargs)
             process_row = _generate_row_processor(returns.inner_format)
 
-            async with _get_connection(db) as conn:
-                return process_row(await conn.fetchrow(hook(query.text, prepared_args), *prepared_args_list))
+            async with get_connection(prepared_args, db) as conn:
+                return process_row(await conn.fetchrow(hook(query.text, prepared_args)[0], *prepared_args_list))
 
         return method_returning_single
 
+    elif returns.outer_format == ReturnValueOuterFormat.DICT and spill_limits is not None:
+        async def method_returning_spilled_dict(db: Any, *args: Any, **kwargs: Any) -> Mapping[Any, Any]:
+            assert returns is not None  # mypy bug
+            assert returns.outer_dict_by is not None
+            assert spill_limits is not None
+            prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+            prepared_args_list = prepare_query_args_as_list(args, kwargs)
+            process_row = _generate_keyed_row_processor(returns.inner_format, returns.outer_dict_by, returns.remove_key_column)
+            key = returns.outer_dict_by
+
+            builder = DictBuilder(spill_limits)
+            async with get_connection(prepared_args, db, True) as conn:
+                async for row in conn.cursor(hook(query.text, prepared_args)[0], *prepared_args_list):
+                    builder.put(row[key], process_row(row))
+            return builder.finish()
+
+        return method_returning_spilled_dict
+
     elif returns.outer_format == ReturnValueOuterFormat.DICT:
         async def method_returning_dict(db: Any, *args: Any, **kwargs: Any) -> Any:
             assert returns is not None  # mypy bug
             assert returns.outer_dict_by is not None
             prepared_args = prepare_args_as_dict(func_def, args, kwargs)
-            prepared_args_list = prepare_args_as_list(func_def, args, kwargs)
+            prepared_args_list = prepare_query_args_as_list(args, kwargs)
 
-            if not returns.remove_key_column:
-                process_row = _generate_row_processor(returns.inner_format)
-            elif isinstance(returns.outer_dict_by, int):
-                process_row = _generate_row_processor_removing_index(returns.inner_format, returns.outer_dict_by)
-            else:
-                process_row = _generate_row_processor_removing_name(returns.inner_format, returns.outer_dict_by)
+            process_row = _generate_keyed_row_processor(returns.inner_format, returns.outer_dict_by, returns.remove_key_column)
 
-            async with _get_connection(db) as conn:
+            async with get_connection(prepared_args, db) as conn:
                 return {
                     row[returns.outer_dict_by]: process_row(row)
-                    for row in await conn.fetch(hook(query.text, prepared_args), *prepared_args_list)
+                    for row in await conn.fetch(hook(query.text, prepared_args)[0], *prepared_args_list)
                 }
 
         return method_returning_dict
 
+    elif returns.outer_format == ReturnValueOuterFormat.GROUP:
+        async def method_returning_group(db: Any, *args: Any, **kwargs: Any) -> Dict[Any, List[Any]]:
+            assert returns is not None  # mypy bug
+            assert returns.outer_dict_by is not None
+            prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+            prepared_args_list = prepare_query_args_as_list(args, kwargs)
+            process_row = _generate_keyed_row_processor(returns.inner_format, returns.outer_dict_by, returns.remove_key_column)
+            key = returns.outer_dict_by
+
+            res: Dict[Any, List[Any]] = {}
+            async with get_connection(prepared_args, db) as conn:
+                for row in await conn.fetch(hook(query.text, prepared_args)[0], *prepared_args_list):
+                    group = res.get(row[key])
+                    if group is None:
+                        res[row[key]] = [process_row(row)]
+                    else:
+                        group.append(process_row(row))
+            return res
+
+        return method_returning_group
+
+    elif returns.outer_format == ReturnValueOuterFormat.GROUP_ITERATOR:
+        async def method_returning_group_iterator(db: Any, *args: Any, **kwargs: Any) -> AsyncIterator[Tuple[Any, List[Any]]]:
+            assert returns is not None  # mypy bug
+            assert returns.outer_dict_by is not None
+            prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+            prepared_args_list = prepare_query_args_as_list(args, kwargs)
+            process_row = _generate_keyed_row_processor(returns.inner_format, returns.outer_dict_by, returns.remove_key_column)
+            key = returns.outer_dict_by
+
+            current_key: Any = None
+            current_group: List[Any] = []
+            async with get_connection(prepared_args, db, True) as conn:
+                async for row in conn.cursor(hook(query.text, prepared_args)[0], *prepared_args_list):
+                    if current_group and row[key] != current_key:
+                        yield current_key, current_group
+                        current_group = []
+                    current_key = row[key]
+                    current_group.append(process_row(row))
+            if current_group:
+                yield current_key, current_group
+
+        return method_returning_group_iterator
+
+    elif returns.outer_format == ReturnValueOuterFormat.NESTED:
+        async def method_returning_nested(db: Any, *args: Any, **kwargs: Any) -> List[Any]:
+            assert returns is not None  # mypy bug
+            prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+            prepared_args_list = prepare_query_args_as_list(args, kwargs)
+
+            async with get_connection(prepared_args, db) as conn:
+                rows = await conn.fetch(hook(query.text, prepared_args)[0], *prepared_args_list)
+
+            if not rows:
+                return []
+
+            assembler = NestedAssembler(returns.inner_format, list(rows[0].keys()), returns.nested_by, returns.nested_children)
+            for row in rows:
+                assembler.add(row)
+            return assembler.result()
+
+        return method_returning_nested
+
+    elif returns.outer_format == ReturnValueOuterFormat.PAGES:
+        async def method_returning_pages(db: Any, *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+            assert returns is not None  # mypy bug
+            assert returns.outer_dict_by is not None
+            prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+            limit = prepared_args.get(PAGES_LIMIT_ARGUMENT)
+            process_row = _generate_keyed_row_processor(returns.inner_format, returns.outer_dict_by, returns.remove_key_column)
+
+            # each page is fetched with a separate query, and the connection
+            # is released before the page rows are passed to the caller
+            while True:
+                async with get_connection(prepared_args, db) as conn:
+                    rows = await conn.fetch(hook(query.text, prepared_args)[0], *prepared_args.values())
+
+                if not rows:
+                    return
+
+                for row in rows:
+                    yield process_row(row)
+
+                if limit is not None and len(rows) < limit:
+                    return
+
+                prepared_args[PAGES_KEY_ARGUMENT] = rows[-1][returns.outer_dict_by]
+
+        return method_returning_pages
+
     else:
         raise NotImplementedError(f"unsupported outer return type format '{returns.outer_format}'")  # pragma: no cover
+
+
+def _generate_export_method(query: Query, hook: QueryPreparer, writer_class: Type[AbstractRowWriter]) -> Callable[..., Any]:
+    func_def = query.func_def
+    stage_settings = get_stage_settings(func_def)
+    get_connection = partial(_get_staging_connection, stage_settings)
+    prepare_query_args_as_list = _generate_query_args_preparer(func_def, stage_settings)
+
+    async def method_exporting(db: Any, fileobj: IO[str], *args: Any, **kwargs: Any) -> int:
+        prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+        prepared_args_list = prepare_query_args_as_list(args, kwargs)
+
+        async with get_connection(prepared_args, db, True) as conn:
+            stmt = await conn.prepare(hook(query.text, prepared_args)[0])
+            writer = writer_class(fileobj, [attribute.name for attribute in stmt.get_attributes()])
+            cur = await stmt.cursor(*prepared_args_list)
+            count = 0
+            while rows := await cur.fetch(EXPORT_CHUNK_SIZE):
+                writer.write_rows(rows)
+                count += len(rows)
+            return count
+
+    return method_exporting
+
+
+def _generate_copy_method(query: Query, hook: QueryPreparer, **copy_options: Any) -> Callable[..., Any]:
+    func_def = query.func_def
+    stage_settings = get_stage_settings(func_def)
+    get_connection = partial(_get_staging_connection, stage_settings)
+    prepare_query_args_as_list = _generate_query_args_preparer(func_def, stage_settings)
+
+    async def method_copying(db: Any, output: Any, *args: Any, **kwargs: Any) -> int:
+        prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+        prepared_args_list = prepare_query_args_as_list(args, kwargs)
+
+        async with get_connection(prepared_args, db) as conn:
+            status = await conn.copy_from_query(
+                strip_statement_terminator(hook(query.text, prepared_args)[0]),
+                *prepared_args_list,
+                output=output,
+                **copy_options
+            )
+            return int(status.split()[-1])
+
+    return method_copying
+
+
+def _generate_batch_method(query: Query, hook: QueryPreparer) -> Callable[..., Any]:
+    func_def = query.func_def
+    names = [arg.name for arg in func_def.args]
+
+    if is_columnar(func_def):
+        async def method_many_columnar(db: Any, batch: Any, page_size: int = DEFAULT_BATCH_PAGE_SIZE) -> None:
+            async with _get_connection(db, True) as conn:
+                for columns in iter_batch_chunks_as_columns(func_def, batch, page_size):
+                    await conn.execute(hook(query.text, columns)[0], *columns.values())
+
+        return method_many_columnar
+
+    else:
+        async def method_many(db: Any, batch: Any, page_size: int = DEFAULT_BATCH_PAGE_SIZE) -> None:
+            async with _get_connection(db, True) as conn:
+                for chunk in iter_batch_chunks_as_lists(func_def, batch, page_size):
+                    await conn.executemany(hook(query.text, dict(zip(names, chunk[0])))[0], chunk)
+
+        return method_many
+
+
+def _generate_copy_from_method(query: Query, settings: CopySettings) -> Callable[..., Any]:
+    async def method_copying_from(db: Any, rows: Any) -> int:
+        async with _get_connection(db) as conn:
+            status = await conn.copy_records_to_table(settings.table, records=rows, columns=settings.columns, schema_name=settings.schema)
+            return int(status.split()[-1])
+
+    return method_copying_from
+
+
+def generate_variants(query: Query, hook: QueryPreparer) -> Dict[str, Callable[..., Any]]:
+    variants: Dict[str, Callable[..., Any]] = {}
+
+    if query.func_def.returns is None:
+        variants['many'] = _generate_batch_method(query, hook)
+
+        if (copy_settings := get_copy_settings(query.func_def)) is not None:
+            variants['copy_from'] = _generate_copy_from_method(query, copy_settings)
+    else:
+        for export_format, writer_class in EXPORT_FORMATS.items():
+            variants[f'to_{export_format}'] = _generate_export_method(query, hook, writer_class)
+
+        variants['copy_to_csv'] = _generate_copy_method(query, hook, format='csv', header=True)
+        variants['copy_to_binary'] = _generate_copy_method(query, hook, format='binary')
+
+    return variants
+
+
+def is_pool(db: Any) -> bool:
+    return isinstance(db, asyncpg.pool.Pool)
+
+
+async def listen(db: Union[asyncpg.Connection, asyncpg.pool.Pool], channel: str, callback: Callable[[], None]) -> Callable[[], Awaitable[None]]:
+    # notifications are delivered to a connection, so one is held
+    # out of the pool until unsubscribed
+    conn = await db.acquire() if isinstance(db, asyncpg.pool.Pool) else db
+
+    def on_notification(connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        callback()
+
+    await conn.add_listener(channel, on_notification)
+
+    async def unlisten() -> None:
+        await conn.remove_listener(channel, on_notification)
+        if conn is not db:
+            await db.release(conn)
+
+    return unlisten
+
+
+@asynccontextmanager
+async def pin_connection(db: Union[asyncpg.Connection, asyncpg.pool.Pool]) -> AsyncIterator[asyncpg.Connection]:
+    async with _get_connection(db) as conn:
+        with pin(db, conn):
+            yield conn
+
+
+@asynccontextmanager
+async def pin_transaction(db: Union[asyncpg.Connection, asyncpg.pool.Pool]) -> AsyncIterator[asyncpg.Connection]:
+    # nested transactions are handled by asyncpg as savepoints
+    async with pin_connection(db) as conn, conn.transaction():
+        yield conn
@@ -20,16 +20,31 @@
 
 from typing import Any, Callable, Dict, Iterator
 
-from aesqlapius.hook import QueryHook
-from aesqlapius.method import AbstractDriverDetail, generate_method_generic
+from aesqlapius.hook import QueryPreparer
+from aesqlapius.inlist import InListStyle
+from aesqlapius.method import (
+    AbstractDriverDetail,
+    generate_method_generic,
+    generate_variants_generic
+)
 from aesqlapius.query import Query
 
 
 class MysqlDetail(AbstractDriverDetail):
-    def yield_cursor(self, db: Any, **kwargs: Dict[str, Any]) -> Iterator[Any]:
-        with db.cursor(buffered=True) as cur:
+    def yield_cursor(self, db: Any, **kwargs: Any) -> Iterator[Any]:
+        # unbuffered cursor is used for streaming large results
+        with db.cursor(buffered=not kwargs.get('server_side')) as cur:
             yield cur
 
 
-def generate_method(query: Query, hook: QueryHook) -> Callable[..., Any]:
+IS_ASYNC = False
+
+IN_LIST_STYLE = InListStyle('pyformat', empty_list='(SELECT NULL FROM DUAL WHERE FALSE)')
+
+
+def generate_method(query: Query, hook: QueryPreparer) -> Callable[..., Any]:
     return generate_method_generic(query, MysqlDetail(), hook)
+
+
+def generate_variants(query: Query, hook: QueryPreparer) -> Dict[str, Callable[..., Any]]:
+    return generate_variants_generic(query, MysqlDetail(), hook)
@@ -18,18 +18,158 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from typing import Any, Callable, Dict, Iterator
+import re
+from itertools import count
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple
+)
 
-from aesqlapius.hook import QueryHook
-from aesqlapius.method import AbstractDriverDetail, generate_method_generic
-from aesqlapius.query import Query
+import psycopg2.extras
+import psycopg2.sql
+
+from aesqlapius.args import prepare_args_as_dict
+from aesqlapius.bulkload import CopySettings, CopyTextReader
+from aesqlapius.hook import QueryPreparer
+from aesqlapius.inlist import InListStyle
+from aesqlapius.method import (
+    AbstractDriverDetail,
+    _generate_cursor_getter,
+    generate_method_generic,
+    generate_variants_generic
+)
+from aesqlapius.query import Query, strip_statement_terminator
+from aesqlapius.staging import (
+    StageSettings,
+    get_stage_settings,
+    iter_stage_rows
+)
+
+_cursor_counter = count()
+
+# single row VALUES clause, allowing one level of nested parentheses besides placeholders
+_PLACEHOLDER = r'%\(\w+\)s'
+_VALUES_RE = re.compile(rf'\bVALUES\s*(\((?:{_PLACEHOLDER}|[^()]|\((?:{_PLACEHOLDER}|[^()])*\))*\))', re.IGNORECASE)
+
+
+def generate_cursor_name() -> str:
+    return f'aesqlapius_cursor_{next(_cursor_counter)}'
+
+
+def _passthrough(value: str) -> str:
+    return value
+
+
+def disable_json_decoding(cur: Any) -> None:
+    psycopg2.extras.register_default_json(cur, loads=_passthrough)
+    psycopg2.extras.register_default_jsonb(cur, loads=_passthrough)
+
+
+def split_values_clause(text: str) -> Optional[Tuple[str, str]]:
+    # returns statement with the row replaced with %s, as expected by
+    # execute_values(), and the row template, or None if the query
+    # cannot be executed as a multi-row VALUES statement
+    matches = list(_VALUES_RE.finditer(text))
+    if len(matches) != 1:
+        return None
+
+    match = matches[0]
+    statement = text[:match.start(1)] + '%s' + text[match.end(1):]
+    if '%(' in statement:
+        return None
+
+    return statement, match.group(1)
 
 
 class Psycopg2Detail(AbstractDriverDetail):
-    def yield_cursor(self, db: Any, **kwargs: Dict[str, Any]) -> Iterator[Any]:
-        with db.cursor() as cur:
+    def yield_cursor(self, db: Any, **kwargs: Any) -> Iterator[Any]:
+        if kwargs.get('server_side'):
+            # named cursors require a transaction unless declared WITH HOLD
+            cursor = db.cursor(name=generate_cursor_name(), withhold=db.autocommit)
+        else:
+            cursor = db.cursor()
+
+        with cursor as cur:
+            if kwargs.get('raw_json'):
+                disable_json_decoding(cur)
             yield cur
 
+    def execute_many(self, cur: Any, text: str, batch: List[Any]) -> None:
+        if (split := split_values_clause(text)) is not None:
+            statement, template = split
+            psycopg2.extras.execute_values(cur, statement, batch, template=template, page_size=len(batch))
+        else:
+            psycopg2.extras.execute_batch(cur, text, batch, page_size=len(batch))
+
+    def copy_records(self, cur: Any, settings: CopySettings, rows: Iterable[Sequence[Any]]) -> int:
+        assert settings.columns is not None
+        statement = psycopg2.sql.SQL('COPY {} ({}) FROM STDIN').format(
+            psycopg2.sql.Identifier(settings.schema, settings.table) if settings.schema else psycopg2.sql.Identifier(settings.table),
+            psycopg2.sql.SQL(', ').join(map(psycopg2.sql.Identifier, settings.columns)),
+        )
+        cur.copy_expert(statement, CopyTextReader(rows))
+        return int(cur.rowcount)
 
-def generate_method(query: Query, hook: QueryHook) -> Callable[..., Any]:
+    def stage_rows(self, cur: Any, settings: StageSettings, rows: Iterator[Tuple[Any, ...]]) -> None:
+        # separate cursor is needed as named cursors only run a single query
+        with cur.connection.cursor() as stage_cur:
+            stage_cur.execute(settings.create_statement)
+            stage_cur.execute(settings.clear_statement)
+            stage_cur.copy_expert(f'COPY {settings.table} ({", ".join(settings.columns)}) FROM STDIN', CopyTextReader(rows))
+            # temporary tables are not analyzed automatically
+            stage_cur.execute(f'ANALYZE {settings.table}')
+
+    def clear_staged_rows(self, cur: Any, settings: StageSettings) -> None:
+        with cur.connection.cursor() as stage_cur:
+            stage_cur.execute(settings.clear_statement)
+
+
+IS_ASYNC = False
+
+IN_LIST_STYLE = InListStyle('pyformat', use_any=True)
+
+
+def generate_method(query: Query, hook: QueryPreparer) -> Callable[..., Any]:
     return generate_method_generic(query, Psycopg2Detail(), hook)
+
+
+def _generate_copy_method(query: Query, hook: QueryPreparer, copy_options: str) -> Callable[..., Any]:
+    func_def = query.func_def
+
+    detail = Psycopg2Detail()
+    get_cursor = _generate_cursor_getter(detail)
+    stage_settings = get_stage_settings(func_def)
+
+    def method_copying(db: Any, fileobj: IO[Any], *args: Any, **kwargs: Any) -> int:
+        with get_cursor(db) as cur:
+            prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+            if stage_settings is not None:
+                # staged argument is not passed to the query
+                detail.stage_rows(cur, stage_settings, iter_stage_rows(stage_settings, prepared_args.pop(stage_settings.arg)))
+            text, query_args = hook(query.text, prepared_args)
+            # COPY does not support parameters, so these are bound on the client side
+            statement = cur.mogrify(strip_statement_terminator(text), query_args)
+            cur.copy_expert(b'COPY (\n' + statement + b'\n) TO STDOUT WITH (' + copy_options.encode() + b')', fileobj)
+            if stage_settings is not None:
+                detail.clear_staged_rows(cur, stage_settings)
+            return int(cur.rowcount)
+
+    return method_copying
+
+
+def generate_variants(query: Query, hook: QueryPreparer) -> Dict[str, Callable[..., Any]]:
+    variants = generate_variants_generic(query, Psycopg2Detail(), hook)
+
+    if query.func_def.returns is not None:
+        variants['copy_to_csv'] = _generate_copy_method(query, hook, 'FORMAT csv, HEADER')
+        variants['copy_to_binary'] = _generate_copy_method(query, hook, 'FORMAT binary')
+
+    return variants
@@ -20,15 +20,31 @@
 
 from typing import Any, Callable, Dict, Iterator
 
-from aesqlapius.hook import QueryHook
-from aesqlapius.method import AbstractDriverDetail, generate_method_generic
+from aesqlapius.hook import QueryPreparer
+from aesqlapius.inlist import InListStyle
+from aesqlapius.method import (
+    AbstractDriverDetail,
+    generate_method_generic,
+    generate_variants_generic
+)
 from aesqlapius.query import Query
 
 
 class SqliteDetail(AbstractDriverDetail):
-    def yield_cursor(self, db: Any, **kwargs: Dict[str, Any]) -> Iterator[Any]:
+    placeholder = '?'
+
+    def yield_cursor(self, db: Any, **kwargs: Any) -> Iterator[Any]:
         yield db.cursor()
 
 
-def generate_method(query: Query, hook: QueryHook) -> Callable[..., Any]:
+IS_ASYNC = False
+
+IN_LIST_STYLE = InListStyle('named', empty_list='()')
+
+
+def generate_method(query: Query, hook: QueryPreparer) -> Callable[..., Any]:
     return generate_method_generic(query, SqliteDetail(), hook)
+
+
+def generate_variants(query: Query, hook: QueryPreparer) -> Dict[str, Callable[..., Any]]:
+    return generate_variants_generic(query, SqliteDetail(), hook)
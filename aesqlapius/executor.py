@@ -0,0 +1,114 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+from aesqlapius.args import iter_chunks
+from aesqlapius.function_def import (
+    GENERATOR_FORMATS,
+    FunctionDefinition,
+    ReturnValueOuterFormat
+)
+
+# number of rows passed from the worker thread to the event loop at once
+EXECUTOR_CHUNK_SIZE = 1000
+
+# number of chunks fetched ahead of the consumer
+EXECUTOR_QUEUE_SIZE = 4
+
+# chunk of items, or None with an optional exception at the end
+_QueueItem = Tuple[Optional[List[Any]], Optional[BaseException]]
+
+
+def _run_in_executor(executor: Optional[Executor], func: Callable[..., Any], *args: Any, **kwargs: Any) -> 'asyncio.Future[Any]':
+    # context is propagated like asyncio.to_thread() does, so context
+    # variables (such as memo scope) are visible to the method
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(executor, partial(context.run, func, *args, **kwargs))
+
+
+def generate_executor_method(func: Callable[..., Any], executor: Optional[Executor]) -> Callable[..., Any]:
+    async def method_in_executor(*args: Any, **kwargs: Any) -> Any:
+        return await _run_in_executor(executor, func, *args, **kwargs)
+
+    return method_in_executor
+
+
+def generate_executor_iterator_method(func: Callable[..., Any], executor: Optional[Executor], chunk_size: int) -> Callable[..., Any]:
+    # the generator is consumed by a single worker thread, so its
+    # connection stays in one thread, and items are passed to the event
+    # loop in chunks through a bounded queue
+    async def method_in_executor_iterating(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        loop = asyncio.get_running_loop()
+        queue: 'asyncio.Queue[_QueueItem]' = asyncio.Queue(EXECUTOR_QUEUE_SIZE)
+        stopped = threading.Event()
+
+        def put(item: _QueueItem) -> None:
+            # blocks while the queue is full
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def produce() -> None:
+            try:
+                generator = func(*args, **kwargs)
+                try:
+                    for chunk in iter_chunks(generator, chunk_size):
+                        if stopped.is_set():
+                            return
+                        put((chunk, None))
+                finally:
+                    generator.close()
+            except BaseException as e:
+                put((None, e))
+            else:
+                put((None, None))
+
+        producer = _run_in_executor(executor, produce)
+
+        try:
+            while True:
+                chunk, error = await queue.get()
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    break
+                for item in chunk:
+                    yield item
+        finally:
+            stopped.set()
+            # unblock the producer and wait for it to release resources
+            while not producer.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.wait({producer}, timeout=0.01)
+
+    return method_in_executor_iterating
+
+
+def get_executor_chunk_size(func_def: FunctionDefinition) -> Optional[int]:
+    if func_def.returns is None or func_def.returns.outer_format not in GENERATOR_FORMATS:
+        return None
+
+    # groups and pages are already chunks of rows
+    return EXECUTOR_CHUNK_SIZE if func_def.returns.outer_format == ReturnValueOuterFormat.ITERATOR else 1
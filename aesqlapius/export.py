@@ -0,0 +1,66 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import csv
+import json
+from abc import ABC, abstractmethod
+from typing import IO, Any, Dict, Iterable, List, Type
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+class AbstractRowWriter(ABC):
+    def __init__(self, fileobj: IO[str], field_names: List[str]) -> None:
+        self._fileobj = fileobj
+        self._field_names = field_names
+
+    @abstractmethod
+    def write_rows(self, rows: Iterable[Any]) -> None:
+        pass  # pragma: no cover
+
+
+class CsvRowWriter(AbstractRowWriter):
+    def __init__(self, fileobj: IO[str], field_names: List[str]) -> None:
+        super().__init__(fileobj, field_names)
+        self._writer = csv.writer(fileobj)
+        self._writer.writerow(field_names)
+
+    def write_rows(self, rows: Iterable[Any]) -> None:
+        self._writer.writerows(rows)
+
+
+class JsonLinesRowWriter(AbstractRowWriter):
+    def __init__(self, fileobj: IO[str], field_names: List[str]) -> None:
+        super().__init__(fileobj, field_names)
+        self._encoder = json.JSONEncoder(default=str)
+
+    def write_rows(self, rows: Iterable[Any]) -> None:
+        encode = self._encoder.encode
+        field_names = self._field_names
+        self._fileobj.writelines(
+            encode(dict(zip(field_names, row))) + '\n'
+            for row in rows
+        )
+
+
+EXPORT_FORMATS: Dict[str, Type[AbstractRowWriter]] = {
+    'csv': CsvRowWriter,
+    'jsonl': JsonLinesRowWriter,
+}
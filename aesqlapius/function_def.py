@@ -21,7 +21,11 @@
 import ast
 from dataclasses import dataclass, field
 from enum import Enum, unique
-from typing import Any, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# arguments which receive last seen key value and page size for Pages rows format
+PAGES_KEY_ARGUMENT = 'after'
+PAGES_LIMIT_ARGUMENT = 'limit'
 
 
 @dataclass
@@ -29,6 +33,7 @@ class ArgumentDefinition:
     name: str
     has_default: bool = False
     default: Any = None
+    is_list: bool = False
 
 
 @unique
@@ -37,6 +42,19 @@ class ReturnValueOuterFormat(Enum):
     LIST = 2
     SINGLE = 3
     DICT = 4
+    GROUP = 5
+    GROUP_ITERATOR = 6
+    NESTED = 7
+    PAGES = 8
+
+
+# these formats produce generators, which are consumed lazily and
+# cannot be cached, shared between callers or retried
+GENERATOR_FORMATS = frozenset({
+    ReturnValueOuterFormat.ITERATOR,
+    ReturnValueOuterFormat.GROUP_ITERATOR,
+    ReturnValueOuterFormat.PAGES,
+})
 
 
 @unique
@@ -44,6 +62,7 @@ class ReturnValueInnerFormat(Enum):
     TUPLE = 1
     DICT = 2
     VALUE = 3
+    JSON = 4
 
 
 @dataclass
@@ -52,6 +71,33 @@ class ReturnValueDefinition:
     inner_format: ReturnValueInnerFormat
     outer_dict_by: Union[None, str, int] = None
     remove_key_column: bool = False
+    nested_by: List[Union[str, int]] = field(default_factory=list)
+    nested_children: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class DecoratorDefinition:
+    name: str
+    args: List[Any] = field(default_factory=list)
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+
+
+KNOWN_DECORATORS = {
+    'batched',
+    'broadcast',
+    'cached',
+    'columnar',
+    'copy_into',
+    'invalidates',
+    'readonly',
+    'shard_by',
+    'singleflight',
+    'snapshot',
+    'spill',
+    'stage',
+    'write',
+    'write_behind',
+}
 
 
 @dataclass
@@ -59,6 +105,7 @@ class FunctionDefinition:
     name: str
     args: List[ArgumentDefinition] = field(default_factory=list)
     returns: Optional[ReturnValueDefinition] = None
+    decorators: Dict[str, DecoratorDefinition] = field(default_factory=dict)
 
 
 def _parse_return_value_inner(node: ast.AST) -> ReturnValueInnerFormat:
@@ -77,38 +124,87 @@ def _parse_return_value_inner(node: ast.AST) -> ReturnValueInnerFormat:
         return ReturnValueInnerFormat.DICT
     elif row_format_name == 'Value':
         return ReturnValueInnerFormat.VALUE
+    elif row_format_name == 'Json':
+        return ReturnValueInnerFormat.JSON
     else:
         raise TypeError(f"unexpected row format '{row_format_name}'")
 
 
+def _parse_column_reference(node: ast.AST) -> Tuple[Union[str, int], bool]:
+    # handle unary minus, e.g. Dict[-a, b]
+    if isinstance(node, ast.UnaryOp):
+        if not isinstance(node.op, ast.USub):
+            raise SyntaxError(f"unexpected column reference format '{ast.unparse(node)}'")
+        remove_column = True
+        node = node.operand
+    else:
+        remove_column = False
+
+    if not isinstance(node, ast.Constant) or not (isinstance(node.value, int) or isinstance(node.value, str)):
+        raise SyntaxError(f"expected string or numeric column reference, not '{ast.unparse(node)}'")
+
+    return node.value, remove_column
+
+
 def _parse_return_value_outer(node: ast.Subscript) -> ReturnValueDefinition:
     if not isinstance(node.value, ast.Name):
         raise SyntaxError(f"unexpected rows format '{ast.unparse(node)}'")
 
-    if node.value.id == 'Dict':
+    if node.value.id in ('Dict', 'Group', 'GroupIterator', 'Pages'):
         if not isinstance(node.slice, ast.Tuple) or len(node.slice.elts) != 2:
-            raise SyntaxError(f"unexpected Dict row format specification '{ast.unparse(node)}'")
-
-        # handle unary minus for the first arg, e.g. Dict[-a, b]
-        if isinstance(node.slice.elts[0], ast.UnaryOp):
-            if not isinstance(node.slice.elts[0].op, ast.USub):
-                raise SyntaxError(f"unexpected column reference format '{ast.unparse(node.slice.elts[0])}'")
-            remove_key_column = True
-            dict_by = node.slice.elts[0].operand
-        else:
-            remove_key_column = False
-            dict_by = node.slice.elts[0]
+            raise SyntaxError(f"unexpected {node.value.id} row format specification '{ast.unparse(node)}'")
 
-        if not isinstance(dict_by, ast.Constant) or not (isinstance(dict_by.value, int) or isinstance(dict_by.value, str)):
-            raise SyntaxError(f"expected string or numeric column reference, not '{ast.unparse(dict_by)}'")
+        dict_by, remove_key_column = _parse_column_reference(node.slice.elts[0])
+
+        if node.value.id == 'Dict':
+            outer_format = ReturnValueOuterFormat.DICT
+        elif node.value.id == 'Group':
+            outer_format = ReturnValueOuterFormat.GROUP
+        elif node.value.id == 'GroupIterator':
+            outer_format = ReturnValueOuterFormat.GROUP_ITERATOR
+        else:
+            outer_format = ReturnValueOuterFormat.PAGES
 
         return ReturnValueDefinition(
-            outer_format=ReturnValueOuterFormat.DICT,
+            outer_format=outer_format,
             inner_format=_parse_return_value_inner(node.slice.elts[1]),
-            outer_dict_by=dict_by.value,
+            outer_dict_by=dict_by,
             remove_key_column=remove_key_column
         )
 
+    if node.value.id == 'Nested':
+        if not isinstance(node.slice, ast.Tuple) or len(node.slice.elts) != 3:
+            raise SyntaxError(f"unexpected Nested row format specification '{ast.unparse(node)}'")
+
+        key_node, row_node, children_node = node.slice.elts
+
+        nested_by = []
+        for column_node in (key_node.elts if isinstance(key_node, ast.Tuple) else [key_node]):
+            column, remove_column = _parse_column_reference(column_node)
+            if remove_column:
+                raise SyntaxError(f"parent key column removal is not supported in '{ast.unparse(node)}'")
+            nested_by.append(column)
+
+        if not isinstance(children_node, ast.Dict) or not children_node.keys:
+            raise SyntaxError(f"expected dict of child column prefixes, not '{ast.unparse(children_node)}'")
+
+        nested_children = {}
+        for name_node, prefix_node in zip(children_node.keys, children_node.values):
+            if not isinstance(name_node, ast.Constant) or not isinstance(name_node.value, str) or not isinstance(prefix_node, ast.Constant) or not isinstance(prefix_node.value, str):
+                raise SyntaxError(f"expected string child name and column prefix, not '{ast.unparse(children_node)}'")
+            nested_children[name_node.value] = prefix_node.value
+
+        inner_format = _parse_return_value_inner(row_node)
+        if inner_format in (ReturnValueInnerFormat.VALUE, ReturnValueInnerFormat.JSON):
+            raise TypeError(f"row format '{ast.unparse(row_node)}' cannot be used with Nested rows format")
+
+        return ReturnValueDefinition(
+            outer_format=ReturnValueOuterFormat.NESTED,
+            inner_format=inner_format,
+            nested_by=nested_by,
+            nested_children=nested_children
+        )
+
     if node.value.id == 'List':
         outer_format = ReturnValueOuterFormat.LIST
     elif node.value.id == 'Iterator':
@@ -124,6 +220,40 @@ def _parse_return_value_outer(node: ast.Subscript) -> ReturnValueDefinition:
     )
 
 
+def _is_list_annotation(node: Optional[ast.expr]) -> bool:
+    if isinstance(node, ast.Subscript):
+        node = node.value
+    return isinstance(node, ast.Name) and node.id in ('List', 'list')
+
+
+def _parse_literal(node: ast.AST) -> Any:
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        raise SyntaxError(f"literal expected, not '{ast.unparse(node)}'")
+
+
+def _parse_decorator(node: ast.expr) -> DecoratorDefinition:
+    if isinstance(node, ast.Call):
+        name_node = node.func
+        args = [_parse_literal(arg) for arg in node.args]
+        kwargs = {keyword.arg: _parse_literal(keyword.value) for keyword in node.keywords if keyword.arg is not None}
+        if len(kwargs) != len(node.keywords):
+            raise SyntaxError(f"unexpected decorator arguments '{ast.unparse(node)}'")
+    else:
+        name_node = node
+        args = []
+        kwargs = {}
+
+    if not isinstance(name_node, ast.Name):
+        raise SyntaxError(f"unexpected decorator '{ast.unparse(node)}'")
+
+    if name_node.id not in KNOWN_DECORATORS:
+        raise TypeError(f"unexpected decorator '{name_node.id}'")
+
+    return DecoratorDefinition(name=name_node.id, args=args, kwargs=kwargs)
+
+
 def parse_function_definition(source: str) -> FunctionDefinition:
     tree = ast.parse(source)
 
@@ -134,10 +264,18 @@ def parse_function_definition(source: str) -> FunctionDefinition:
 
     func_def = FunctionDefinition(name=func.name)
 
+    # parse decorators
+    for decorator in func.decorator_list:
+        decorator_def = _parse_decorator(decorator)
+        if decorator_def.name in func_def.decorators:
+            raise SyntaxError(f"duplicate decorator '{decorator_def.name}'")
+        func_def.decorators[decorator_def.name] = decorator_def
+
     # parse arguments
     for arg in func.args.args:
         arg_def = ArgumentDefinition(
-            name=arg.arg
+            name=arg.arg,
+            is_list=_is_list_annotation(arg.annotation)
         )
 
         func_def.args.append(arg_def)
@@ -164,6 +302,9 @@ def parse_function_definition(source: str) -> FunctionDefinition:
             raise SyntaxError(f"unexpected rows format '{ast.unparse(returns)}'")
         func_def.returns = _parse_return_value_outer(returns)
 
+        if func_def.returns.outer_format == ReturnValueOuterFormat.PAGES and not any(arg.name == PAGES_KEY_ARGUMENT for arg in func_def.args):
+            raise SyntaxError(f"Pages rows format requires '{PAGES_KEY_ARGUMENT}' argument")
+
     # check body
     if len(func.body) != 1 or not isinstance(func.body[0], ast.Expr) or not isinstance(func.body[0].value, ast.Constant) or func.body[0].value.value is not Ellipsis:
         raise SyntaxError('single ellipsis expected as function body')
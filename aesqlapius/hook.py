@@ -18,11 +18,26 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from typing import Any, Callable, Dict
+from typing import Any, Callable, Dict, List, Tuple
 
 
 QueryHook = Callable[[str, Dict[str, Any]], str]
 
+# hooks passed to drivers return query arguments along with query
+# text, as these may be rewritten together
+QueryPreparer = Callable[[str, Dict[str, Any]], Tuple[str, Dict[str, Any]]]
+
 
 def default_query_hook(text: str, kwargs: Dict[str, Any]) -> str:
     return text
+
+
+def group_rows_by_statement(text: str, hook: QueryPreparer, rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    # query text may depend on argument values (lengths of expanded
+    # lists), so rows are grouped by it and each group is executed
+    # separately
+    statements: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        prepared_text, prepared_row = hook(text, row)
+        statements.setdefault(prepared_text, []).append(prepared_row)
+    return statements
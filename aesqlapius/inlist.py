@@ -0,0 +1,127 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Tuple
+
+from aesqlapius.function_def import FunctionDefinition
+from aesqlapius.hook import QueryHook, QueryPreparer
+
+
+@dataclass(frozen=True)
+class InListStyle:
+    # with use_any, IN is replaced with = ANY(array) (and NOT IN with
+    # <> ALL(array)), otherwise the list is expanded into placeholders
+    # padded to a power of two, and empty_list is used for empty lists
+
+    paramstyle: str
+    use_any: bool = False
+    empty_list: str = '(NULL)'
+
+    def placeholder(self, name: str, index: int) -> str:
+        if self.paramstyle == 'pyformat':
+            return f'%({name})s'
+        elif self.paramstyle == 'named':
+            return f':{name}'
+        elif self.paramstyle == 'numeric':
+            return f'${index + 1}'
+        else:
+            raise NotImplementedError(f"unsupported paramstyle '{self.paramstyle}'")  # pragma: no cover
+
+
+def _get_pattern(style: InListStyle, name: str, index: int) -> 're.Pattern[str]':
+    placeholder = re.escape(style.placeholder(name, index))
+    if style.paramstyle == 'named':
+        placeholder += r'\b'
+    elif style.paramstyle == 'numeric':
+        placeholder += r'(?!\d)'
+    return re.compile(rf'\b(NOT\s+)?IN\s*{placeholder}', re.IGNORECASE)
+
+
+def get_bucket_size(length: int) -> int:
+    return 1 << (length - 1).bit_length() if length else 0
+
+
+def _expanded_name(name: str, index: int) -> str:
+    return f'{name}__{index}'
+
+
+@lru_cache(maxsize=1024)
+def _find_in_list_args(text: str, style: InListStyle, list_args: Tuple[Tuple[str, int], ...]) -> Tuple[Tuple[str, int], ...]:
+    return tuple((name, index) for name, index in list_args if _get_pattern(style, name, index).search(text))
+
+
+@lru_cache(maxsize=1024)
+def _rewrite(text: str, style: InListStyle, lists: Tuple[Tuple[str, int, int], ...]) -> str:
+    for name, index, size in lists:
+        pattern = _get_pattern(style, name, index)
+
+        if style.use_any:
+            placeholder = style.placeholder(name, index)
+            text = pattern.sub(lambda match: f'<> ALL({placeholder})' if match.group(1) else f'= ANY({placeholder})', text)
+        else:
+            if size:
+                placeholders = '(' + ', '.join(style.placeholder(_expanded_name(name, i), index) for i in range(size)) + ')'
+            else:
+                placeholders = style.empty_list
+            text = pattern.sub(lambda match: f'{match.group(1) or ""}IN {placeholders}', text)
+
+    return text
+
+
+def generate_in_list_hook(func_def: FunctionDefinition, hook: QueryHook, style: InListStyle) -> QueryPreparer:
+    # values for expanded placeholders are added into a copy of the
+    # arguments dict, so the dict passed to the hook is never modified
+    list_args = tuple((arg.name, index) for index, arg in enumerate(func_def.args) if arg.is_list)
+
+    if not list_args:
+        def plain_hook(text: str, args: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+            return hook(text, args), args
+
+        return plain_hook
+
+    def expanding_hook(text: str, args: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        text = hook(text, args)
+
+        if not (used_list_args := _find_in_list_args(text, style, list_args)):
+            return text, args
+
+        expanded_args = dict(args)
+
+        if style.use_any:
+            for name, _ in used_list_args:
+                if isinstance(args[name], tuple):
+                    expanded_args[name] = list(args[name])
+            return _rewrite(text, style, tuple((name, index, 0) for name, index in used_list_args)), expanded_args
+
+        lists = []
+        for name, index in used_list_args:
+            values = list(args[name])
+            size = get_bucket_size(len(values))
+            # pad with the last value, which does not change the result
+            for i, value in enumerate(values + values[-1:] * (size - len(values))):
+                expanded_args[_expanded_name(name, i)] = value
+            lists.append((name, index, size))
+
+        return _rewrite(text, style, tuple(lists)), expanded_args
+
+    return expanding_hook
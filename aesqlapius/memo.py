@@ -0,0 +1,96 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from aesqlapius.args import prepare_args_as_key
+from aesqlapius.function_def import GENERATOR_FORMATS, FunctionDefinition
+
+_memo: ContextVar[Optional[Dict[Hashable, Any]]] = ContextVar('aesqlapius_memo', default=None)
+
+
+class MemoScope:
+    # usable as both sync and async context manager; nested scopes
+    # share memoized results of the outermost one
+
+    def __init__(self) -> None:
+        self._token: Optional[Token[Optional[Dict[Hashable, Any]]]] = None
+
+    def __enter__(self) -> 'MemoScope':
+        if _memo.get() is None:
+            self._token = _memo.set({})
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._token is not None:
+            _memo.reset(self._token)
+            self._token = None
+
+    async def __aenter__(self) -> 'MemoScope':
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.__exit__(*exc_info)
+
+
+def memo_scope() -> MemoScope:
+    return MemoScope()
+
+
+def clear_memo() -> None:
+    if (memo := _memo.get()) is not None:
+        memo.clear()
+
+
+def is_memoizable(func_def: FunctionDefinition) -> bool:
+    return func_def.returns is not None and func_def.returns.outer_format not in GENERATOR_FORMATS
+
+
+def generate_memoized_method(func_def: FunctionDefinition, method_func: Callable[..., Any], is_async: bool) -> Callable[..., Any]:
+    method_key = object()  # distinguishes results of different methods
+
+    if is_async:
+        async def method_memoized_async(*args: Any, **kwargs: Any) -> Any:
+            if (memo := _memo.get()) is None or (args_key := prepare_args_as_key(func_def, args, kwargs)) is None:
+                return await method_func(*args, **kwargs)
+
+            key = (method_key, args_key)
+            if key in memo:
+                return memo[key]
+
+            value = memo[key] = await method_func(*args, **kwargs)
+            return value
+
+        return method_memoized_async
+
+    else:
+        def method_memoized(*args: Any, **kwargs: Any) -> Any:
+            if (memo := _memo.get()) is None or (args_key := prepare_args_as_key(func_def, args, kwargs)) is None:
+                return method_func(*args, **kwargs)
+
+            key = (method_key, args_key)
+            if key in memo:
+                return memo[key]
+
+            value = memo[key] = method_func(*args, **kwargs)
+            return value
+
+        return method_memoized
@@ -20,32 +20,168 @@
 
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
-from typing import Any, Callable, Dict, Iterator, List
+from functools import partial
+from itertools import chain, groupby
+from operator import itemgetter
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type
+)
 
-from aesqlapius.args import prepare_args_as_dict
-from aesqlapius.function_def import ReturnValueOuterFormat
-from aesqlapius.hook import QueryHook
-from aesqlapius.output import generate_row_processor
+from aesqlapius.args import (
+    DEFAULT_BATCH_PAGE_SIZE,
+    is_columnar,
+    iter_batch_chunks_as_columns,
+    iter_batch_chunks_as_dicts,
+    iter_chunks,
+    prepare_args_as_dict
+)
+from aesqlapius.bulkload import CopySettings, get_copy_settings
+from aesqlapius.export import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    AbstractRowWriter
+)
+from aesqlapius.function_def import (
+    PAGES_KEY_ARGUMENT,
+    PAGES_LIMIT_ARGUMENT,
+    ReturnValueInnerFormat,
+    ReturnValueOuterFormat
+)
+from aesqlapius.hook import QueryPreparer, group_rows_by_statement
+from aesqlapius.nesting import NestedAssembler
+from aesqlapius.output import (
+    generate_keyed_row_processor,
+    generate_row_processor,
+    get_key_column_index
+)
+from aesqlapius.pool import is_connection_pool, pooled_connection
 from aesqlapius.query import Query
+from aesqlapius.spill import DictBuilder, ListBuilder, get_spill_limits
+from aesqlapius.staging import (
+    StageSettings,
+    get_stage_settings,
+    iter_stage_rows
+)
 
 
 class AbstractDriverDetail(ABC):
+    # positional placeholder used in generated statements
+    placeholder = '%s'
+
     @abstractmethod
-    def yield_cursor(self, db: Any, **kwargs: Dict[str, Any]) -> Iterator[Any]:
+    def yield_cursor(self, db: Any, **kwargs: Any) -> Iterator[Any]:
         pass  # pragma: no cover
 
+    def execute_many(self, cur: Any, text: str, batch: List[Any]) -> None:
+        cur.executemany(text, batch)
+
+    def copy_records(self, cur: Any, settings: CopySettings, rows: Iterable[Sequence[Any]]) -> int:
+        raise NotImplementedError('COPY is not supported by this driver')
+
+    def stage_rows(self, cur: Any, settings: StageSettings, rows: Iterator[Tuple[Any, ...]]) -> None:
+        cur.execute(settings.create_statement)
+        cur.execute(settings.clear_statement)
+        insert_statement = settings.get_insert_statement(self.placeholder)
+        for chunk in iter_chunks(rows, DEFAULT_BATCH_PAGE_SIZE):
+            self.execute_many(cur, insert_statement, chunk)
+
+    def clear_staged_rows(self, cur: Any, settings: StageSettings) -> None:
+        cur.execute(settings.clear_statement)
+
+
+class _StagingCursor:
+    # rows of the staged argument are loaded into a temporary table
+    # before the query is executed, and the argument is not passed to it
+
+    def __init__(self, cur: Any, detail: AbstractDriverDetail, settings: StageSettings) -> None:
+        self._cur = cur
+        self._detail = detail
+        self._settings = settings
+        self.staged = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cur, name)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._cur)
+
+    def execute(self, operation: str, parameters: Dict[str, Any]) -> None:
+        parameters = dict(parameters)
+        self._detail.stage_rows(self._cur, self._settings, iter_stage_rows(self._settings, parameters.pop(self._settings.arg)))
+        self.staged = True
+        self._cur.execute(operation, parameters)
+
+
+def _generate_cursor_getter(detail: AbstractDriverDetail, **kwargs: Any) -> Callable[..., Any]:
+    yield_cursor = contextmanager(partial(detail.yield_cursor, **kwargs))
 
-def generate_method_generic(query: Query, detail: AbstractDriverDetail, hook: QueryHook) -> Callable[..., Any]:
+    @contextmanager
+    def get_cursor(db: Any) -> Iterator[Any]:
+        if is_connection_pool(db):
+            with pooled_connection(db) as conn, yield_cursor(conn) as cur:
+                yield cur
+        else:
+            with yield_cursor(db) as cur:
+                yield cur
+
+    return get_cursor
+
+
+def _wrap_staging(get_cursor: Callable[..., Any], detail: AbstractDriverDetail, settings: Optional[StageSettings]) -> Callable[..., Any]:
+    if settings is None:
+        return get_cursor
+
+    @contextmanager
+    def get_staging_cursor(db: Any) -> Iterator[Any]:
+        with get_cursor(db) as cur:
+            staging_cur = _StagingCursor(cur, detail, settings)
+            yield staging_cur
+            # not done on failure, as staged rows are cleared before use anyway
+            if staging_cur.staged:
+                detail.clear_staged_rows(cur, settings)
+
+    return get_staging_cursor
+
+
+def _fetch_description(cur: Any) -> Tuple[List[str], Iterator[Any]]:
+    # named (server side) cursors of psycopg2 only get description
+    # after the first fetch, so the first row is fetched in advance
+    rows = iter(cur)
+    first_row = next(rows, None)
+    names = [desc[0] for desc in cur.description]
+    return names, rows if first_row is None else chain([first_row], rows)
+
+
+def generate_method_generic(query: Query, detail: AbstractDriverDetail, hook: QueryPreparer) -> Callable[..., Any]:
     func_def = query.func_def
     returns = func_def.returns
 
-    get_cursor = contextmanager(detail.yield_cursor)
+    spill_limits = get_spill_limits(func_def)
+
+    cursor_kwargs: Dict[str, Any] = {}
+    if returns is not None and returns.inner_format == ReturnValueInnerFormat.JSON:
+        cursor_kwargs['raw_json'] = True
+    if spill_limits is not None:
+        # avoid fetching whole result into client memory
+        cursor_kwargs['server_side'] = True
+
+    get_cursor = _wrap_staging(_generate_cursor_getter(detail, **cursor_kwargs), detail, get_stage_settings(func_def))
 
     if returns is None:
         def method_returning_none(db: Any, *args: Any, **kwargs: Any) -> None:
             with get_cursor(db) as cur:
                 prepared_args = prepare_args_as_dict(func_def, args, kwargs)
-                cur.execute(hook(query.text, prepared_args), prepared_args)
+                cur.execute(*hook(query.text, prepared_args))
 
         return method_returning_none
 
@@ -54,7 +190,7 @@ def generate_method_generic(query: Query, detail: AbstractDriverDetail, hook: Qu
             assert returns is not None  # mypy bug
             with get_cursor(db) as cur:
                 prepared_args = prepare_args_as_dict(func_def, args, kwargs)
-                cur.execute(hook(query.text, prepared_args), prepared_args)
+                cur.execute(*hook(query.text, prepared_args))
                 names = [desc[0] for desc in cur.description]
                 process_row = generate_row_processor(returns.inner_format, names)
                 yield from map(process_row, cur)
@@ -62,14 +198,24 @@ def generate_method_generic(query: Query, detail: AbstractDriverDetail, hook: Qu
         return method_returning_iterator
 
     elif returns.outer_format == ReturnValueOuterFormat.LIST:
-        def method_returning_list(db: Any, *args: Any, **kwargs: Any) -> List[Any]:
+        def method_returning_list(db: Any, *args: Any, **kwargs: Any) -> Sequence[Any]:
             assert returns is not None  # mypy bug
             with get_cursor(db) as cur:
                 prepared_args = prepare_args_as_dict(func_def, args, kwargs)
-                cur.execute(hook(query.text, prepared_args), prepared_args)
-                names = [desc[0] for desc in cur.description]
+                cur.execute(*hook(query.text, prepared_args))
+                if spill_limits is None:
+                    names, rows = [desc[0] for desc in cur.description], iter(cur)
+                else:
+                    names, rows = _fetch_description(cur)
                 process_row = generate_row_processor(returns.inner_format, names)
-                return [process_row(row) for row in cur]
+
+                if spill_limits is None:
+                    return [process_row(row) for row in rows]
+
+                builder = ListBuilder(spill_limits)
+                for row in rows:
+                    builder.append(process_row(row))
+                return builder.finish()
 
         return method_returning_list
 
@@ -78,7 +224,7 @@ def generate_method_generic(query: Query, detail: AbstractDriverDetail, hook: Qu
             assert returns is not None  # mypy bug
             with get_cursor(db) as cur:
                 prepared_args = prepare_args_as_dict(func_def, args, kwargs)
-                cur.execute(hook(query.text, prepared_args), prepared_args)
+                cur.execute(*hook(query.text, prepared_args))
                 names = [desc[0] for desc in cur.description]
                 process_row = generate_row_processor(returns.inner_format, names)
                 return process_row(cur.fetchone())
@@ -90,35 +236,182 @@ def generate_method_generic(query: Query, detail: AbstractDriverDetail, hook: Qu
             assert returns is not None  # mypy bug
             with get_cursor(db) as cur:
                 prepared_args = prepare_args_as_dict(func_def, args, kwargs)
-                cur.execute(hook(query.text, prepared_args), prepared_args)
-                names = [desc[0] for desc in cur.description]
-
-                if isinstance(returns.outer_dict_by, int):
-                    keyidx = returns.outer_dict_by
+                cur.execute(*hook(query.text, prepared_args))
+                if spill_limits is None:
+                    names, rows = [desc[0] for desc in cur.description], iter(cur)
                 else:
-                    try:
-                        keyidx = names.index(returns.outer_dict_by)
-                    except ValueError:
-                        raise KeyError(f'key column {returns.outer_dict_by} not found')
+                    names, rows = _fetch_description(cur)
+                assert returns.outer_dict_by is not None
 
-                if keyidx >= len(names):
-                    raise IndexError(f'key column index {keyidx} is out of range')
+                keyidx = get_key_column_index(names, returns.outer_dict_by)
+                process_row = generate_keyed_row_processor(returns.inner_format, names, keyidx, returns.remove_key_column)
 
-                if returns.remove_key_column:
-                    trimmed_names = names[0:keyidx] + names[keyidx + 1:]
-                    process_row = generate_row_processor(returns.inner_format, trimmed_names)
-                    return {
-                        row[keyidx]: process_row(row[0:keyidx] + row[keyidx + 1:])
-                        for row in cur
-                    }
-                else:
-                    process_row = generate_row_processor(returns.inner_format, names)
+                if spill_limits is None:
                     return {
                         row[keyidx]: process_row(row)
-                        for row in cur
+                        for row in rows
                     }
 
+                builder = DictBuilder(spill_limits)
+                for row in rows:
+                    builder.put(row[keyidx], process_row(row))
+                return builder.finish()
+
         return method_returning_dict
 
+    elif returns.outer_format == ReturnValueOuterFormat.GROUP:
+        def method_returning_group(db: Any, *args: Any, **kwargs: Any) -> Dict[Any, List[Any]]:
+            assert returns is not None  # mypy bug
+            with get_cursor(db) as cur:
+                prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+                cur.execute(*hook(query.text, prepared_args))
+                names = [desc[0] for desc in cur.description]
+                assert returns.outer_dict_by is not None
+
+                keyidx = get_key_column_index(names, returns.outer_dict_by)
+                process_row = generate_keyed_row_processor(returns.inner_format, names, keyidx, returns.remove_key_column)
+                res: Dict[Any, List[Any]] = {}
+                for row in cur:
+                    group = res.get(row[keyidx])
+                    if group is None:
+                        res[row[keyidx]] = [process_row(row)]
+                    else:
+                        group.append(process_row(row))
+                return res
+
+        return method_returning_group
+
+    elif returns.outer_format == ReturnValueOuterFormat.GROUP_ITERATOR:
+        def method_returning_group_iterator(db: Any, *args: Any, **kwargs: Any) -> Iterator[Tuple[Any, List[Any]]]:
+            assert returns is not None  # mypy bug
+            with get_cursor(db) as cur:
+                prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+                cur.execute(*hook(query.text, prepared_args))
+                names = [desc[0] for desc in cur.description]
+                assert returns.outer_dict_by is not None
+
+                keyidx = get_key_column_index(names, returns.outer_dict_by)
+                process_row = generate_keyed_row_processor(returns.inner_format, names, keyidx, returns.remove_key_column)
+                for key, rows in groupby(cur, itemgetter(keyidx)):
+                    yield key, [process_row(row) for row in rows]
+
+        return method_returning_group_iterator
+
+    elif returns.outer_format == ReturnValueOuterFormat.NESTED:
+        def method_returning_nested(db: Any, *args: Any, **kwargs: Any) -> List[Any]:
+            assert returns is not None  # mypy bug
+            with get_cursor(db) as cur:
+                prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+                cur.execute(*hook(query.text, prepared_args))
+                names = [desc[0] for desc in cur.description]
+
+                assembler = NestedAssembler(returns.inner_format, names, returns.nested_by, returns.nested_children)
+                for row in cur:
+                    assembler.add(row)
+                return assembler.result()
+
+        return method_returning_nested
+
+    elif returns.outer_format == ReturnValueOuterFormat.PAGES:
+        def method_returning_pages(db: Any, *args: Any, **kwargs: Any) -> Iterator[Any]:
+            assert returns is not None  # mypy bug
+            assert returns.outer_dict_by is not None
+            prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+            limit = prepared_args.get(PAGES_LIMIT_ARGUMENT)
+
+            # each page is fetched with a separate query, and the cursor
+            # is released before the page rows are passed to the caller
+            while True:
+                with get_cursor(db) as cur:
+                    cur.execute(*hook(query.text, prepared_args))
+                    names = [desc[0] for desc in cur.description]
+                    rows = cur.fetchall()
+
+                if not rows:
+                    return
+
+                keyidx = get_key_column_index(names, returns.outer_dict_by)
+                process_row = generate_keyed_row_processor(returns.inner_format, names, keyidx, returns.remove_key_column)
+                yield from map(process_row, rows)
+
+                if limit is not None and len(rows) < limit:
+                    return
+
+                prepared_args[PAGES_KEY_ARGUMENT] = rows[-1][keyidx]
+
+        return method_returning_pages
+
     else:
         raise NotImplementedError(f"unsupported outer return type format '{returns.outer_format}'")  # pragma: no cover
+
+
+def _generate_export_method(query: Query, detail: AbstractDriverDetail, hook: QueryPreparer, writer_class: Type[AbstractRowWriter]) -> Callable[..., Any]:
+    func_def = query.func_def
+
+    get_cursor = _wrap_staging(_generate_cursor_getter(detail, server_side=True), detail, get_stage_settings(func_def))
+
+    def method_exporting(db: Any, fileobj: IO[str], *args: Any, **kwargs: Any) -> int:
+        with get_cursor(db) as cur:
+            prepared_args = prepare_args_as_dict(func_def, args, kwargs)
+            cur.execute(*hook(query.text, prepared_args))
+            # named (server side) cursors of psycopg2 only get
+            # description after the first fetch
+            rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+            writer = writer_class(fileobj, [desc[0] for desc in cur.description])
+            count = 0
+            while rows:
+                writer.write_rows(rows)
+                count += len(rows)
+                rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+            return count
+
+    return method_exporting
+
+
+def _generate_batch_method(query: Query, detail: AbstractDriverDetail, hook: QueryPreparer) -> Callable[..., Any]:
+    func_def = query.func_def
+
+    get_cursor = _generate_cursor_getter(detail)
+
+    if is_columnar(func_def):
+        def method_many_columnar(db: Any, batch: Any, page_size: int = DEFAULT_BATCH_PAGE_SIZE) -> None:
+            with get_cursor(db) as cur:
+                for columns in iter_batch_chunks_as_columns(func_def, batch, page_size):
+                    cur.execute(*hook(query.text, columns))
+
+        return method_many_columnar
+
+    else:
+        def method_many(db: Any, batch: Any, page_size: int = DEFAULT_BATCH_PAGE_SIZE) -> None:
+            with get_cursor(db) as cur:
+                for chunk in iter_batch_chunks_as_dicts(func_def, batch, page_size):
+                    for text, rows in group_rows_by_statement(query.text, hook, chunk).items():
+                        detail.execute_many(cur, text, rows)
+
+        return method_many
+
+
+def _generate_copy_from_method(query: Query, detail: AbstractDriverDetail, settings: CopySettings) -> Callable[..., Any]:
+    get_cursor = _generate_cursor_getter(detail)
+
+    def method_copying_from(db: Any, rows: Iterable[Sequence[Any]]) -> int:
+        with get_cursor(db) as cur:
+            return detail.copy_records(cur, settings, rows)
+
+    return method_copying_from
+
+
+def generate_variants_generic(query: Query, detail: AbstractDriverDetail, hook: QueryPreparer) -> Dict[str, Callable[..., Any]]:
+    variants: Dict[str, Callable[..., Any]] = {}
+
+    if query.func_def.returns is None:
+        variants['many'] = _generate_batch_method(query, detail, hook)
+
+        # drivers which do not implement COPY get no copy_from variant
+        if (copy_settings := get_copy_settings(query.func_def)) is not None and type(detail).copy_records is not AbstractDriverDetail.copy_records:
+            variants['copy_from'] = _generate_copy_from_method(query, detail, copy_settings)
+    else:
+        for export_format, writer_class in EXPORT_FORMATS.items():
+            variants[f'to_{export_format}'] = _generate_export_method(query, detail, hook, writer_class)
+
+    return variants
@@ -18,7 +18,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from typing import Any, Callable, List, TYPE_CHECKING
+from typing import Any, List, TYPE_CHECKING
 
 
 class Namespace:
@@ -27,7 +27,7 @@ class Namespace:
             pass  # pragma: no cover
 
 
-def inject_method(root: Any, namespace_path: List[str], method: Callable[..., Any]) -> None:
+def inject_method(root: Any, namespace_path: List[str], method: Any) -> None:
     target = root
 
     for name in namespace_path[:-1]:
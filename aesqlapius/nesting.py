@@ -0,0 +1,116 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Set, Tuple, Union
+
+from aesqlapius.function_def import ReturnValueInnerFormat
+from aesqlapius.output import get_key_column_index
+
+
+def _generate_columns_getter(indexes: List[int]) -> Callable[[Any], Tuple[Any, ...]]:
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    elif not indexes:
+        return lambda row: ()
+    else:
+        return itemgetter(*indexes)
+
+
+class NestedAssembler:
+    # columns with child prefixes go into child lists, the rest form
+    # the parent object; rows sharing parent key are merged
+    _parents: Dict[Any, Tuple[List[List[Any]], List[Set[Tuple[Any, ...]]]]]
+    _result: List[Any]
+
+    def __init__(self, inner_format: Union[ReturnValueInnerFormat, str], field_names: List[str], key_columns: List[Union[str, int]], children: Dict[str, str]) -> None:
+        self._inner_format = inner_format
+
+        child_names = list(children.keys())
+        child_indexes: List[List[int]] = [[] for _ in child_names]
+        child_field_names: List[List[str]] = [[] for _ in child_names]
+        parent_indexes: List[int] = []
+
+        for index, name in enumerate(field_names):
+            for nchild, prefix in enumerate(children.values()):
+                if name.startswith(prefix):
+                    child_indexes[nchild].append(index)
+                    child_field_names[nchild].append(name[len(prefix):])
+                    break
+            else:
+                parent_indexes.append(index)
+
+        self._parent_field_names = [field_names[index] for index in parent_indexes]
+        self._child_names = child_names
+        self._child_field_names = child_field_names
+
+        self._get_key = _generate_columns_getter([get_key_column_index(field_names, key) for key in key_columns])
+        self._get_parent = _generate_columns_getter(parent_indexes)
+        self._get_children = [_generate_columns_getter(indexes) for indexes in child_indexes]
+
+        # with multiple child collections, JOIN produces cartesian
+        # product of children, so these need to be deduplicated
+        self._deduplicate = len(child_names) > 1
+
+        self._parents = {}
+        self._result = []
+
+    def _make_parent(self, values: Tuple[Any, ...], child_lists: List[List[Any]]) -> Any:
+        if self._inner_format == ReturnValueInnerFormat.DICT:
+            parent = dict(zip(self._parent_field_names, values))
+            parent.update(zip(self._child_names, child_lists))
+            return parent
+        else:
+            return values + tuple(child_lists)
+
+    def _make_child(self, nchild: int, values: Tuple[Any, ...]) -> Any:
+        if self._inner_format == ReturnValueInnerFormat.DICT:
+            return dict(zip(self._child_field_names[nchild], values))
+        else:
+            return values
+
+    def add(self, row: Any) -> None:
+        key = self._get_key(row)
+
+        entry = self._parents.get(key)
+        if entry is None:
+            entry = ([[] for _ in self._child_names], [set() for _ in self._child_names])
+            self._parents[key] = entry
+            self._result.append(self._make_parent(self._get_parent(row), entry[0]))
+
+        child_lists, seen_children = entry
+
+        for nchild, get_child in enumerate(self._get_children):
+            values = get_child(row)
+
+            # all NULL child columns come from unmatched outer JOIN
+            if all(value is None for value in values):
+                continue
+
+            if self._deduplicate:
+                if values in seen_children[nchild]:
+                    continue
+                seen_children[nchild].add(values)
+
+            child_lists[nchild].append(self._make_child(nchild, values))
+
+    def result(self) -> List[Any]:
+        return self._result
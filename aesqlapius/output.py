@@ -42,5 +42,39 @@ def generate_row_processor(inner_format: Union[ReturnValueInnerFormat, str], fie
 
         return process_row_single
 
+    elif inner_format == ReturnValueInnerFormat.JSON:
+        # JSON decoding is disabled by driver, so the value is passed as is
+        def process_row_json(row: Tuple[Any, ...]) -> Any:
+            return row[0] if row else None
+
+        return process_row_json
+
     else:
         raise NotImplementedError(f"unsupported inner return type format '{inner_format}'")  # pragma: no cover
+
+
+def get_key_column_index(field_names: List[str], key: Union[str, int]) -> int:
+    if isinstance(key, int):
+        keyidx = key
+    else:
+        try:
+            keyidx = field_names.index(key)
+        except ValueError:
+            raise KeyError(f'key column {key} not found')
+
+    if keyidx >= len(field_names):
+        raise IndexError(f'key column index {keyidx} is out of range')
+
+    return keyidx
+
+
+def generate_keyed_row_processor(inner_format: Union[ReturnValueInnerFormat, str], field_names: List[str], keyidx: int, remove_key_column: bool) -> Callable[[Tuple[Any, ...]], Any]:
+    if not remove_key_column:
+        return generate_row_processor(inner_format, field_names)
+
+    process_row = generate_row_processor(inner_format, field_names[0:keyidx] + field_names[keyidx + 1:])
+
+    def process_row_removing_key(row: Tuple[Any, ...]) -> Any:
+        return process_row(row[0:keyidx] + row[keyidx + 1:])
+
+    return process_row_removing_key
@@ -0,0 +1,75 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, List, Optional
+
+from aesqlapius.pool import ConnectionPool
+
+
+def get_pool_size(pool: Any) -> Optional[int]:
+    if isinstance(pool, ConnectionPool):
+        return pool.stats().max_size
+    # psycopg2.pool pools
+    return getattr(pool, 'maxconn', None)
+
+
+class ParallelRunner:
+    # with the API bound to a pool, calls use separate connections;
+    # results are returned in order of calls, and the exception of the
+    # first failed call is raised after all calls complete
+
+    def __init__(self, api: Any, max_workers: Optional[int] = None) -> None:
+        self._api = api
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix='aesqlapius-parallel')
+            return self._executor
+
+    def __call__(self, *calls: Callable[[Any], Any]) -> List[Any]:
+        if not calls:
+            return []
+
+        executor = self._get_executor()
+
+        # context is propagated, so context variables (such as memo
+        # scope) are visible to the calls
+        futures: List['Future[Any]'] = [
+            executor.submit(contextvars.copy_context().run, call, self._api)
+            for call in calls[1:]
+        ]
+
+        # first call is run in the calling thread, which would
+        # otherwise be idle
+        first: 'Future[Any]' = Future()
+        try:
+            first.set_result(calls[0](self._api))
+        except Exception as e:
+            first.set_exception(e)
+
+        wait(futures)
+        return [future.result() for future in [first] + futures]
@@ -0,0 +1,57 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Coroutine, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar('T')
+
+# pools mapped to connections pinned in the current context
+_pinned: ContextVar[Dict[int, Any]] = ContextVar('aesqlapius_pinned', default={})
+
+
+def get_pinned_connection(pool: Any) -> Optional[Any]:
+    return _pinned.get().get(id(pool))
+
+
+def is_pinned() -> bool:
+    return bool(_pinned.get())
+
+
+def create_unpinned_task(coro: Coroutine[Any, Any, T]) -> 'asyncio.Task[T]':
+    # tasks copy the current context, so a background task started
+    # within a pinning scope would otherwise keep using the pinned
+    # connection after the scope is left
+    context = copy_context()
+    context.run(_pinned.set, {})
+    return context.run(asyncio.create_task, coro)
+
+
+@contextmanager
+def pin(pool: Any, conn: Any) -> Iterator[Any]:
+    # applies to the current context (task and tasks created from it),
+    # so calls within the scope should not run concurrently
+    token = _pinned.set({**_pinned.get(), id(pool): conn})
+    try:
+        yield conn
+    finally:
+        _pinned.reset(token)
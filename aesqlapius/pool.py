@@ -0,0 +1,242 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional
+
+
+class PoolStats(NamedTuple):
+    max_size: Optional[int]
+    size: int
+    in_use: int
+    acquisitions: int
+    waits: int
+    timeouts: int
+    wait_time: float
+    max_wait_time: float
+
+    @property
+    def utilization(self) -> float:
+        limit = self.max_size if self.max_size is not None else self.size
+        return self.in_use / limit if limit else 0.0
+
+
+class AbstractConnectionPool(ABC):
+    # each method call acquires a connection for its execution (for
+    # Iterator results, until the iterator is exhausted or closed) and
+    # commits or rolls back before releasing it
+
+    @abstractmethod
+    def acquire(self) -> Any:
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def release(self, conn: Any, discard: bool = False) -> None:
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def stats(self) -> PoolStats:
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def close(self) -> None:
+        pass  # pragma: no cover
+
+
+def _close_quietly(conn: Any) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool(AbstractConnectionPool):
+    # callers wait up to timeout seconds for a connection to be
+    # released when all max_size connections are in use
+
+    def __init__(self, factory: Callable[[], Any], max_size: int = 10, timeout: Optional[float] = None) -> None:
+        if max_size < 1:
+            raise ValueError('max_size must be positive')
+
+        self._factory = factory
+        self._max_size = max_size
+        self._timeout = timeout
+        self._idle: List[Any] = []
+        self._size = 0
+        self._in_use = 0
+        self._acquisitions = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> Any:
+        start = time.monotonic()
+        deadline = None if self._timeout is None else start + self._timeout
+
+        with self._condition:
+            waited = False
+            while not self._idle and self._size >= self._max_size:
+                waited = True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._timeouts += 1
+                    raise TimeoutError(f'no connection available in the pool within {self._timeout} seconds')
+                self._condition.wait(remaining)
+
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._size += 1  # reserved until created
+
+            self._in_use += 1
+            self._acquisitions += 1
+            if waited:
+                wait_time = time.monotonic() - start
+                self._waits += 1
+                self._wait_time += wait_time
+                self._max_wait_time = max(self._max_wait_time, wait_time)
+
+        if conn is None:
+            try:
+                conn = self._factory()
+            except BaseException:
+                with self._condition:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._condition.notify()
+                raise
+
+        return conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        with self._condition:
+            self._in_use -= 1
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append(conn)
+            self._condition.notify()
+
+        if discard:
+            _close_quietly(conn)
+
+    def stats(self) -> PoolStats:
+        with self._condition:
+            return PoolStats(self._max_size, self._size, self._in_use, self._acquisitions, self._waits, self._timeouts, self._wait_time, self._max_wait_time)
+
+    def close(self) -> None:
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+
+        for conn in idle:
+            _close_quietly(conn)
+
+
+class ThreadLocalConnectionPool(AbstractConnectionPool):
+    # for drivers like sqlite3 which do not allow sharing connections
+    # between threads; connections of finished threads are only closed
+    # by close()
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+        self._local = threading.local()
+        self._connections: List[Any] = []
+        self._in_use = 0
+        self._acquisitions = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Any:
+        if (conn := getattr(self._local, 'conn', None)) is None:
+            conn = self._local.conn = self._factory()
+            with self._lock:
+                self._connections.append(conn)
+
+        with self._lock:
+            self._in_use += 1
+            self._acquisitions += 1
+
+        return conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        with self._lock:
+            self._in_use -= 1
+            if discard:
+                self._connections.remove(conn)
+
+        if discard:
+            self._local.conn = None
+            _close_quietly(conn)
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            return PoolStats(None, len(self._connections), self._in_use, self._acquisitions, 0, 0, 0.0, 0.0)
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+
+        self._local = threading.local()
+        for conn in connections:
+            _close_quietly(conn)
+
+
+def is_connection_pool(db: Any) -> bool:
+    # psycopg2.pool pools are detected by their interface, so psycopg2
+    # is not required to be installed
+    return isinstance(db, AbstractConnectionPool) or (hasattr(db, 'getconn') and hasattr(db, 'putconn'))
+
+
+@contextmanager
+def pooled_connection(pool: Any) -> Iterator[Any]:
+    if isinstance(pool, AbstractConnectionPool):
+        acquire, release = pool.acquire, pool.release
+    else:
+        acquire, release = pool.getconn, lambda conn, discard=False: pool.putconn(conn, close=discard)
+
+    def commit(conn: Any) -> None:
+        try:
+            conn.commit()
+        except BaseException:
+            release(conn, True)
+            raise
+        release(conn)
+
+    conn = acquire()
+    try:
+        yield conn
+    except GeneratorExit:
+        # iterator closed before being exhausted, which is not an error
+        commit(conn)
+        raise
+    except BaseException:
+        try:
+            conn.rollback()
+        except Exception:
+            release(conn, True)  # broken connection
+        else:
+            release(conn)
+        raise
+
+    commit(conn)
@@ -60,8 +60,10 @@ def _find_annotation(lines: List[str]) -> Optional[str]:
     else:
         return None
 
-    # in future, we may trace backwards here to include preceeding @decorators
+    # include preceeding @decorators
     start_idx = def_idx
+    while start_idx > 0 and lines[start_idx - 1].startswith('-- @'):
+        start_idx -= 1
 
     end_idx = def_idx + 1
     while end_idx < len(lines) and re.match(r'-- .*[^-\s]', lines[end_idx]):
@@ -70,6 +72,11 @@ def _find_annotation(lines: List[str]) -> Optional[str]:
     return ''.join(line[3:] for line in lines[start_idx:end_idx])
 
 
+def strip_statement_terminator(text: str) -> str:
+    text = text.rstrip()
+    return text[:-1] if text.endswith(';') else text
+
+
 def parse_queries_from_fd(fd: IO[str]) -> List[Query]:
     res = []
     current_annotation = ''
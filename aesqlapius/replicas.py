@@ -0,0 +1,259 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import inspect
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple
+)
+
+from aesqlapius.function_def import GENERATOR_FORMATS, FunctionDefinition
+from aesqlapius.pinning import get_pinned_connection
+
+# replica sets mapped to times of the last writes made in the current context
+_last_writes: ContextVar[Dict[int, float]] = ContextVar('aesqlapius_last_writes', default={})
+_tokens = itertools.count()
+
+# names of exception classes (including base classes) which indicate
+# an unusable connection rather than a failed query, for DB-API
+# drivers and asyncpg
+_CONNECTION_ERRORS = {
+    'InterfaceError',
+    'OperationalError',
+    'PostgresConnectionError',
+}
+
+
+def is_readonly(func_def: FunctionDefinition) -> bool:
+    readonly = func_def.decorators.get('readonly')
+    write = func_def.decorators.get('write')
+
+    for decorator in (readonly, write):
+        if decorator is not None and (decorator.args or decorator.kwargs):
+            raise TypeError(f'{func_def.name}: @{decorator.name} does not accept arguments')
+
+    if readonly is not None and write is not None:
+        raise TypeError(f'{func_def.name}: @readonly and @write are mutually exclusive')
+    elif readonly is not None:
+        return True
+    elif write is not None or func_def.decorators.get('invalidates') is not None:
+        return False
+
+    return func_def.returns is not None
+
+
+def is_connection_error(e: BaseException) -> bool:
+    return isinstance(e, OSError) or any(cls.__name__ in _CONNECTION_ERRORS for cls in type(e).__mro__)
+
+
+class ReplicaSet:
+    # reads go round-robin over healthy replicas; a replica failing with
+    # a connection error is skipped for retry_interval seconds; reads go
+    # to the primary when no replica is healthy, when the primary is
+    # pinned, and for read_your_writes seconds after a write made in the
+    # current thread or task
+
+    def __init__(self, primary: Any, replicas: Sequence[Any], read_your_writes: float = 1.0, retry_interval: float = 30.0) -> None:
+        self._primary = primary
+        self._replicas = list(replicas)
+        self._read_your_writes = read_your_writes
+        self._retry_interval = retry_interval
+        self._failed_at: List[Optional[float]] = [None] * len(self._replicas)
+        self._counter = itertools.count()
+        # id() of a garbage collected set may be reused, so writes are
+        # keyed by a unique token instead
+        self._token = next(_tokens)
+        self._lock = threading.Lock()
+
+    def mark_write(self) -> None:
+        _last_writes.set({**_last_writes.get(), self._token: time.monotonic()})
+
+    def mark_failed(self, index: int) -> None:
+        with self._lock:
+            self._failed_at[index] = time.monotonic()
+
+    def mark_succeeded(self, index: int) -> None:
+        with self._lock:
+            self._failed_at[index] = None
+
+    def healthy(self) -> List[bool]:
+        now = time.monotonic()
+        with self._lock:
+            return [failed_at is None or now - failed_at >= self._retry_interval for failed_at in self._failed_at]
+
+    def choose(self) -> Tuple[Optional[int], Any]:
+        if get_pinned_connection(self._primary) is not None:
+            return None, self._primary
+
+        if (last_write := _last_writes.get().get(self._token)) is not None and time.monotonic() - last_write < self._read_your_writes:
+            return None, self._primary
+
+        healthy = self.healthy()
+        start = next(self._counter)
+        for offset in range(len(healthy)):
+            index = (start + offset) % len(healthy)
+            if healthy[index]:
+                return index, self._replicas[index]
+
+        return None, self._primary
+
+    @property
+    def primary(self) -> Any:
+        return self._primary
+
+
+def _generate_write_method(replica_set: ReplicaSet, method_func: Callable[..., Any]) -> Callable[..., Any]:
+    # writes are marked before execution, so rows returned from lazy
+    # iterators are covered as well
+    if inspect.isasyncgenfunction(method_func):
+        async def method_write_iterating_async(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+            replica_set.mark_write()
+            async for item in method_func(replica_set.primary, *args, **kwargs):
+                yield item
+
+        return method_write_iterating_async
+
+    elif inspect.iscoroutinefunction(method_func):
+        async def method_write_async(*args: Any, **kwargs: Any) -> Any:
+            replica_set.mark_write()
+            return await method_func(replica_set.primary, *args, **kwargs)
+
+        return method_write_async
+
+    else:
+        def method_write(*args: Any, **kwargs: Any) -> Any:
+            replica_set.mark_write()
+            return method_func(replica_set.primary, *args, **kwargs)
+
+        return method_write
+
+
+def generate_write_marking_method(replica_set: ReplicaSet, method_func: Callable[..., Any]) -> Callable[..., Any]:
+    # for methods writing from other contexts (such as write-behind
+    # ones), as these writes are not visible to the caller otherwise
+    if inspect.iscoroutinefunction(method_func):
+        async def method_marking_write_async(*args: Any, **kwargs: Any) -> Any:
+            replica_set.mark_write()
+            return await method_func(*args, **kwargs)
+
+        return method_marking_write_async
+
+    else:
+        def method_marking_write(*args: Any, **kwargs: Any) -> Any:
+            replica_set.mark_write()
+            return method_func(*args, **kwargs)
+
+        return method_marking_write
+
+
+def _generate_read_method(replica_set: ReplicaSet, method_func: Callable[..., Any], is_iterator: bool, retry: bool) -> Callable[..., Any]:
+    # failed reads are retried on the primary, except for iterators
+    # and variants writing to output, which may have already produced
+    # some rows
+    if inspect.isasyncgenfunction(method_func):
+        async def method_read_iterating_async(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+            index, conn = replica_set.choose()
+            try:
+                async for item in method_func(conn, *args, **kwargs):
+                    yield item
+            except Exception as e:
+                if index is not None and is_connection_error(e):
+                    replica_set.mark_failed(index)
+                raise
+
+        return method_read_iterating_async
+
+    elif inspect.iscoroutinefunction(method_func):
+        async def method_read_async(*args: Any, **kwargs: Any) -> Any:
+            index, conn = replica_set.choose()
+            if index is None:
+                return await method_func(conn, *args, **kwargs)
+            try:
+                result = await method_func(conn, *args, **kwargs)
+            except Exception as e:
+                if not is_connection_error(e):
+                    raise
+                replica_set.mark_failed(index)
+                if not retry:
+                    raise
+                return await method_func(replica_set.primary, *args, **kwargs)
+            replica_set.mark_succeeded(index)
+            return result
+
+        return method_read_async
+
+    elif is_iterator:
+        def method_read_iterating(*args: Any, **kwargs: Any) -> Iterator[Any]:
+            index, conn = replica_set.choose()
+            try:
+                yield from method_func(conn, *args, **kwargs)
+            except Exception as e:
+                if index is not None and is_connection_error(e):
+                    replica_set.mark_failed(index)
+                raise
+
+        return method_read_iterating
+
+    else:
+        def method_read(*args: Any, **kwargs: Any) -> Any:
+            index, conn = replica_set.choose()
+            if index is None:
+                return method_func(conn, *args, **kwargs)
+            try:
+                result = method_func(conn, *args, **kwargs)
+            except Exception as e:
+                if not is_connection_error(e):
+                    raise
+                replica_set.mark_failed(index)
+                if not retry:
+                    raise
+                return method_func(replica_set.primary, *args, **kwargs)
+            replica_set.mark_succeeded(index)
+            return result
+
+        return method_read
+
+
+def generate_replicated_methods(replica_set: ReplicaSet, func_def: FunctionDefinition, method_func: Callable[..., Any], variants: Dict[str, Callable[..., Any]]) -> Tuple[Callable[..., Any], Dict[str, Callable[..., Any]]]:
+    if not is_readonly(func_def):
+        return (
+            _generate_write_method(replica_set, method_func),
+            {name: _generate_write_method(replica_set, variant) for name, variant in variants.items()}
+        )
+
+    is_iterator = func_def.returns is not None and func_def.returns.outer_format in GENERATOR_FORMATS
+
+    # variants of methods returning rows (to_csv, copy_to_csv and
+    # such) stream rows into the output, so these are not retried
+    return (
+        _generate_read_method(replica_set, method_func, is_iterator, not is_iterator),
+        {name: _generate_read_method(replica_set, variant, False, False) for name, variant in variants.items()}
+    )
@@ -0,0 +1,502 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import queue
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union
+)
+
+from aesqlapius.args import (
+    DEFAULT_BATCH_PAGE_SIZE,
+    is_columnar,
+    iter_batch_chunks_as_dicts,
+    iter_chunks,
+    prepare_args_as_dict
+)
+from aesqlapius.executor import EXECUTOR_CHUNK_SIZE, EXECUTOR_QUEUE_SIZE
+from aesqlapius.function_def import (
+    GENERATOR_FORMATS,
+    FunctionDefinition,
+    ReturnValueInnerFormat,
+    ReturnValueOuterFormat
+)
+
+ShardRouter = Callable[[Any, int], int]
+
+
+@dataclass
+class ShardBySettings:
+    arg: str
+
+
+@dataclass
+class BroadcastSettings:
+    order_by: Union[None, str, int] = None
+    reverse: bool = False
+
+
+_BROADCAST_FORMATS = {
+    ReturnValueOuterFormat.ITERATOR,
+    ReturnValueOuterFormat.LIST,
+    ReturnValueOuterFormat.SINGLE,
+    ReturnValueOuterFormat.DICT,
+    ReturnValueOuterFormat.GROUP,
+    ReturnValueOuterFormat.NESTED,
+}
+
+_ORDERED_FORMATS = {
+    ReturnValueOuterFormat.ITERATOR,
+    ReturnValueOuterFormat.LIST,
+    ReturnValueOuterFormat.NESTED,
+}
+
+
+def get_sharding_settings(func_def: FunctionDefinition) -> Union[ShardBySettings, BroadcastSettings]:
+    shard_by = func_def.decorators.get('shard_by')
+    broadcast = func_def.decorators.get('broadcast')
+
+    if shard_by is not None and broadcast is None:
+        settings = ShardBySettings(*shard_by.args, **shard_by.kwargs)
+        if settings.arg not in {arg.name for arg in func_def.args}:
+            raise TypeError(f"{func_def.name}: @shard_by argument '{settings.arg}' is not declared")
+        return settings
+
+    elif broadcast is not None and shard_by is None:
+        broadcast_settings = BroadcastSettings(*broadcast.args, **broadcast.kwargs)
+        if func_def.returns is not None and func_def.returns.outer_format not in _BROADCAST_FORMATS:
+            raise TypeError(f'{func_def.name}: @broadcast is not supported for {func_def.returns.outer_format.name.lower()} rows format')
+        if broadcast_settings.order_by is not None and (func_def.returns is None or func_def.returns.outer_format not in _ORDERED_FORMATS):
+            raise TypeError(f'{func_def.name}: @broadcast order_by is only supported for Iterator, List and Nested rows formats')
+        if isinstance(broadcast_settings.order_by, str) and func_def.returns is not None and func_def.returns.inner_format == ReturnValueInnerFormat.TUPLE:
+            raise TypeError(f'{func_def.name}: @broadcast order_by must be a column index for Tuple rows')
+        return broadcast_settings
+
+    else:
+        raise TypeError(f'{func_def.name}: methods of sharded APIs must be declared with either @shard_by or @broadcast')
+
+
+def default_shard_router(key: Any, count: int) -> int:
+    if isinstance(key, int):
+        return key % count
+    elif isinstance(key, bytes):
+        return zlib.crc32(key) % count
+    # unlike hash(), this is stable between processes
+    return zlib.crc32(str(key).encode('utf-8')) % count
+
+
+def _make_sort_key(func_def: FunctionDefinition, settings: BroadcastSettings) -> Optional[Callable[[Any], Any]]:
+    if settings.order_by is None:
+        return None
+
+    assert func_def.returns is not None
+    if func_def.returns.inner_format == ReturnValueInnerFormat.VALUE:
+        return None  # values are compared directly
+
+    order_by = settings.order_by
+    return lambda row: row[order_by]
+
+
+def _generate_merger(func_def: FunctionDefinition, settings: BroadcastSettings) -> Callable[[List[Any]], Any]:
+    returns = func_def.returns
+    sort_key = _make_sort_key(func_def, settings)
+
+    if returns is None:
+        def merge_none(results: List[Any]) -> None:
+            return None
+
+        return merge_none
+
+    elif returns.outer_format == ReturnValueOuterFormat.SINGLE:
+        def merge_single(results: List[Any]) -> Any:
+            return next((result for result in results if result is not None), None)
+
+        return merge_single
+
+    elif returns.outer_format == ReturnValueOuterFormat.DICT:
+        def merge_dict(results: List[Dict[Any, Any]]) -> Dict[Any, Any]:
+            merged: Dict[Any, Any] = {}
+            for result in results:
+                merged.update(result)
+            return merged
+
+        return merge_dict
+
+    elif returns.outer_format == ReturnValueOuterFormat.GROUP:
+        def merge_group(results: List[Dict[Any, List[Any]]]) -> Dict[Any, List[Any]]:
+            merged: Dict[Any, List[Any]] = {}
+            for result in results:
+                for key, rows in result.items():
+                    merged.setdefault(key, []).extend(rows)
+            return merged
+
+        return merge_group
+
+    elif settings.order_by is not None:
+        def merge_ordered(results: List[List[Any]]) -> List[Any]:
+            return list(heapq.merge(*results, key=sort_key, reverse=settings.reverse))
+
+        return merge_ordered
+
+    else:
+        def merge_concatenated(results: List[List[Any]]) -> List[Any]:
+            return list(itertools.chain.from_iterable(results))
+
+        return merge_concatenated
+
+
+class _ReversedKey:
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _ReversedKey) and bool(other.value == self.value)
+
+    def __lt__(self, other: '_ReversedKey') -> bool:
+        return bool(other.value < self.value)
+
+
+async def _merge_async_iterators(iterators: List[AsyncIterator[Any]], sort_key: Optional[Callable[[Any], Any]], reverse: bool) -> AsyncIterator[Any]:
+    def key(item: Any) -> Any:
+        value = item if sort_key is None else sort_key(item)
+        return _ReversedKey(value) if reverse else value
+
+    # heap items are ordered by key, then by shard index, so rows
+    # themselves are never compared
+    heap: List[Tuple[Any, int, Any]] = []
+
+    try:
+        for index, iterator in enumerate(iterators):
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                continue
+            heap.append((key(item), index, item))
+
+        heapq.heapify(heap)
+
+        while heap:
+            _, index, item = heap[0]
+            yield item
+            try:
+                item = await iterators[index].__anext__()
+            except StopAsyncIteration:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (key(item), index, item))
+    finally:
+        for iterator in iterators:
+            if (aclose := getattr(iterator, 'aclose', None)) is not None:
+                await aclose()
+
+
+async def _chain_async_iterators(iterators: List[AsyncIterator[Any]]) -> AsyncIterator[Any]:
+    try:
+        for iterator in iterators:
+            async for item in iterator:
+                yield item
+    finally:
+        for iterator in iterators:
+            if (aclose := getattr(iterator, 'aclose', None)) is not None:
+                await aclose()
+
+
+# chunk of items, or None with an optional exception at the end
+_QueueItem = Tuple[Optional[List[Any]], Optional[BaseException]]
+
+
+class _Prefetcher:
+    # the generator is consumed by a background thread, and items are
+    # passed in chunks through a bounded queue, so shards are queried
+    # concurrently; dedicated threads are used, as producers sharing a
+    # bounded pool could block each other
+
+    def __init__(self, generate: Callable[[], Generator[Any, None, None]]) -> None:
+        self._generate = generate
+        self._chunks: 'queue.Queue[_QueueItem]' = queue.Queue(EXECUTOR_QUEUE_SIZE)
+        self._stopped = threading.Event()
+        # context is propagated, so context variables are visible to the generator
+        self._producer = threading.Thread(target=contextvars.copy_context().run, args=(self._produce,), name='aesqlapius-shard-prefetch', daemon=True)
+        self._producer.start()
+
+    def _produce(self) -> None:
+        try:
+            generator = self._generate()
+            try:
+                for chunk in iter_chunks(generator, EXECUTOR_CHUNK_SIZE):
+                    if self._stopped.is_set():
+                        return
+                    self._chunks.put((chunk, None))  # blocks while the queue is full
+            finally:
+                generator.close()
+        except BaseException as e:
+            self._chunks.put((None, e))
+        else:
+            self._chunks.put((None, None))
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            chunk, error = self._chunks.get()
+            if error is not None:
+                raise error
+            if chunk is None:
+                break
+            yield from chunk
+
+    def close(self) -> None:
+        self._stopped.set()
+        # unblock the producer and wait for it to release resources
+        while self._producer.is_alive():
+            while not self._chunks.empty():
+                self._chunks.get_nowait()
+            self._producer.join(0.01)
+
+
+class _AsyncPrefetcher:
+    # asynchronous counterpart of _Prefetcher: the iterator is consumed
+    # by a separate task through a bounded queue, so all shards are
+    # queried concurrently
+
+    def __init__(self, iterator: AsyncIterator[Any]) -> None:
+        self._iterator = iterator
+        # (False, item), or (True, optional exception) at the end
+        self._items: 'asyncio.Queue[Tuple[bool, Any]]' = asyncio.Queue(EXECUTOR_CHUNK_SIZE)
+        self._finished = False
+        self._producer = asyncio.create_task(self._produce())
+
+    async def _produce(self) -> None:
+        try:
+            async for item in self._iterator:
+                await self._items.put((False, item))  # blocks while the queue is full
+        except Exception as e:
+            await self._items.put((True, e))
+        else:
+            await self._items.put((True, None))
+        finally:
+            if (aclose := getattr(self._iterator, 'aclose', None)) is not None:
+                await aclose()
+
+    def __aiter__(self) -> '_AsyncPrefetcher':
+        return self
+
+    async def __anext__(self) -> Any:
+        if self._finished:
+            raise StopAsyncIteration
+
+        finished, value = await self._items.get()
+        if not finished:
+            return value
+
+        self._finished = True
+        if value is not None:
+            raise value
+        raise StopAsyncIteration
+
+    async def aclose(self) -> None:
+        self._producer.cancel()
+        # not awaited directly, so cancellation of the caller is not swallowed
+        await asyncio.wait([self._producer])
+
+
+def _generate_routed_method(func_def: FunctionDefinition, method_func: Callable[..., Any], route: Callable[..., Any], is_async: bool) -> Callable[..., Any]:
+    is_iterator = func_def.returns is not None and func_def.returns.outer_format in GENERATOR_FORMATS
+
+    if is_async and is_iterator:
+        async def method_routed_iterating_async(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+            async for item in method_func(route(args, kwargs), *args, **kwargs):
+                yield item
+
+        return method_routed_iterating_async
+
+    elif is_async:
+        async def method_routed_async(*args: Any, **kwargs: Any) -> Any:
+            return await method_func(route(args, kwargs), *args, **kwargs)
+
+        return method_routed_async
+
+    else:
+        # also works for methods returning generators
+        def method_routed(*args: Any, **kwargs: Any) -> Any:
+            return method_func(route(args, kwargs), *args, **kwargs)
+
+        return method_routed
+
+
+class ShardedMethodGenerator:
+    # @shard_by methods are routed to a single shard by the value of
+    # an argument, @broadcast ones run on all shards concurrently with
+    # results merged; of variants, only many() is supported
+
+    def __init__(self, shards: Sequence[Any], router: ShardRouter, is_async: bool) -> None:
+        if not shards:
+            raise ValueError('at least one shard is required')
+
+        self._shards = list(shards)
+        self._router = router
+        self._is_async = is_async
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _run_all_sync(self, calls: List[Callable[[], Any]]) -> List[Any]:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(len(self._shards), thread_name_prefix='aesqlapius-shard')
+
+        # context is propagated, so context variables are visible to the calls
+        futures: List['Future[Any]'] = [self._executor.submit(contextvars.copy_context().run, call) for call in calls[1:]]
+
+        # first call is run in the calling thread, which would otherwise be idle
+        first: 'Future[Any]' = Future()
+        try:
+            first.set_result(calls[0]())
+        except Exception as e:
+            first.set_exception(e)
+
+        wait(futures)
+        return [future.result() for future in [first] + futures]
+
+    def _get_shard_index(self, func_def: FunctionDefinition, settings: ShardBySettings, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> int:
+        return self._router(prepare_args_as_dict(func_def, args, kwargs)[settings.arg], len(self._shards))
+
+    def generate(self, func_def: FunctionDefinition, method_func: Callable[..., Any], variants: Dict[str, Callable[..., Any]]) -> Tuple[Callable[..., Any], Dict[str, Callable[..., Any]]]:
+        settings = get_sharding_settings(func_def)
+
+        if isinstance(settings, ShardBySettings):
+            return self._generate_routed(func_def, settings, method_func, variants)
+        else:
+            return self._generate_broadcast(func_def, settings, method_func, variants)
+
+    def _generate_routed(self, func_def: FunctionDefinition, settings: ShardBySettings, method_func: Callable[..., Any], variants: Dict[str, Callable[..., Any]]) -> Tuple[Callable[..., Any], Dict[str, Callable[..., Any]]]:
+        def route(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+            return self._shards[self._get_shard_index(func_def, settings, args, kwargs)]
+
+        routed_variants: Dict[str, Callable[..., Any]] = {}
+
+        if (method_many := variants.get('many')) is not None and not is_columnar(func_def):
+            def split_batch(batch: Any) -> Dict[int, List[Dict[str, Any]]]:
+                shard_batches: Dict[int, List[Dict[str, Any]]] = {}
+                for chunk in iter_batch_chunks_as_dicts(func_def, batch, DEFAULT_BATCH_PAGE_SIZE):
+                    for row in chunk:
+                        shard_batches.setdefault(self._get_shard_index(func_def, settings, (), row), []).append(row)
+                return shard_batches
+
+            if self._is_async:
+                async def method_many_routed_async(batch: Any, page_size: int = DEFAULT_BATCH_PAGE_SIZE) -> None:
+                    await asyncio.gather(*(
+                        method_many(self._shards[index], rows, page_size)
+                        for index, rows in split_batch(batch).items()
+                    ))
+
+                routed_variants['many'] = method_many_routed_async
+
+            else:
+                def method_many_routed(batch: Any, page_size: int = DEFAULT_BATCH_PAGE_SIZE) -> None:
+                    self._run_all_sync([
+                        partial(method_many, self._shards[index], rows, page_size)
+                        for index, rows in split_batch(batch).items()
+                    ] or [lambda: None])
+
+                routed_variants['many'] = method_many_routed
+
+        return _generate_routed_method(func_def, method_func, route, self._is_async), routed_variants
+
+    def _generate_broadcast(self, func_def: FunctionDefinition, settings: BroadcastSettings, method_func: Callable[..., Any], variants: Dict[str, Callable[..., Any]]) -> Tuple[Callable[..., Any], Dict[str, Callable[..., Any]]]:
+        broadcast_variants: Dict[str, Callable[..., Any]] = {}
+        merge = _generate_merger(func_def, settings)
+        sort_key = _make_sort_key(func_def, settings)
+        is_iterator = func_def.returns is not None and func_def.returns.outer_format in GENERATOR_FORMATS
+
+        method: Callable[..., Any]
+
+        if self._is_async and is_iterator:
+            async def method_broadcast_iterating_async(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+                iterators: List[AsyncIterator[Any]] = [_AsyncPrefetcher(method_func(shard, *args, **kwargs)) for shard in self._shards]
+                merged = _chain_async_iterators(iterators) if settings.order_by is None else _merge_async_iterators(iterators, sort_key, settings.reverse)
+                async for item in merged:
+                    yield item
+
+            method = method_broadcast_iterating_async
+
+        elif self._is_async:
+            async def method_broadcast_async(*args: Any, **kwargs: Any) -> Any:
+                return merge(await asyncio.gather(*(method_func(shard, *args, **kwargs) for shard in self._shards)))
+
+            method = method_broadcast_async
+
+        elif is_iterator:
+            def method_broadcast_iterating(*args: Any, **kwargs: Any) -> Iterator[Any]:
+                prefetchers = [_Prefetcher(partial(method_func, shard, *args, **kwargs)) for shard in self._shards]
+                try:
+                    if settings.order_by is None:
+                        yield from itertools.chain.from_iterable(prefetchers)
+                    else:
+                        yield from heapq.merge(*prefetchers, key=sort_key, reverse=settings.reverse)
+                finally:
+                    for prefetcher in prefetchers:
+                        prefetcher.close()
+
+            method = method_broadcast_iterating
+
+        else:
+            def method_broadcast(*args: Any, **kwargs: Any) -> Any:
+                return merge(self._run_all_sync([partial(method_func, shard, *args, **kwargs) for shard in self._shards]))
+
+            method = method_broadcast
+
+        if (method_many := variants.get('many')) is not None:
+            # the batch may be an iterator, so it's materialized once to
+            # be passed to every shard (columnar batches are mappings)
+            def materialize(batch: Any) -> Any:
+                return batch if isinstance(batch, Mapping) else list(batch)
+
+            if self._is_async:
+                async def method_many_broadcast_async(batch: Any, page_size: int = DEFAULT_BATCH_PAGE_SIZE) -> None:
+                    rows = materialize(batch)
+                    await asyncio.gather(*(method_many(shard, rows, page_size) for shard in self._shards))
+
+                broadcast_variants['many'] = method_many_broadcast_async
+
+            else:
+                def method_many_broadcast(batch: Any, page_size: int = DEFAULT_BATCH_PAGE_SIZE) -> None:
+                    rows = materialize(batch)
+                    self._run_all_sync([partial(method_many, shard, rows, page_size) for shard in self._shards])
+
+                broadcast_variants['many'] = method_many_broadcast
+
+        return method, broadcast_variants
@@ -0,0 +1,85 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+from typing import Any, Callable, Dict, Hashable
+
+from aesqlapius.args import prepare_args_as_key
+from aesqlapius.function_def import GENERATOR_FORMATS, FunctionDefinition
+from aesqlapius.pinning import create_unpinned_task, is_pinned
+
+
+def is_singleflight(func_def: FunctionDefinition, is_async: bool) -> bool:
+    if (decorator := func_def.decorators.get('singleflight')) is None:
+        return False
+
+    if decorator.args or decorator.kwargs:
+        raise TypeError(f'{func_def.name}: @singleflight does not accept arguments')
+
+    if not is_async:
+        raise TypeError(f'{func_def.name}: @singleflight is only supported for asynchronous drivers')
+
+    if func_def.returns is None or func_def.returns.outer_format in GENERATOR_FORMATS:
+        raise TypeError(f'{func_def.name}: @singleflight is not supported for methods returning None or iterators')
+
+    return True
+
+
+class _Flight:
+    def __init__(self, task: 'asyncio.Future[Any]') -> None:
+        self.task = task
+        self.waiters = 0
+
+
+def generate_singleflight_method(func_def: FunctionDefinition, method_func: Callable[..., Any]) -> Callable[..., Any]:
+    flights: Dict[Hashable, _Flight] = {}
+
+    def finish(key: Hashable, flight: _Flight) -> None:
+        if flights.get(key) is flight:
+            del flights[key]
+
+    async def method_singleflight(*args: Any, **kwargs: Any) -> Any:
+        # pinned connection (and its transaction) is not to be shared
+        # with other callers
+        if is_pinned() or (key := prepare_args_as_key(func_def, args, kwargs)) is None:
+            return await method_func(*args, **kwargs)
+
+        flight = flights.get(key)
+        if flight is None or flight.task.get_loop() is not asyncio.get_running_loop():
+            flight = _Flight(create_unpinned_task(method_func(*args, **kwargs)))
+            flight.task.add_done_callback(lambda _: finish(key, flight))
+            flights[key] = flight
+
+        flight.waiters += 1
+        try:
+            # shielded, so a cancelled caller does not cancel the query
+            # other callers still wait for
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1:
+                flight.task.cancel()
+                # removed right away, so callers arriving before the
+                # task actually finishes start a new query
+                finish(key, flight)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    return method_singleflight
@@ -0,0 +1,298 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from aesqlapius.function_def import (
+    FunctionDefinition,
+    ReturnValueInnerFormat,
+    ReturnValueOuterFormat
+)
+from aesqlapius.pinning import create_unpinned_task
+
+_logger = logging.getLogger(__name__)
+
+# listen(channel, callback) subscribes to notifications and returns
+# a coroutine function which unsubscribes
+ListenFunction = Callable[[str, Callable[[], None]], Awaitable[Callable[[], Awaitable[None]]]]
+
+
+class SnapshotInfo(NamedTuple):
+    age: Optional[float]  # seconds since last successful load
+    last_error: Optional[BaseException]  # error of the last failed refresh
+
+
+@dataclass
+class SnapshotSettings:
+    interval: Optional[float] = None
+    watermark: Optional[str] = None
+    channel: Optional[str] = None
+
+
+def get_snapshot_settings(func_def: FunctionDefinition) -> Optional[SnapshotSettings]:
+    if (decorator := func_def.decorators.get('snapshot')) is None:
+        return None
+
+    if func_def.returns is None or func_def.returns.outer_format != ReturnValueOuterFormat.DICT:
+        raise TypeError(f'{func_def.name}: @snapshot is only supported for methods returning Dict')
+
+    settings = SnapshotSettings(*decorator.args, **decorator.kwargs)
+
+    if settings.interval is not None and settings.interval <= 0:
+        raise TypeError(f'{func_def.name}: invalid @snapshot interval')
+
+    if settings.watermark is None:
+        if func_def.args:
+            raise TypeError(f'{func_def.name}: @snapshot method must not have arguments')
+    else:
+        if func_def.returns.inner_format != ReturnValueInnerFormat.DICT:
+            raise TypeError(f'{func_def.name}: @snapshot watermark requires Dict rows')
+        if len(func_def.args) != 1:
+            raise TypeError(f'{func_def.name}: @snapshot method with watermark must have single argument')
+
+    return settings
+
+
+class _SnapshotState:
+    def __init__(self) -> None:
+        self._loaded_at: Optional[float] = None
+        self._last_error: Optional[BaseException] = None
+
+    def _loaded(self) -> None:
+        self._loaded_at = time.monotonic()
+        self._last_error = None
+
+    def _failed(self, error: BaseException, background: bool) -> None:
+        self._last_error = error
+        if background:
+            # previous snapshot is kept until next successful refresh
+            _logger.error('background refresh of snapshot failed', exc_info=error)
+
+    def info(self) -> SnapshotInfo:
+        return SnapshotInfo(
+            None if self._loaded_at is None else time.monotonic() - self._loaded_at,
+            self._last_error,
+        )
+
+
+def _merge(settings: SnapshotSettings, data: Optional[Dict[Any, Any]], watermark: Any, rows: Dict[Any, Any]) -> Tuple[Dict[Any, Any], Any]:
+    if settings.watermark is None:
+        return rows, None
+
+    merged = {} if data is None else dict(data)
+    merged.update(rows)
+
+    for row in rows.values():
+        if (value := row[settings.watermark]) is not None and (watermark is None or value > watermark):
+            watermark = value
+
+    return merged, watermark
+
+
+class _ThreadSnapshot(_SnapshotState):
+    # loaded on first access, then refreshed by a background thread
+
+    def __init__(self, settings: SnapshotSettings, method_func: Callable[..., Any]) -> None:
+        super().__init__()
+        self._settings = settings
+        self._method_func = method_func
+        self._data: Optional[Dict[Any, Any]] = None
+        self._watermark: Any = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _load(self) -> Dict[Any, Any]:
+        # called with lock held
+        args = () if self._settings.watermark is None else (self._watermark,)
+        # the dict is replaced in a single assignment, so readers
+        # never see partially updated snapshot
+        try:
+            rows = self._method_func(*args)
+        except Exception as e:
+            self._failed(e, threading.current_thread() is self._thread)
+            raise
+        self._data, self._watermark = _merge(self._settings, self._data, self._watermark, rows)
+        self._loaded()
+        return self._data
+
+    def get(self) -> Dict[Any, Any]:
+        if (data := self._data) is not None:
+            return data
+
+        with self._lock:
+            if self._data is not None:
+                return self._data
+
+            data = self._load()
+
+            if self._settings.interval is not None:
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name='aesqlapius-snapshot', daemon=True)
+                self._thread.start()
+
+            return data
+
+    def refresh(self) -> None:
+        if self._data is None:
+            self.get()
+            return
+
+        with self._lock:
+            self._load()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._data = None
+            self._watermark = None
+            self._loaded_at = None
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._settings.interval):
+            try:
+                self.refresh()
+            except Exception:
+                pass  # reported by _load()
+
+
+class _AsyncSnapshot(_SnapshotState):
+    # loaded on first access, then refreshed by a background task
+    # (started in the event loop of the first call) on interval and on
+    # notifications from the channel
+
+    def __init__(self, settings: SnapshotSettings, method_func: Callable[..., Any], listen: Optional[ListenFunction]) -> None:
+        super().__init__()
+        self._settings = settings
+        self._method_func = method_func
+        self._listen = listen
+        self._data: Optional[Dict[Any, Any]] = None
+        self._watermark: Any = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional['asyncio.Task[None]'] = None
+        self._unlisten: Optional[Callable[[], Awaitable[None]]] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _load(self) -> Dict[Any, Any]:
+        # called with lock held
+        args = () if self._settings.watermark is None else (self._watermark,)
+        try:
+            rows = await self._method_func(*args)
+        except Exception as e:
+            self._failed(e, asyncio.current_task() is self._task)
+            raise
+        self._data, self._watermark = _merge(self._settings, self._data, self._watermark, rows)
+        self._loaded()
+        return self._data
+
+    async def get(self) -> Dict[Any, Any]:
+        if (data := self._data) is not None:
+            return data
+
+        async with self._get_lock():
+            if self._data is not None:
+                return self._data
+
+            wakeup = asyncio.Event()
+
+            # subscribe before loading, so no changes are missed
+            if self._settings.channel is not None and self._listen is not None:
+                self._unlisten = await self._listen(self._settings.channel, wakeup.set)
+
+            try:
+                data = await self._load()
+            except BaseException:
+                await self._stop_listening()
+                raise
+
+            if self._settings.interval is not None or self._settings.channel is not None:
+                self._task = create_unpinned_task(self._run(wakeup))
+
+            return data
+
+    async def refresh(self) -> None:
+        if self._data is None:
+            await self.get()
+            return
+
+        async with self._get_lock():
+            await self._load()
+
+    async def _stop_listening(self) -> None:
+        if self._unlisten is not None:
+            await self._unlisten()
+            self._unlisten = None
+
+    async def stop(self) -> None:
+        await self._stop_listening()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        async with self._get_lock():
+            self._data = None
+            self._watermark = None
+            self._loaded_at = None
+
+    async def _run(self, wakeup: asyncio.Event) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), self._settings.interval)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+
+            try:
+                await self.refresh()
+            except Exception:
+                pass  # reported by _load()
+
+
+def generate_snapshot_method(settings: SnapshotSettings, method_func: Callable[..., Any], is_async: bool, listen: Optional[ListenFunction] = None) -> Tuple[Callable[..., Any], Callable[..., Any], Callable[..., Any], Callable[..., Any]]:
+    # with watermark, method_func is passed the greatest watermark seen
+    # (None for initial load) and returned rows are merged into the
+    # snapshot; failed background refreshes keep the previous snapshot
+    if is_async:
+        async_snapshot = _AsyncSnapshot(settings, method_func, listen)
+
+        async def method_snapshot_async() -> Dict[Any, Any]:
+            return await async_snapshot.get()
+
+        return method_snapshot_async, async_snapshot.refresh, async_snapshot.stop, async_snapshot.info
+
+    else:
+        thread_snapshot = _ThreadSnapshot(settings, method_func)
+
+        def method_snapshot() -> Dict[Any, Any]:
+            return thread_snapshot.get()
+
+        return method_snapshot, thread_snapshot.refresh, thread_snapshot.stop, thread_snapshot.info
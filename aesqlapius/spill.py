@@ -0,0 +1,251 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import pickle
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    overload
+)
+
+from aesqlapius.function_def import FunctionDefinition, ReturnValueOuterFormat
+
+_CHUNK_SIZE = 1000
+
+
+@dataclass
+class SpillLimits:
+    max_rows: Optional[int] = None
+    max_bytes: Optional[int] = None
+
+
+def get_spill_limits(func_def: FunctionDefinition) -> Optional[SpillLimits]:
+    if (decorator := func_def.decorators.get('spill')) is None:
+        return None
+
+    if func_def.returns is None or func_def.returns.outer_format not in (ReturnValueOuterFormat.LIST, ReturnValueOuterFormat.DICT):
+        raise TypeError(f'{func_def.name}: @spill is only supported for List and Dict rows formats')
+
+    limits = SpillLimits(*decorator.args, **decorator.kwargs)
+
+    if limits.max_rows is None and limits.max_bytes is None:
+        raise TypeError(f'{func_def.name}: @spill requires max_rows or max_bytes limit')
+
+    return limits
+
+
+def _dumps(value: Any) -> bytes:
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+class _Storage:
+    # private temporary sqlite database, removed when connection is closed
+
+    def __init__(self, schema: str) -> None:
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect('', check_same_thread=False)
+        self.db.execute(schema)
+
+    def iter_column(self, table: str, column: str) -> Iterator[bytes]:
+        last_rowid = 0
+        while True:
+            with self.lock:
+                chunk = self.db.execute(f'SELECT rowid, {column} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?', (last_rowid, _CHUNK_SIZE)).fetchall()
+            if not chunk:
+                return
+            for last_rowid, value in chunk:
+                yield value
+
+
+class SpilledList(Sequence[Any]):
+    # read-only list, part of which is stored on disk
+
+    def __init__(self, head: List[Any], storage: _Storage, spilled_count: int) -> None:
+        self._head = head
+        self._storage = storage
+        self._spilled_count = spilled_count
+
+    def __len__(self) -> int:
+        return len(self._head) + self._spilled_count
+
+    @overload
+    def __getitem__(self, index: int) -> Any:
+        ...  # pragma: no cover
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Any]:
+        ...  # pragma: no cover
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('list index out of range')
+
+        if index < len(self._head):
+            return self._head[index]
+
+        with self._storage.lock:
+            row = self._storage.db.execute('SELECT value FROM items WHERE rowid = ?', (index - len(self._head) + 1,)).fetchone()
+
+        return pickle.loads(row[0])
+
+    def __iter__(self) -> Iterator[Any]:
+        yield from self._head
+        for value in self._storage.iter_column('items', 'value'):
+            yield pickle.loads(value)
+
+
+class SpilledDict(Mapping[Any, Any]):
+    # read-only dict, part of which is stored on disk
+
+    def __init__(self, head: Dict[Any, Any], storage: _Storage, spilled_count: int) -> None:
+        self._head = head
+        self._storage = storage
+        self._spilled_count = spilled_count
+
+    def __len__(self) -> int:
+        return len(self._head) + self._spilled_count
+
+    def __getitem__(self, key: Any) -> Any:
+        try:
+            return self._head[key]
+        except KeyError:
+            pass
+
+        with self._storage.lock:
+            row = self._storage.db.execute('SELECT value FROM items WHERE key = ?', (_dumps(key),)).fetchone()
+
+        if row is None:
+            raise KeyError(key)
+
+        return pickle.loads(row[0])
+
+    def __iter__(self) -> Iterator[Any]:
+        yield from self._head
+        for key in self._storage.iter_column('items', 'key'):
+            yield pickle.loads(key)
+
+
+class _AbstractBuilder(ABC):
+    def __init__(self, limits: SpillLimits) -> None:
+        self._limits = limits
+        self._head_rows = 0
+        self._head_bytes = 0
+        self._storage: Optional[_Storage] = None
+        self._pending: List[Tuple[bytes, ...]] = []
+        self._spilled_count = 0
+
+    def _fits_in_memory(self, value: Any) -> bool:
+        if self._limits.max_rows is not None and self._head_rows >= self._limits.max_rows:
+            return False
+
+        if self._limits.max_bytes is not None:
+            self._head_bytes += len(_dumps(value))
+            if self._head_bytes > self._limits.max_bytes:
+                return False
+
+        self._head_rows += 1
+        return True
+
+    @abstractmethod
+    def _flush(self) -> None:
+        pass  # pragma: no cover
+
+    def _spill(self, item: Tuple[bytes, ...]) -> None:
+        self._pending.append(item)
+        if len(self._pending) >= _CHUNK_SIZE:
+            self._flush()
+
+
+class ListBuilder(_AbstractBuilder):
+    def __init__(self, limits: SpillLimits) -> None:
+        super().__init__(limits)
+        self._head: List[Any] = []
+
+    def append(self, value: Any) -> None:
+        if self._storage is None:
+            if self._fits_in_memory(value):
+                self._head.append(value)
+                return
+            self._storage = _Storage('CREATE TABLE items (value BLOB)')
+
+        self._spill((_dumps(value),))
+
+    def _flush(self) -> None:
+        assert self._storage is not None
+        self._storage.db.executemany('INSERT INTO items(value) VALUES (?)', self._pending)
+        self._spilled_count += len(self._pending)
+        self._pending = []
+
+    def finish(self) -> Sequence[Any]:
+        if self._storage is None:
+            return self._head
+
+        self._flush()
+        self._storage.db.commit()
+        return SpilledList(self._head, self._storage, self._spilled_count)
+
+
+class DictBuilder(_AbstractBuilder):
+    def __init__(self, limits: SpillLimits) -> None:
+        super().__init__(limits)
+        self._head: Dict[Any, Any] = {}
+
+    def put(self, key: Any, value: Any) -> None:
+        if key in self._head:
+            self._head[key] = value
+            return
+
+        if self._storage is None:
+            if self._fits_in_memory(value):
+                self._head[key] = value
+                return
+            self._storage = _Storage('CREATE TABLE items (key BLOB PRIMARY KEY, value BLOB)')
+
+        self._spill((_dumps(key), _dumps(value)))
+
+    def _flush(self) -> None:
+        assert self._storage is not None
+        self._storage.db.executemany('INSERT INTO items(key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value', self._pending)
+        self._pending = []
+
+    def finish(self) -> Mapping[Any, Any]:
+        if self._storage is None:
+            return self._head
+
+        self._flush()
+        self._storage.db.commit()
+        self._spilled_count = self._storage.db.execute('SELECT count(*) FROM items').fetchone()[0]
+        return SpilledDict(self._head, self._storage, self._spilled_count)
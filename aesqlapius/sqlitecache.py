@@ -0,0 +1,128 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Hashable, List, Optional, Tuple
+
+from aesqlapius.cache import (
+    AbstractCacheBackend,
+    AbstractCacheStore,
+    CacheSettings
+)
+
+_PICKLE_PROTOCOL = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS aesqlapius_cache (
+    name TEXT NOT NULL,
+    key BLOB NOT NULL,
+    value BLOB NOT NULL,
+    stored REAL NOT NULL,
+    expires REAL,
+    PRIMARY KEY (name, key)
+)
+"""
+
+
+class SqliteCacheStore(AbstractCacheStore):
+    # the file may be shared by processes on a host; each process
+    # (including ones forked later) opens its own connection
+
+    def __init__(self, path: str, timeout: float = 5.0) -> None:
+        self._path = path
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # called with lock held
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=self._timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')  # cache contents are not worth an fsync
+            conn.execute(_SCHEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def execute(self, query: str, *args: Any) -> List[Tuple[Any, ...]]:
+        with self._lock:
+            return self._connect().execute(query, args).fetchall()
+
+    def create_backend(self, name: str, settings: CacheSettings) -> AbstractCacheBackend:
+        return SqliteCacheBackend(self, name, settings.maxsize, settings.ttl)
+
+
+class SqliteCacheBackend(AbstractCacheBackend):
+    # expired entries are skipped on lookup and purged on store, and
+    # the earliest stored ones are evicted over the limit, so lookups
+    # never write to the database
+
+    def __init__(self, store: SqliteCacheStore, name: str, maxsize: int, ttl: Optional[float] = None) -> None:
+        self._store = store
+        self._name = name
+        self._maxsize = maxsize
+        self._ttl = ttl
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        rows = self._store.execute(
+            'SELECT value, expires FROM aesqlapius_cache WHERE name = ? AND key = ?',
+            self._name, pickle.dumps(key, _PICKLE_PROTOCOL)
+        )
+
+        if not rows:
+            return False, None
+
+        value, expires = rows[0]
+        if expires is not None and expires <= time.time():
+            return False, None
+
+        return True, pickle.loads(value)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        now = time.time()
+        expires = None if self._ttl is None else now + self._ttl
+        data = pickle.dumps(value, _PICKLE_PROTOCOL)
+
+        self._store.execute(
+            'INSERT OR REPLACE INTO aesqlapius_cache (name, key, value, stored, expires) VALUES (?, ?, ?, ?, ?)',
+            self._name, pickle.dumps(key, _PICKLE_PROTOCOL), data, now, expires
+        )
+        self._store.execute(
+            'DELETE FROM aesqlapius_cache WHERE name = ? AND (expires <= ? OR key IN ('
+            'SELECT key FROM aesqlapius_cache WHERE name = ? ORDER BY stored DESC LIMIT -1 OFFSET ?'
+            '))',
+            self._name, now, self._name, self._maxsize
+        )
+
+    def clear(self) -> None:
+        self._store.execute('DELETE FROM aesqlapius_cache WHERE name = ?', self._name)
+
+    def __len__(self) -> int:
+        count: int = self._store.execute(
+            'SELECT count(*) FROM aesqlapius_cache WHERE name = ? AND (expires IS NULL OR expires > ?)',
+            self._name, time.time()
+        )[0][0]
+        return count
@@ -0,0 +1,71 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from aesqlapius.function_def import FunctionDefinition, ReturnValueOuterFormat
+
+
+@dataclass
+class StageSettings:
+    arg: str
+    table: str
+    columns: Dict[str, str]
+
+    @property
+    def create_statement(self) -> str:
+        columns = ', '.join(f'{name} {definition}' for name, definition in self.columns.items())
+        return f'CREATE TEMPORARY TABLE IF NOT EXISTS {self.table} ({columns})'
+
+    @property
+    def clear_statement(self) -> str:
+        return f'DELETE FROM {self.table}'
+
+    def get_insert_statement(self, placeholder: str) -> str:
+        columns = ', '.join(self.columns)
+        placeholders = ', '.join([placeholder] * len(self.columns))
+        return f'INSERT INTO {self.table} ({columns}) VALUES ({placeholders})'
+
+
+def get_stage_settings(func_def: FunctionDefinition) -> Optional[StageSettings]:
+    if (decorator := func_def.decorators.get('stage')) is None:
+        return None
+
+    settings = StageSettings(*decorator.args, **decorator.kwargs)
+
+    if settings.arg not in (arg.name for arg in func_def.args):
+        raise TypeError(f"{func_def.name}: @stage refers to unknown argument '{settings.arg}'")
+
+    if not settings.columns:
+        raise TypeError(f'{func_def.name}: @stage requires at least one column')
+
+    if func_def.returns is not None and func_def.returns.outer_format == ReturnValueOuterFormat.PAGES:
+        raise TypeError(f'{func_def.name}: @stage is not supported for Pages rows format')
+
+    return settings
+
+
+def iter_stage_rows(settings: StageSettings, values: Iterable[Any]) -> Iterator[Tuple[Any, ...]]:
+    if len(settings.columns) == 1:
+        # single column tables are staged from plain values
+        return ((value,) for value in values)
+    else:
+        return (tuple(value) for value in values)
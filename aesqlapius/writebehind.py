@@ -0,0 +1,253 @@
+# Copyright (c) 2020 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aesqlapius.args import prepare_args_as_dict
+from aesqlapius.function_def import FunctionDefinition
+from aesqlapius.pinning import create_unpinned_task
+
+
+@dataclass
+class WriteBehindSettings:
+    max_batch: int = 1000
+    max_delay: float = 0.1
+    max_queue: int = 10000
+
+
+def get_write_behind_settings(func_def: FunctionDefinition) -> Optional[WriteBehindSettings]:
+    if (decorator := func_def.decorators.get('write_behind')) is None:
+        return None
+
+    if func_def.returns is not None:
+        raise TypeError(f'{func_def.name}: @write_behind is only supported for methods returning None')
+
+    settings = WriteBehindSettings(*decorator.args, **decorator.kwargs)
+
+    if settings.max_batch < 1 or settings.max_queue < 1 or settings.max_delay < 0:
+        raise TypeError(f'{func_def.name}: invalid @write_behind limits')
+
+    return settings
+
+
+# queue items are call arguments with futures to be resolved when
+# these are written; flush requests have no arguments
+_QueueItem = Tuple[Optional[Dict[str, Any]], Any]
+
+
+def _resolve_batch(batch: List[_QueueItem], errors: Dict[int, BaseException]) -> None:
+    for index, (args, future) in enumerate(batch):
+        if future.done():
+            pass  # cancelled by the caller
+        elif index in errors:
+            future.set_exception(errors[index])
+        else:
+            future.set_result(None)
+
+
+def _get_batch_rows(batch: List[_QueueItem]) -> List[Tuple[int, Dict[str, Any]]]:
+    return [(index, args) for index, (args, _) in enumerate(batch) if args is not None]
+
+
+class _ThreadWriteBehindQueue:
+    # queued calls are written in batches by a background thread
+
+    def __init__(self, settings: WriteBehindSettings, method_many: Callable[..., None]) -> None:
+        self._settings = settings
+        self._method_many = method_many
+        self._queue: 'queue.Queue[_QueueItem]' = queue.Queue(settings.max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='aesqlapius-write-behind', daemon=True)
+                self._thread.start()
+
+    def put(self, args: Optional[Dict[str, Any]]) -> 'Future[None]':
+        future: 'Future[None]' = Future()
+        self._queue.put((args, future))  # blocks while the queue is full
+        # the thread is ensured after queueing, so the call is never
+        # left behind by the thread exiting on stop()
+        self._ensure_thread()
+        return future
+
+    def stop(self) -> None:
+        while True:
+            with self._lock:
+                if (thread := self._thread) is None:
+                    self._stopping = False
+                    return
+                self._stopping = True
+            self.put(None).result()
+            thread.join()
+
+    def _collect_batch(self) -> List[_QueueItem]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._settings.max_delay
+
+        while len(batch) < self._settings.max_batch and batch[-1][0] is not None:
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _write_batch(self, batch: List[_QueueItem]) -> Dict[int, BaseException]:
+        if not (rows := _get_batch_rows(batch)):
+            return {}
+
+        try:
+            self._method_many([args for _, args in rows], page_size=self._settings.max_batch)
+            return {}
+        except Exception:
+            pass
+
+        # the batch has failed as a whole, so rows are retried one by
+        # one to find out which calls have failed
+        errors: Dict[int, BaseException] = {}
+        for index, args in rows:
+            try:
+                self._method_many([args], page_size=1)
+            except Exception as e:
+                errors[index] = e
+        return errors
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect_batch()
+            _resolve_batch(batch, self._write_batch(batch))
+
+            with self._lock:
+                if self._stopping and self._queue.empty():
+                    self._stopping = False
+                    self._thread = None
+                    return
+
+
+class _AsyncWriteBehindQueue:
+    # queued calls are written in batches by a background task, started
+    # in the event loop of the first call
+
+    def __init__(self, settings: WriteBehindSettings, method_many: Callable[..., Any]) -> None:
+        self._settings = settings
+        self._method_many = method_many
+        self._queue: Optional['asyncio.Queue[_QueueItem]'] = None
+        self._task: Optional['asyncio.Task[None]'] = None
+
+    def _ensure_task(self) -> 'asyncio.Queue[_QueueItem]':
+        if self._queue is None or self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self._queue = asyncio.Queue(self._settings.max_queue)
+            self._task = create_unpinned_task(self._run(self._queue))
+        return self._queue
+
+    async def put(self, args: Optional[Dict[str, Any]]) -> 'asyncio.Future[None]':
+        pending = self._ensure_task()
+        future: 'asyncio.Future[None]' = asyncio.get_running_loop().create_future()
+        await pending.put((args, future))  # waits while the queue is full
+        return future
+
+    async def _collect_batch(self, pending: 'asyncio.Queue[_QueueItem]') -> List[_QueueItem]:
+        loop = asyncio.get_running_loop()
+        batch = [await pending.get()]
+        deadline = loop.time() + self._settings.max_delay
+
+        while len(batch) < self._settings.max_batch and batch[-1][0] is not None:
+            try:
+                batch.append(await asyncio.wait_for(pending.get(), max(deadline - loop.time(), 0)))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _write_batch(self, batch: List[_QueueItem]) -> Dict[int, BaseException]:
+        if not (rows := _get_batch_rows(batch)):
+            return {}
+
+        try:
+            await self._method_many([args for _, args in rows], page_size=self._settings.max_batch)
+            return {}
+        except Exception:
+            pass
+
+        # the batch has failed as a whole, so rows are retried one by
+        # one to find out which calls have failed
+        errors: Dict[int, BaseException] = {}
+        for index, args in rows:
+            try:
+                await self._method_many([args], page_size=1)
+            except Exception as e:
+                errors[index] = e
+        return errors
+
+    async def _run(self, pending: 'asyncio.Queue[_QueueItem]') -> None:
+        while True:
+            batch = await self._collect_batch(pending)
+            _resolve_batch(batch, await self._write_batch(batch))
+
+    async def stop(self) -> None:
+        while self._task is not None and not self._task.done():
+            if self._task.get_loop() is not asyncio.get_running_loop():
+                break  # the loop of the task is gone
+            assert self._queue is not None
+            await (await self.put(None))
+            if self._queue.empty():
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+        self._queue = None
+        self._task = None
+
+
+def generate_write_behind_method(func_def: FunctionDefinition, settings: WriteBehindSettings, method_many: Callable[..., Any], is_async: bool) -> Tuple[Callable[..., Any], Callable[..., Any], Callable[..., Any]]:
+    # returned futures resolve once the call is written as a part of
+    # a batch; method_many runs in background, so it needs a pool
+    if is_async:
+        async_queue = _AsyncWriteBehindQueue(settings, method_many)
+
+        async def method_writing_behind_async(*args: Any, **kwargs: Any) -> 'asyncio.Future[None]':
+            return await async_queue.put(prepare_args_as_dict(func_def, args, kwargs))
+
+        async def flush_async() -> None:
+            await (await async_queue.put(None))
+
+        return method_writing_behind_async, flush_async, async_queue.stop
+
+    else:
+        thread_queue = _ThreadWriteBehindQueue(settings, method_many)
+
+        def method_writing_behind(*args: Any, **kwargs: Any) -> 'Future[None]':
+            return thread_queue.put(prepare_args_as_dict(func_def, args, kwargs))
+
+        def flush() -> None:
+            thread_queue.put(None).result()
+
+        return method_writing_behind, flush, thread_queue.stop
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+#
+# Compares inserting rows with a method call per row and with
+# many() batch variant, which uses execute_values for psycopg2.
+#
+# Usage: PYTHONPATH=. POSTGRESQL_DSN='dbname=... user=...' python3 benchmarks/batch_insert.py [rows]
+#
+
+import os
+import sys
+
+import psycopg2
+
+from aesqlapius import generate_api
+
+from common import get_postgresql_dsn, measure
+
+
+def insert_per_call(api, rows: int) -> None:
+    api.reset()
+    for i in range(rows):
+        api.insert(i, f'name {i}')
+
+
+def insert_many(api, rows: int, page_size: int) -> None:
+    api.reset()
+    api.insert.many(((i, f'name {i}') for i in range(rows)), page_size=page_size)
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    db = psycopg2.connect(get_postgresql_dsn())
+    api = generate_api(os.path.join(os.path.dirname(__file__), 'batch_insert.sql'), 'psycopg2', db)
+
+    api.prepare()
+    try:
+        measure('method call per row', lambda: insert_per_call(api, rows), rows, repeat=1)
+        for page_size in (100, 1000, 10000):
+            measure(f'many(page_size={page_size})', lambda: insert_many(api, rows, page_size), rows, repeat=3)
+    finally:
+        db.rollback()
+        api.cleanup()
+        db.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+-- def prepare() -> None: ...
+DROP TABLE IF EXISTS bench_insert;
+CREATE TABLE bench_insert (id integer, name text);
+
+-- def reset() -> None: ...
+TRUNCATE bench_insert;
+
+-- def cleanup() -> None: ...
+DROP TABLE IF EXISTS bench_insert;
+
+-- def insert(id: int, name: str) -> None: ...
+INSERT INTO bench_insert VALUES (%(id)s, %(name)s);
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+#
+# Compares inserting columnar data with many() variant by building
+# per-row tuples, by passing columns directly, and by passing columns
+# into a @columnar query which inserts them with unnest().
+#
+# Columns are NumPy arrays if NumPy is installed, and lists otherwise.
+#
+# Usage: PYTHONPATH=. POSTGRESQL_DSN='dbname=... user=...' python3 benchmarks/columnar_insert.py [rows]
+#
+
+import os
+import sys
+
+import psycopg2
+
+from aesqlapius import generate_api
+
+from common import get_postgresql_dsn, measure
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def generate_columns(rows: int):
+    if numpy is not None:
+        return {'id': numpy.arange(rows, dtype=numpy.int32), 'score': numpy.arange(rows, dtype=numpy.float64) * 1.5}
+    else:
+        return {'id': list(range(rows)), 'score': [i * 1.5 for i in range(rows)]}
+
+
+def insert_rows(api, columns) -> None:
+    api.reset()
+    rows = zip(*(column.tolist() if numpy is not None else column for column in columns.values()))
+    api.insert.many(rows, page_size=10000)
+
+
+def insert_columns(api, columns) -> None:
+    api.reset()
+    api.insert.many(columns, page_size=10000)
+
+
+def insert_unnest(api, columns) -> None:
+    api.reset()
+    api.insert_columnar.many(columns, page_size=100000)
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+
+    db = psycopg2.connect(get_postgresql_dsn())
+    api = generate_api(os.path.join(os.path.dirname(__file__), 'columnar_insert.sql'), 'psycopg2', db)
+
+    columns = generate_columns(rows)
+
+    api.prepare()
+    try:
+        measure('many(rows)', lambda: insert_rows(api, columns), rows, repeat=1)
+        measure('many(columns)', lambda: insert_columns(api, columns), rows, repeat=1)
+        measure('@columnar many(columns) with unnest', lambda: insert_unnest(api, columns), rows, repeat=1)
+    finally:
+        db.rollback()
+        api.cleanup()
+        db.commit()
+
+
+if __name__ == '__main__':
+    main()
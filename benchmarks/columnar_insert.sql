@@ -0,0 +1,16 @@
+-- def prepare() -> None: ...
+DROP TABLE IF EXISTS bench_columnar;
+CREATE TABLE bench_columnar (id integer, score double precision);
+
+-- def reset() -> None: ...
+TRUNCATE bench_columnar;
+
+-- def cleanup() -> None: ...
+DROP TABLE IF EXISTS bench_columnar;
+
+-- def insert(id: int, score: float) -> None: ...
+INSERT INTO bench_columnar VALUES (%(id)s, %(score)s);
+
+-- @columnar
+-- def insert_columnar(id: list, score: list) -> None: ...
+INSERT INTO bench_columnar SELECT * FROM unnest(%(id)s::integer[], %(score)s::double precision[]);
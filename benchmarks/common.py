@@ -0,0 +1,24 @@
+import os
+import sys
+import time
+from typing import Any, Callable
+
+
+def get_postgresql_dsn() -> str:
+    if not (dsn := os.environ.get('POSTGRESQL_DSN')):
+        sys.exit('POSTGRESQL_DSN environment variable is required to run this benchmark')
+    return dsn
+
+
+def measure(name: str, func: Callable[[], Any], rows: int, repeat: int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    assert best is not None
+    print(f'{name:<40} {best * 1000:10.1f} ms {rows / best:14.0f} rows/s')
+
+    return best
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+#
+# Compares exporting a table into CSV by iterating over Iterator[Tuple]
+# rows, with to_csv streaming export and with COPY TO STDOUT.
+#
+# Usage: PYTHONPATH=. POSTGRESQL_DSN='dbname=... user=...' python3 benchmarks/copy_export.py [rows]
+#
+
+import csv
+import os
+import sys
+
+import psycopg2
+
+from aesqlapius import generate_api
+
+from common import get_postgresql_dsn, measure
+
+
+def export_iterator(api) -> None:
+    with open(os.devnull, 'w', newline='') as fd:
+        csv.writer(fd).writerows(api.export())
+
+
+def export_to_csv(api) -> None:
+    with open(os.devnull, 'w', newline='') as fd:
+        api.export.to_csv(fd)
+
+
+def export_copy(api) -> None:
+    with open(os.devnull, 'wb') as fd:
+        api.export.copy_to_csv(fd)
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    db = psycopg2.connect(get_postgresql_dsn())
+    api = generate_api(os.path.join(os.path.dirname(__file__), 'copy_export.sql'), 'psycopg2', db)
+
+    api.prepare(rows)
+    db.commit()
+    try:
+        measure('Iterator[Tuple] + csv.writer', lambda: export_iterator(api), rows)
+        measure('to_csv (server side cursor)', lambda: export_to_csv(api), rows)
+        measure('copy_to_csv (COPY TO STDOUT)', lambda: export_copy(api), rows)
+    finally:
+        db.rollback()
+        api.cleanup()
+        db.commit()
+
+
+if __name__ == '__main__':
+    main()
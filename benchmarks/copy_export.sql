@@ -0,0 +1,11 @@
+-- def prepare(count: int) -> None: ...
+DROP TABLE IF EXISTS bench_copy;
+CREATE TABLE bench_copy AS
+SELECT n AS id, 'name ' || n AS name, n * 1.5 AS score, now() AS created
+FROM generate_series(1, %(count)s) AS n;
+
+-- def cleanup() -> None: ...
+DROP TABLE IF EXISTS bench_copy;
+
+-- def export() -> Iterator[Tuple]: ...
+SELECT id, name, score, created FROM bench_copy;
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+#
+# Compares loading rows with many() batch variant and with copy_from()
+# variant which uses COPY FROM STDIN.
+#
+# Usage: PYTHONPATH=. POSTGRESQL_DSN='dbname=... user=...' python3 benchmarks/copy_import.py [rows]
+#
+
+import os
+import sys
+
+import psycopg2
+
+from aesqlapius import generate_api
+
+from common import get_postgresql_dsn, measure
+
+
+def generate_rows(rows: int):
+    return ((i, f'name {i}', i * 1.5) for i in range(rows))
+
+
+def load_many(api, rows: int) -> None:
+    api.reset()
+    api.insert.many(generate_rows(rows), page_size=10000)
+
+
+def load_copy(api, rows: int) -> None:
+    api.reset()
+    api.insert.copy_from(generate_rows(rows))
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    db = psycopg2.connect(get_postgresql_dsn())
+    api = generate_api(os.path.join(os.path.dirname(__file__), 'copy_import.sql'), 'psycopg2', db)
+
+    api.prepare()
+    try:
+        measure('many(page_size=10000)', lambda: load_many(api, rows), rows)
+        measure('copy_from (COPY FROM STDIN)', lambda: load_copy(api, rows), rows)
+    finally:
+        db.rollback()
+        api.cleanup()
+        db.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+-- def prepare() -> None: ...
+DROP TABLE IF EXISTS bench_load;
+CREATE TABLE bench_load (id integer, name text, score double precision);
+
+-- def reset() -> None: ...
+TRUNCATE bench_load;
+
+-- def cleanup() -> None: ...
+DROP TABLE IF EXISTS bench_load;
+
+-- @copy_into('bench_load')
+-- def insert(id: int, name: str, score: float) -> None: ...
+INSERT INTO bench_load VALUES (%(id)s, %(name)s, %(score)s);
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+#
+# Compares fetching List[Dict] and encoding it with json.dumps against
+# building JSON on the server side and passing it through with Single[Json].
+#
+# Usage: PYTHONPATH=. POSTGRESQL_DSN='dbname=... user=...' python3 benchmarks/json_passthrough.py [rows]
+#
+
+import json
+import os
+import sys
+
+import psycopg2
+
+from aesqlapius import generate_api
+
+from common import get_postgresql_dsn, measure
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    db = psycopg2.connect(get_postgresql_dsn())
+    api = generate_api(os.path.join(os.path.dirname(__file__), 'json_passthrough.sql'), 'psycopg2', db)
+
+    api.prepare(rows)
+    try:
+        measure('List[Dict] + json.dumps', lambda: json.dumps(api.fetch_dicts(), default=str), rows)
+        measure('Single[Json] (json_agg)', lambda: api.fetch_json(), rows)
+    finally:
+        api.cleanup()
+        db.commit()
+
+
+if __name__ == '__main__':
+    main()
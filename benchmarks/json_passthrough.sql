@@ -0,0 +1,14 @@
+-- def prepare(count: int) -> None: ...
+DROP TABLE IF EXISTS bench_json;
+CREATE TABLE bench_json AS
+SELECT n AS id, 'name ' || n AS name, n * 1.5 AS score, now() AS created
+FROM generate_series(1, %(count)s) AS n;
+
+-- def cleanup() -> None: ...
+DROP TABLE IF EXISTS bench_json;
+
+-- def fetch_dicts() -> List[Dict]: ...
+SELECT id, name, score, created FROM bench_json ORDER BY id;
+
+-- def fetch_json() -> Single[Json]: ...
+SELECT json_agg(t ORDER BY id) FROM (SELECT id, name, score, created FROM bench_json) AS t;
@@ -2,12 +2,15 @@ import os
 import re
 from collections import defaultdict
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 from typing import Any, Dict
 
 import pytest
 import pytest_asyncio
 
+from aesqlapius.pool import ConnectionPool, ThreadLocalConnectionPool
+
 __all__ = [
     'dbenv',
     'queries_dir'
@@ -82,7 +85,10 @@ class DBEnv:
 
 @pytest_asyncio.fixture(params=[
     'psycopg2',
+    'psycopg2_pool',
     'sqlite3',
+    'sqlite3_pool',
+    'sqlite3_thread_pool',
     'mysql',
     'aiopg_pool',
     'aiopg_conn',
@@ -95,12 +101,27 @@ async def dbenv(request, tmp_path):
         if request.param == 'psycopg2':
             import psycopg2
             yield DBEnv('psycopg2', psycopg2.connect(**DSN('POSTGRESQL_DSN', 'psycopg2').get()))
+        elif request.param == 'psycopg2_pool':
+            import psycopg2.pool
+            pool = psycopg2.pool.ThreadedConnectionPool(1, 4, **DSN('POSTGRESQL_DSN', 'psycopg2').get())
+            yield DBEnv('psycopg2', pool)
+            pool.closeall()
         elif request.param == 'mysql':
             import mysql.connector
             yield DBEnv('mysql', mysql.connector.connect(**DSN('MYSQL_DSN', 'mysql').get()))
         elif request.param == 'sqlite3':
             import sqlite3
             yield DBEnv('sqlite3', sqlite3.connect(tmp_path / 'db.sqlite'))
+        elif request.param == 'sqlite3_pool':
+            import sqlite3
+            pool = ConnectionPool(partial(sqlite3.connect, tmp_path / 'db.sqlite', check_same_thread=False), max_size=4)
+            yield DBEnv('sqlite3', pool)
+            pool.close()
+        elif request.param == 'sqlite3_thread_pool':
+            import sqlite3
+            pool = ThreadLocalConnectionPool(partial(sqlite3.connect, tmp_path / 'db.sqlite'))
+            yield DBEnv('sqlite3', pool)
+            pool.close()
         elif request.param == 'aiopg_pool':
             import aiopg
             async with aiopg.create_pool(**DSN('POSTGRESQL_DSN', 'aiopg').get()) as pool:
@@ -20,6 +20,22 @@ def _wrap_gen_as_async(func):
     return wrapper
 
 
+def _convert_func_to_async(func):
+    # XXX: according to python docs, inspect.iscoroutinefunction
+    # should work on partial but it doesn't, so we resolve original
+    # function out of it
+    origfunc = func
+    while isinstance(origfunc, functools.partial):
+        origfunc = origfunc.func
+
+    if inspect.iscoroutinefunction(origfunc) or inspect.isasyncgenfunction(origfunc):
+        return func  # already async
+    elif inspect.isgeneratorfunction(origfunc):
+        return _wrap_gen_as_async(func)
+    else:
+        return _wrap_func_as_async(func)
+
+
 def convert_api_to_async(ns: Any) -> None:
     for name in dir(ns):
         member = getattr(ns, name)
@@ -27,17 +43,9 @@ def convert_api_to_async(ns: Any) -> None:
         if isinstance(member, aesqlapius.Namespace):
             convert_api_to_async(member)
 
-        # XXX: according to python docs, inspect.iscoroutinefunction
-        # should work on partial but it doesn't, so we resolve original
-        # function out of it
-        origfunc = member
-        while isinstance(origfunc, functools.partial):
-            origfunc = origfunc.func
-
         if getattr(member, 'aesqlapius_method', False):
-            if inspect.iscoroutinefunction(origfunc) or inspect.isasyncgenfunction(origfunc):
-                pass  # already async
-            elif inspect.isgeneratorfunction(origfunc):
-                setattr(ns, name, _wrap_gen_as_async(member))
-            else:
-                setattr(ns, name, _wrap_func_as_async(member))
+            converted = _convert_func_to_async(member)
+            if converted is not member:
+                for variant in member.aesqlapius_variants:
+                    setattr(converted, variant, _convert_func_to_async(getattr(member, variant)))
+                setattr(ns, name, converted)
@@ -11,3 +11,47 @@ CREATE TABLE numbers (a integer, b text);
 
 -- def fill_test_table() -> None: ...
 INSERT INTO numbers VALUES (0, 'a'), (1, 'b'), (2, 'c');
+
+-- def insert_number(a: int, b: str) -> None: ...
+INSERT INTO numbers VALUES (:a, :b);          -- sqlite3
+INSERT INTO numbers VALUES ($1, $2);          -- asyncpg
+INSERT INTO numbers VALUES (%(a)s, %(b)s);    -- others
+
+-- def rename_number(a: int, b: str) -> None: ...
+UPDATE numbers SET b = :b WHERE a = :a;       -- sqlite3
+UPDATE numbers SET b = $2 WHERE a = $1;       -- asyncpg
+UPDATE numbers SET b = %(b)s WHERE a = %(a)s; -- others
+
+-- def rename_numbers(ids: List[int], b: str) -> None: ...
+UPDATE numbers SET b = :b WHERE a IN :ids;         -- sqlite3
+UPDATE numbers SET b = $2 WHERE a IN $1;           -- asyncpg
+UPDATE numbers SET b = %(b)s WHERE a IN %(ids)s;   -- others
+
+-- @copy_into('numbers')
+-- def load_number(a: int, b: str) -> None: ...
+INSERT INTO numbers VALUES (:a, :b);          -- sqlite3
+INSERT INTO numbers VALUES ($1, $2);          -- asyncpg
+INSERT INTO numbers VALUES (%(a)s, %(b)s);    -- others
+
+-- @columnar
+-- def insert_numbers(a: list, b: list) -> None: ...
+INSERT INTO numbers SELECT * FROM unnest($1::integer[], $2::text[]);             -- asyncpg
+INSERT INTO numbers SELECT * FROM unnest(%(a)s::integer[], %(b)s::text[]);       -- others
+
+-- @cached(maxsize=2, tags=['numbers'])
+-- def cached_count(min: int = 0) -> Single[Value]: ...
+SELECT count(*) FROM numbers WHERE a >= :min;       -- sqlite3
+SELECT count(*) FROM numbers WHERE a >= $1;         -- asyncpg
+SELECT count(*) FROM numbers WHERE a >= %(min)s;    -- others
+
+-- @invalidates('numbers')
+-- def add_number(a: int, b: str) -> None: ...
+INSERT INTO numbers VALUES (:a, :b);          -- sqlite3
+INSERT INTO numbers VALUES ($1, $2);          -- asyncpg
+INSERT INTO numbers VALUES (%(a)s, %(b)s);    -- others
+
+-- @snapshot(watermark='a')
+-- def numbers_snapshot(since: int = None) -> Dict['a', Dict]: ...
+SELECT a, b FROM numbers WHERE :since IS NULL OR a >= :since;                 -- sqlite3
+SELECT a, b FROM numbers WHERE $1::integer IS NULL OR a >= $1;                -- asyncpg
+SELECT a, b FROM numbers WHERE %(since)s IS NULL OR a >= %(since)s;           -- others
@@ -78,3 +78,78 @@ SELECT a FROM numbers;
 
 -- def dict_of_empty_singles() -> Dict[-0, Value]: ...
 SELECT a FROM numbers;
+
+-- def group_of_tuples() -> Group['k', Tuple]: ...
+SELECT CASE WHEN a < 2 THEN 0 ELSE 1 END AS k, a, b FROM numbers ORDER BY a;
+
+-- def group_of_dicts_removed_key() -> Group[-'k', Dict]: ...
+SELECT CASE WHEN a < 2 THEN 0 ELSE 1 END AS k, a, b FROM numbers ORDER BY a;
+
+-- def group_of_values_by_column_index_removed_key() -> Group[-0, Value]: ...
+SELECT CASE WHEN a < 2 THEN 0 ELSE 1 END AS k, a FROM numbers ORDER BY a;
+
+-- def group_iterator_of_tuples() -> GroupIterator['k', Tuple]: ...
+SELECT CASE WHEN a < 2 THEN 0 ELSE 1 END AS k, a, b FROM numbers ORDER BY a;
+
+-- def group_iterator_of_dicts_removed_key() -> GroupIterator[-'k', Dict]: ...
+SELECT CASE WHEN a < 2 THEN 0 ELSE 1 END AS k, a, b FROM numbers ORDER BY a;
+
+-- def nested_dicts() -> Nested['a', Dict, {'greater': 'greater_'}]: ...
+SELECT p.a AS a, p.b AS b, c.a AS greater_a, c.b AS greater_b
+FROM numbers p LEFT JOIN numbers c ON c.a > p.a
+ORDER BY p.a, c.a;
+
+-- def nested_tuples() -> Nested[('a', 'b'), Tuple, {'greater': 'greater_'}]: ...
+SELECT p.a AS a, p.b AS b, c.a AS greater_a
+FROM numbers p LEFT JOIN numbers c ON c.a > p.a
+ORDER BY p.a, c.a;
+
+-- def single_json() -> Single[Json]: ...
+SELECT '{"a": [1, 2]}'::json AS j;  -- psycopg2
+SELECT '{"a": [1, 2]}'::json AS j;  -- aiopg
+SELECT '{"a": [1, 2]}'::json AS j;  -- asyncpg
+SELECT '{"a": [1, 2]}' AS j;        -- others
+
+-- def list_json() -> List[Json]: ...
+SELECT json_build_object('a', a, 'b', b) FROM numbers ORDER BY a;  -- psycopg2
+SELECT json_build_object('a', a, 'b', b) FROM numbers ORDER BY a;  -- aiopg
+SELECT json_build_object('a', a, 'b', b) FROM numbers ORDER BY a;  -- asyncpg
+SELECT json_object('a', a, 'b', b) FROM numbers ORDER BY a;        -- others
+
+-- def pages_tuples(after: int, limit: int = 2) -> Pages['a', Tuple]: ...
+SELECT a, b FROM numbers WHERE a > :after ORDER BY a LIMIT :limit;                   -- sqlite3
+SELECT a, b FROM numbers WHERE a > $1 ORDER BY a LIMIT $2;                           -- asyncpg
+SELECT a, b FROM numbers WHERE a > %(after)s ORDER BY a LIMIT %(limit)s;             -- others
+
+-- def pages_values_removed_key_without_limit(after: int) -> Pages[-'a', Value]: ...
+SELECT a, b FROM numbers WHERE a > :after ORDER BY a LIMIT 2;                        -- sqlite3
+SELECT a, b FROM numbers WHERE a > $1 ORDER BY a LIMIT 2;                            -- asyncpg
+SELECT a, b FROM numbers WHERE a > %(after)s ORDER BY a LIMIT 2;                     -- others
+
+-- @spill(max_rows=1)
+-- def spilled_list_tuple() -> List[Tuple]: ...
+SELECT a, b FROM numbers ORDER BY a;
+
+-- @spill(max_rows=1)
+-- def spilled_dict_of_values_removed_key() -> Dict[-'a', Value]: ...
+SELECT a, b FROM numbers ORDER BY a;
+
+-- def by_ids(ids: List[int]) -> List[Tuple]: ...
+SELECT a, b FROM numbers WHERE a IN :ids ORDER BY a;            -- sqlite3
+SELECT a, b FROM numbers WHERE a IN $1 ORDER BY a;              -- asyncpg
+SELECT a, b FROM numbers WHERE a IN %(ids)s ORDER BY a;         -- others
+
+-- def except_ids(ids: List[int], b: str = 'z') -> List[Value]: ...
+SELECT a FROM numbers WHERE a NOT IN :ids AND b <> :b ORDER BY a;      -- sqlite3
+SELECT a FROM numbers WHERE a NOT IN $1 AND b <> $2 ORDER BY a;        -- asyncpg
+SELECT a FROM numbers WHERE a NOT IN %(ids)s AND b <> %(b)s ORDER BY a; -- others
+
+-- @stage('ids', 'staged_ids', {'id': 'integer'})
+-- def by_staged_ids(ids, b: str = 'z') -> List[Tuple]: ...
+SELECT a, b FROM numbers JOIN staged_ids ON a = id WHERE b <> :b ORDER BY a;       -- sqlite3
+SELECT a, b FROM numbers JOIN staged_ids ON a = id WHERE b <> $1 ORDER BY a;       -- asyncpg
+SELECT a, b FROM numbers JOIN staged_ids ON a = id WHERE b <> %(b)s ORDER BY a;    -- others
+
+-- @stage('pairs', 'staged_pairs', {'x': 'integer', 'y': 'varchar(10)'})
+-- def by_staged_pairs(pairs) -> Iterator[Tuple]: ...
+SELECT a, y FROM numbers JOIN staged_pairs ON a = x ORDER BY a;
@@ -0,0 +1,2 @@
+-- def connection() -> None: ...
+SELECT 1;
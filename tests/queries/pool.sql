@@ -0,0 +1,14 @@
+-- def create_table() -> None: ...
+CREATE TABLE numbers (a integer);
+
+-- def insert(a: int) -> None: ...
+INSERT INTO numbers VALUES (:a);
+
+-- def iterate() -> Iterator[Value]: ...
+SELECT a FROM numbers ORDER BY a;
+
+-- def fail() -> List[Value]: ...
+SELECT a FROM missing_table;
+
+-- def count() -> Single[Value]: ...
+SELECT count(*) FROM numbers;
@@ -0,0 +1,14 @@
+-- def get_iterator() -> Iterator[Tuple]: ...
+SELECT 1 AS a, 'x' AS b UNION ALL SELECT 2, 'y';
+
+-- @spill(max_rows=1)
+-- def get_spilled_list() -> List[Tuple]: ...
+SELECT 1 AS a, 'x' AS b UNION ALL SELECT 2, 'y';
+
+-- @spill(max_rows=1)
+-- def get_spilled_dict() -> Dict[-'a', Value]: ...
+SELECT 1 AS a, 'x' AS b UNION ALL SELECT 2, 'y';
+
+-- @spill(max_rows=1)
+-- def get_spilled_empty() -> List[Tuple]: ...
+SELECT 1 AS a WHERE 0;
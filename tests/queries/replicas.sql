@@ -0,0 +1,16 @@
+-- def insert(a: int) -> None: ...
+INSERT INTO numbers VALUES (:a);
+
+-- def count() -> Single[Value]: ...
+SELECT count(*) FROM numbers;
+
+-- def iterate() -> Iterator[Value]: ...
+SELECT a FROM numbers ORDER BY a;
+
+-- @write
+-- def count_primary() -> Single[Value]: ...
+SELECT count(*) FROM numbers;
+
+-- @readonly
+-- def analyze() -> None: ...
+SELECT 1;
@@ -0,0 +1,2 @@
+-- def replicas() -> None: ...
+SELECT 1;
@@ -0,0 +1,3 @@
+-- @write_behind
+-- def log_number(a: int) -> None: ...
+INSERT INTO numbers VALUES (:a);
@@ -0,0 +1,35 @@
+-- @broadcast
+-- def create_table() -> None: ...
+CREATE TABLE users (id integer, name text);
+
+-- @shard_by('id')
+-- def insert(id: int, name: str) -> None: ...
+INSERT INTO users VALUES (:id, :name);
+
+-- @shard_by('id')
+-- def get(id: int) -> Single[Value]: ...
+SELECT name FROM users WHERE id = :id;
+
+-- @broadcast(order_by='id')
+-- def list_all() -> List[Dict]: ...
+SELECT id, name FROM users ORDER BY id;
+
+-- @broadcast(order_by=0, reverse=True)
+-- def iterate_desc() -> Iterator[Tuple]: ...
+SELECT id, name FROM users ORDER BY id DESC;
+
+-- @broadcast(order_by=0)
+-- def iterate_ids() -> Iterator[Value]: ...
+SELECT id FROM users ORDER BY id;
+
+-- @broadcast
+-- def names() -> Dict['id', Value]: ...
+SELECT name, id FROM users;
+
+-- @broadcast
+-- def count_shards() -> List[Value]: ...
+SELECT count(*) FROM users;
+
+-- @broadcast
+-- def insert_everywhere(id: int, name: str) -> None: ...
+INSERT INTO users VALUES (:id, :name);
@@ -0,0 +1,4 @@
+-- @shard_by('id')
+-- @write_behind
+-- def insert(id: int, name: str) -> None: ...
+INSERT INTO users VALUES (:id, :name);
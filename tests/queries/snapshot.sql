@@ -0,0 +1,3 @@
+-- @snapshot(interval=60)
+-- def numbers() -> Dict['a', Dict]: ...
+SELECT a FROM numbers;
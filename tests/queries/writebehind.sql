@@ -0,0 +1,11 @@
+-- @write_behind(max_batch=2, max_delay=0.01)
+-- def log_number(a: int, b: str) -> None: ...
+INSERT INTO numbers VALUES (:a, :b);          -- sqlite3
+INSERT INTO numbers VALUES ($1, $2);          -- asyncpg
+INSERT INTO numbers VALUES (%(a)s, %(b)s);    -- others
+
+-- @write_behind
+-- def log_missing(a: int) -> None: ...
+INSERT INTO missing_table VALUES (:a);        -- sqlite3
+INSERT INTO missing_table VALUES ($1);        -- asyncpg
+INSERT INTO missing_table VALUES (%(a)s);     -- others
@@ -1,12 +1,31 @@
+import asyncio
+import concurrent.futures
+import inspect
+import io
+import json
+
 import pytest
 import pytest_asyncio
 
-from aesqlapius import generate_api
+from aesqlapius import generate_api, memo_scope
+from aesqlapius.sqlitecache import SqliteCacheStore
 
 from .fixtures import *  # noqa
 from .helpers import convert_api_to_async
 
 
+async def resolve_future(future):
+    # write-behind methods of synchronous drivers return concurrent futures
+    if isinstance(future, concurrent.futures.Future):
+        future = asyncio.wrap_future(future)
+    return await future
+
+
+async def maybe_await(value):
+    # variants which are not driver methods are not converted to async
+    return await value if inspect.isawaitable(value) else value
+
+
 @pytest_asyncio.fixture()
 async def api(queries_dir, dbenv):
     api = generate_api(queries_dir / 'api', dbenv.driver, dbenv.db, hook=dbenv.get_query_preprocessor())
@@ -138,3 +157,410 @@ async def test_get_dict_of_empties(api):
     assert await api.get.dict_of_empty_dicts() == {0: {}, 1: {}, 2: {}}
     assert await api.get.dict_of_empty_tuples() == {0: (), 1: (), 2: ()}
     assert await api.get.dict_of_empty_singles() == {0: None, 1: None, 2: None}
+
+
+@pytest.mark.asyncio
+async def test_get_group(api):
+    assert await api.get.group_of_tuples() == {0: [(0, 0, 'a'), (0, 1, 'b')], 1: [(1, 2, 'c')]}
+    assert await api.get.group_of_dicts_removed_key() == {0: [{'a': 0, 'b': 'a'}, {'a': 1, 'b': 'b'}], 1: [{'a': 2, 'b': 'c'}]}
+    assert await api.get.group_of_values_by_column_index_removed_key() == {0: [0, 1], 1: [2]}
+
+
+@pytest.mark.asyncio
+async def test_get_group_iterator(api):
+    assert [v async for v in api.get.group_iterator_of_tuples()] == [
+        (0, [(0, 0, 'a'), (0, 1, 'b')]),
+        (1, [(1, 2, 'c')]),
+    ]
+    assert [v async for v in api.get.group_iterator_of_dicts_removed_key()] == [
+        (0, [{'a': 0, 'b': 'a'}, {'a': 1, 'b': 'b'}]),
+        (1, [{'a': 2, 'b': 'c'}]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_nested(api):
+    assert await api.get.nested_dicts() == [
+        {'a': 0, 'b': 'a', 'greater': [{'a': 1, 'b': 'b'}, {'a': 2, 'b': 'c'}]},
+        {'a': 1, 'b': 'b', 'greater': [{'a': 2, 'b': 'c'}]},
+        {'a': 2, 'b': 'c', 'greater': []},
+    ]
+    assert await api.get.nested_tuples() == [
+        (0, 'a', [(1,), (2,)]),
+        (1, 'b', [(2,)]),
+        (2, 'c', []),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_single_json(api):
+    assert await api.get.single_json() == '{"a": [1, 2]}'
+
+
+@pytest.mark.asyncio
+async def test_get_list_json(api):
+    values = await api.get.list_json()
+    assert all(isinstance(value, str) for value in values)
+    assert [json.loads(value) for value in values] == [
+        {'a': 0, 'b': 'a'},
+        {'a': 1, 'b': 'b'},
+        {'a': 2, 'b': 'c'},
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('limit', [1, 2, 3, 4])
+async def test_get_pages(api, limit):
+    assert [v async for v in api.get.pages_tuples(-1, limit=limit)] == [
+        (0, 'a'),
+        (1, 'b'),
+        (2, 'c'),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_pages_after(api):
+    assert [v async for v in api.get.pages_tuples(0)] == [
+        (1, 'b'),
+        (2, 'c'),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_pages_without_limit(api):
+    assert [v async for v in api.get.pages_values_removed_key_without_limit(-1)] == ['a', 'b', 'c']
+
+
+@pytest.mark.asyncio
+async def test_get_in_list(api):
+    assert await api.get.by_ids([0, 2]) == [(0, 'a'), (2, 'c')]
+    assert await api.get.by_ids((2, 1, 0)) == [(0, 'a'), (1, 'b'), (2, 'c')]
+    assert await api.get.by_ids([1]) == [(1, 'b')]
+    assert await api.get.by_ids([]) == []
+
+
+@pytest.mark.asyncio
+async def test_get_not_in_list(api):
+    assert await api.get.except_ids([0, 2]) == [1]
+    assert await api.get.except_ids([1], 'c') == [0]
+    assert await api.get.except_ids([]) == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_many_in_list(api):
+    # lists of different lengths produce different statements
+    await api.rename_numbers.many([([0], 'x'), ([1, 2], 'y'), ((), 'z')])
+    assert sorted(await api.get.list_tuple()) == [(0, 'x'), (1, 'y'), (2, 'y')]
+
+
+@pytest.mark.asyncio
+async def test_get_staged(api):
+    assert await api.get.by_staged_ids(iter([0, 2, 5])) == [(0, 'a'), (2, 'c')]
+    assert await api.get.by_staged_ids([0, 1, 2], 'b') == [(0, 'a'), (2, 'c')]
+    assert await api.get.by_staged_ids([]) == []
+    assert [row async for row in api.get.by_staged_pairs([(1, 'x'), (2, 'y')])] == [(1, 'x'), (2, 'y')]
+
+
+@pytest.mark.asyncio
+async def test_export_csv(api):
+    output = io.StringIO()
+    assert await api.get.iterator_tuple.to_csv(output) == 3
+    assert output.getvalue().splitlines() == ['a,b', '0,a', '1,b', '2,c']
+
+
+@pytest.mark.asyncio
+async def test_export_jsonl(api):
+    output = io.StringIO()
+    assert await api.get.list_dict.to_jsonl(output) == 3
+    assert [json.loads(line) for line in output.getvalue().splitlines()] == [
+        {'a': 0, 'b': 'a'},
+        {'a': 1, 'b': 'b'},
+        {'a': 2, 'b': 'c'},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_export_args(api):
+    output = io.StringIO()
+    assert await api.swap_args.to_csv(output, b='b') == 1
+    assert output.getvalue().splitlines() == ['a,b', 'b,0']
+
+
+@pytest.mark.asyncio
+async def test_export_staged(api):
+    output = io.StringIO()
+    assert await api.get.by_staged_ids.to_csv(output, [0, 2, 5]) == 2
+    assert output.getvalue().splitlines() == ['a,b', '0,a', '2,c']
+
+
+def test_export_not_available_for_none(api):
+    assert not hasattr(api.get.nothing, 'to_csv')
+
+
+@pytest.mark.asyncio
+async def test_copy_to_csv(api, dbenv):
+    if dbenv.driver not in ('psycopg2', 'asyncpg'):
+        pytest.skip('COPY export is only supported by psycopg2 and asyncpg drivers')
+
+    output = io.BytesIO()
+    assert await api.get.iterator_tuple.copy_to_csv(output) == 3
+    assert sorted(output.getvalue().decode().splitlines()) == ['0,a', '1,b', '2,c', 'a,b']
+
+
+@pytest.mark.asyncio
+async def test_copy_to_csv_args(api, dbenv):
+    if dbenv.driver not in ('psycopg2', 'asyncpg'):
+        pytest.skip('COPY export is only supported by psycopg2 and asyncpg drivers')
+
+    output = io.BytesIO()
+    assert await api.swap_args.copy_to_csv(output, 1, 'b') == 1
+    assert output.getvalue().decode().splitlines() == ['a,b', 'b,1']
+
+
+@pytest.mark.asyncio
+async def test_copy_to_csv_staged(api, dbenv):
+    if dbenv.driver not in ('psycopg2', 'asyncpg'):
+        pytest.skip('COPY export is only supported by psycopg2 and asyncpg drivers')
+
+    output = io.BytesIO()
+    assert await api.get.by_staged_ids.copy_to_csv(output, [0, 2, 5], 'c') == 1
+    assert output.getvalue().decode().splitlines() == ['a,b', '0,a']
+
+
+@pytest.mark.asyncio
+async def test_get_spilled(api):
+    assert list(await api.get.spilled_list_tuple()) == [
+        (0, 'a'),
+        (1, 'b'),
+        (2, 'c'),
+    ]
+    assert dict(await api.get.spilled_dict_of_values_removed_key()) == {0: 'a', 1: 'b', 2: 'c'}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('page_size', [1, 2, 1000])
+async def test_many(api, page_size):
+    await api.insert_number.many([(3, 'd'), {'b': 'e', 'a': 4}, (5, 'f')], page_size=page_size)
+    await api.rename_number.many(iter([(0, 'z'), {'a': 1, 'b': 'y'}]), page_size=page_size)
+    assert sorted(await api.get.list_tuple()) == [
+        (0, 'z'),
+        (1, 'y'),
+        (2, 'c'),
+        (3, 'd'),
+        (4, 'e'),
+        (5, 'f'),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_many_columnar(api):
+    await api.insert_number.many({'a': [3, 4, 5], 'b': ['d', 'e', 'f']}, page_size=2)
+    assert sorted(await api.get.list_tuple()) == [
+        (0, 'a'),
+        (1, 'b'),
+        (2, 'c'),
+        (3, 'd'),
+        (4, 'e'),
+        (5, 'f'),
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('batch', [{'a': [3, 4, 5], 'b': ['d', 'e', 'f']}, [(3, 'd'), (4, 'e'), (5, 'f')]])
+async def test_many_columnar_query(api, dbenv, batch):
+    if dbenv.driver not in ('psycopg2', 'aiopg', 'asyncpg'):
+        pytest.skip('array parameters are only supported by PostgreSQL drivers')
+
+    await api.insert_numbers.many(batch, page_size=2)
+    assert sorted(await api.get.list_tuple()) == [
+        (0, 'a'),
+        (1, 'b'),
+        (2, 'c'),
+        (3, 'd'),
+        (4, 'e'),
+        (5, 'f'),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_many_empty(api):
+    await api.insert_number.many([])
+    assert len(await api.get.list_tuple()) == 3
+
+
+def test_many_not_available_for_rows(api):
+    assert not hasattr(api.get.list_tuple, 'many')
+
+
+@pytest.mark.asyncio
+async def test_copy_from(api, dbenv):
+    if dbenv.driver not in ('psycopg2', 'asyncpg'):
+        assert not hasattr(api.load_number, 'copy_from')
+        return
+
+    assert await api.load_number.copy_from(iter([(3, 'd'), (4, 'tab\there'), (5, None)])) == 3
+    assert sorted(await api.get.list_tuple(), key=lambda row: row[0]) == [
+        (0, 'a'),
+        (1, 'b'),
+        (2, 'c'),
+        (3, 'd'),
+        (4, 'tab\there'),
+        (5, None),
+    ]
+
+
+@pytest_asyncio.fixture()
+async def write_behind_api(api, queries_dir, dbenv):
+    try:
+        write_behind_api = generate_api(queries_dir / 'writebehind.sql', dbenv.driver, dbenv.db, hook=dbenv.get_query_preprocessor())
+    except TypeError:
+        pytest.skip('write-behind requires connection pool')
+    convert_api_to_async(write_behind_api)
+    yield write_behind_api
+    await maybe_await(write_behind_api.log_number.stop())
+    await maybe_await(write_behind_api.log_missing.stop())
+
+
+@pytest.mark.asyncio
+async def test_write_behind(api, write_behind_api):
+    futures = [await write_behind_api.log_number(a, b) for a, b in [(3, 'd'), (4, 'e'), (5, 'f')]]
+    await write_behind_api.log_number.flush()
+    assert all(future.done() for future in futures)
+    for future in futures:
+        assert await resolve_future(future) is None
+
+    assert sorted(await api.get.list_tuple()) == [
+        (0, 'a'),
+        (1, 'b'),
+        (2, 'c'),
+        (3, 'd'),
+        (4, 'e'),
+        (5, 'f'),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_write_behind_without_flush(api, write_behind_api):
+    await resolve_future(await write_behind_api.log_number(3, 'd'))
+    assert len(await api.get.list_tuple()) == 4
+
+
+@pytest.mark.asyncio
+async def test_write_behind_error(write_behind_api):
+    future = await write_behind_api.log_missing(1)
+    await write_behind_api.log_missing.flush()
+    with pytest.raises(Exception):
+        await resolve_future(future)
+
+
+@pytest.mark.asyncio
+async def test_cached(api):
+    assert await api.cached_count() == 3
+    assert await api.cached_count(min=0) == 3
+    assert await api.cached_count(1) == 2
+
+    await api.insert_number(3, 'd')
+    assert await api.cached_count() == 3  # stale
+
+    info = await maybe_await(api.cached_count.cache_info())
+    assert (info.hits, info.misses, info.maxsize, info.currsize) == (2, 2, 2, 2)
+
+    await api.add_number(4, 'e')
+    assert await api.cached_count() == 5
+    assert await api.cached_count(1) == 4
+
+    await maybe_await(api.cached_count.cache_clear())
+    info = await maybe_await(api.cached_count.cache_info())
+    assert (info.hits, info.misses, info.currsize) == (0, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_cached_invalidated_by_many(api):
+    assert await api.cached_count() == 3
+    await api.add_number.many([(3, 'd'), (4, 'e')])
+    assert await api.cached_count() == 5
+
+
+@pytest.mark.asyncio
+async def test_cached_shared_store(api, queries_dir, dbenv, tmp_path):
+    # emulates multiple worker processes sharing the same cache file
+    apis = [
+        generate_api(queries_dir / 'api', dbenv.driver, dbenv.db, hook=dbenv.get_query_preprocessor(), cache_store=SqliteCacheStore(str(tmp_path / 'cache.sqlite')))
+        for _ in range(2)
+    ]
+    for worker_api in apis:
+        convert_api_to_async(worker_api)
+
+    assert await apis[0].cached_count() == 3
+    await api.insert_number(3, 'd')
+    assert await apis[1].cached_count() == 3  # served from shared cache
+
+    await apis[1].add_number(4, 'e')
+    assert await apis[0].cached_count() == 5
+
+
+@pytest.mark.asyncio
+async def test_snapshot(api):
+    assert await api.numbers_snapshot() == {
+        0: {'a': 0, 'b': 'a'},
+        1: {'a': 1, 'b': 'b'},
+        2: {'a': 2, 'b': 'c'},
+    }
+
+    await api.insert_number(3, 'd')
+    await api.rename_number(0, 'x')
+    assert len(await api.numbers_snapshot()) == 3
+
+    # only rows past the watermark are fetched
+    await api.numbers_snapshot.refresh()
+    snapshot = await api.numbers_snapshot()
+    assert len(snapshot) == 4
+    assert snapshot[3] == {'a': 3, 'b': 'd'}
+    assert snapshot[0] == {'a': 0, 'b': 'a'}
+
+    await api.numbers_snapshot.stop()
+
+
+@pytest.mark.asyncio
+async def test_memo_scope(api, queries_dir, dbenv):
+    executed = []
+    preprocessor = dbenv.get_query_preprocessor()
+
+    def hook(text, kwargs):
+        executed.append(text)
+        return preprocessor(text, kwargs)
+
+    counting_api = generate_api(queries_dir / 'api', dbenv.driver, dbenv.db, hook=hook)
+    convert_api_to_async(counting_api)
+
+    async with memo_scope():
+        assert await counting_api.swap_args(1) == ('a', 1)
+        assert await counting_api.swap_args(a=1) == ('a', 1)
+        assert await counting_api.swap_args(2) == ('a', 2)
+        assert len(executed) == 2
+
+        await counting_api.insert_number(3, 'd')  # writes clear memoized results
+        assert await counting_api.swap_args(1) == ('a', 1)
+        assert len(executed) == 4
+
+    assert await counting_api.swap_args(1) == ('a', 1)
+    assert len(executed) == 5
+
+
+@pytest.mark.asyncio
+async def test_transaction(api):
+    if not hasattr(api, 'transaction'):
+        pytest.skip('connection pinning is only supported by asynchronous drivers')
+
+    with pytest.raises(RuntimeError):
+        async with api.transaction():
+            await api.insert_number(3, 'd')
+            assert len(await api.get.list_tuple()) == 4
+            raise RuntimeError('rollback')
+
+    assert len(await api.get.list_tuple()) == 3
+
+    async with api.connection():
+        async with api.transaction():
+            await api.insert_number(3, 'd')
+        assert len(await api.get.list_tuple()) == 4
@@ -1,6 +1,13 @@
 import pytest
 
-from aesqlapius.args import prepare_args_as_dict, prepare_args_as_list
+from aesqlapius.args import (
+    is_columnar,
+    iter_batch_chunks_as_columns,
+    iter_batch_chunks_as_dicts,
+    iter_batch_chunks_as_lists,
+    prepare_args_as_dict,
+    prepare_args_as_list
+)
 from aesqlapius.function_def import parse_function_definition
 
 
@@ -110,3 +117,68 @@ def test_duplicate_args(func_def):
 def test_incorrect_default_arguments():
     with pytest.raises(SyntaxError):
         parse_function_definition('def foo(a=1,b): ...')
+
+
+class FakeArray:
+    """Mimics NumPy array slicing and tolist()."""
+
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, key):
+        return FakeArray(self.values[key])
+
+    def tolist(self):
+        return list(self.values)
+
+
+@pytest.fixture
+def batch_func_def():
+    return parse_function_definition('def foo(a, b, c=3) -> None: ...')
+
+
+def test_batch_rows_as_dicts(batch_func_def):
+    assert [[dict(row) for row in chunk] for chunk in iter_batch_chunks_as_dicts(batch_func_def, [(1, 2), {'a': 4, 'b': 5, 'c': 6}], 1)] == [
+        [{'a': 1, 'b': 2, 'c': 3}],
+        [{'a': 4, 'b': 5, 'c': 6}],
+    ]
+
+
+def test_batch_columns_as_dicts(batch_func_def):
+    chunks = iter_batch_chunks_as_dicts(batch_func_def, {'a': [1, 2, 3], 'b': FakeArray([4, 5, 6])}, 2)
+    assert [[dict(row) for row in chunk] for chunk in chunks] == [
+        [{'a': 1, 'b': 4, 'c': 3}, {'a': 2, 'b': 5, 'c': 3}],
+        [{'a': 3, 'b': 6, 'c': 3}],
+    ]
+
+
+def test_batch_as_lists(batch_func_def):
+    assert list(iter_batch_chunks_as_lists(batch_func_def, [(1, 2), {'a': 4, 'b': 5}], 10)) == [[[1, 2, 3], [4, 5, 3]]]
+    assert list(iter_batch_chunks_as_lists(batch_func_def, {'a': [1, 4], 'b': FakeArray([2, 5])}, 10)) == [[(1, 2, 3), (4, 5, 3)]]
+
+
+def test_batch_as_columns(batch_func_def):
+    assert list(iter_batch_chunks_as_columns(batch_func_def, [(1, 2), (4, 5, 6)], 10)) == [{'a': [1, 4], 'b': [2, 5], 'c': [3, 6]}]
+    assert list(iter_batch_chunks_as_columns(batch_func_def, {'a': FakeArray([1, 4, 7]), 'b': [2, 5, 8]}, 2)) == [
+        {'a': [1, 4], 'b': [2, 5], 'c': [3, 3]},
+        {'a': [7], 'b': [8], 'c': [3]},
+    ]
+
+
+def test_batch_columns_errors(batch_func_def):
+    with pytest.raises(ValueError):
+        list(iter_batch_chunks_as_dicts(batch_func_def, {'a': [1, 2], 'b': [1]}, 10))
+    with pytest.raises(TypeError):
+        list(iter_batch_chunks_as_dicts(batch_func_def, {'a': [1, 2]}, 10))
+
+
+def test_is_columnar():
+    assert not is_columnar(parse_function_definition('def foo(a) -> None: ...'))
+    assert is_columnar(parse_function_definition('@columnar\ndef foo(a) -> None: ...'))
+    with pytest.raises(TypeError):
+        is_columnar(parse_function_definition('@columnar\ndef foo(a) -> List[Tuple]: ...'))
+    with pytest.raises(TypeError):
+        is_columnar(parse_function_definition('@columnar(1)\ndef foo(a) -> None: ...'))
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from aesqlapius.batched import (
+    BatchedSettings,
+    check_batch_method,
+    generate_batched_method,
+    get_batched_settings
+)
+from aesqlapius.function_def import parse_function_definition
+
+
+@pytest.fixture
+def func_def():
+    return parse_function_definition("@batched('get_many')\ndef get(id) -> Single[Dict]: ...")
+
+
+class BatchMethod:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, ids):
+        self.calls.append(ids)
+        await asyncio.sleep(0)
+        return {key: {'id': key} for key in ids if key != 0}
+
+
+def test_settings(func_def):
+    assert get_batched_settings(parse_function_definition('def get(id) -> Single[Dict]: ...'), True) is None
+    assert get_batched_settings(func_def, True) == BatchedSettings('get_many')
+
+
+def test_settings_errors(func_def):
+    with pytest.raises(TypeError):
+        get_batched_settings(func_def, False)
+    with pytest.raises(TypeError):
+        get_batched_settings(parse_function_definition("@batched('get_many')\ndef get(id) -> List[Dict]: ..."), True)
+    with pytest.raises(TypeError):
+        get_batched_settings(parse_function_definition("@batched('get_many')\ndef get(a, b) -> Single[Dict]: ..."), True)
+    with pytest.raises(TypeError):
+        get_batched_settings(parse_function_definition("@batched('get_many', max_batch=0)\ndef get(id) -> Single[Dict]: ..."), True)
+
+
+def test_check_batch_method(func_def):
+    settings = get_batched_settings(func_def, True)
+    check_batch_method(func_def, settings, parse_function_definition("def get_many(ids) -> Dict['id', Dict]: ..."))
+    with pytest.raises(TypeError):
+        check_batch_method(func_def, settings, None)
+    with pytest.raises(TypeError):
+        check_batch_method(func_def, settings, parse_function_definition('def get_many(ids) -> List[Dict]: ...'))
+
+
+@pytest.mark.asyncio
+async def test_batching(func_def):
+    batch_method = BatchMethod()
+    method = generate_batched_method(func_def, BatchedSettings('get_many'), None, lambda: batch_method)
+
+    assert await asyncio.gather(method(1), method(2), method(id=1), method(0)) == [{'id': 1}, {'id': 2}, {'id': 1}, None]
+    assert batch_method.calls == [[1, 2, 0]]
+
+    assert await method(3) == {'id': 3}
+    assert batch_method.calls[1:] == [[3]]
+
+
+@pytest.mark.asyncio
+async def test_max_batch(func_def):
+    batch_method = BatchMethod()
+    method = generate_batched_method(func_def, BatchedSettings('get_many', max_batch=2), None, lambda: batch_method)
+
+    assert await asyncio.gather(*(method(key) for key in range(1, 6))) == [{'id': key} for key in range(1, 6)]
+    assert batch_method.calls == [[1, 2], [3, 4], [5]]
+
+
+@pytest.mark.asyncio
+async def test_error(func_def):
+    async def batch_method(ids):
+        raise RuntimeError('failed')
+
+    method = generate_batched_method(func_def, BatchedSettings('get_many'), None, lambda: batch_method)
+
+    results = await asyncio.gather(method(1), method(2), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_batch_cancelled(func_def):
+    async def batch_method(ids):
+        asyncio.current_task().cancel()
+        await asyncio.sleep(0)
+
+    method = generate_batched_method(func_def, BatchedSettings('get_many'), None, lambda: batch_method)
+
+    results = await asyncio.wait_for(asyncio.gather(method(1), method(2), return_exceptions=True), 1)
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_unhashable_key(func_def):
+    async def single_method(key):
+        return {'id': key}
+
+    method = generate_batched_method(func_def, BatchedSettings('get_many'), single_method, lambda: None)
+
+    assert await method([1]) == {'id': [1]}
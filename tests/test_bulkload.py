@@ -0,0 +1,57 @@
+import datetime
+
+import pytest
+
+from aesqlapius.bulkload import (
+    CopySettings,
+    CopyTextReader,
+    encode_copy_row,
+    get_copy_settings
+)
+from aesqlapius.function_def import parse_function_definition
+
+
+def test_encode_row():
+    assert encode_copy_row((1, 'a', None, True, False)) == '1\ta\t\\N\tt\tf\n'
+    assert encode_copy_row(('back\\slash', 'tab\t', 'new\nline', 'cr\r')) == 'back\\\\slash\ttab\\t\tnew\\nline\tcr\\r\n'
+    assert encode_copy_row((b'\x01\xff', {'a': 'b'})) == '\\\\x01ff\t{"a": "b"}\n'
+    assert encode_copy_row((datetime.date(2020, 1, 2), 1.5)) == '2020-01-02\t1.5\n'
+
+
+def test_encode_array():
+    assert encode_copy_row(([1, 2, None],)) == '{"1","2",NULL}\n'
+    assert encode_copy_row(([['a', 'b'], ['c,d', '"e\\']],)) == '{{"a","b"},{"c,d","\\\\"e\\\\\\\\"}}\n'
+    assert encode_copy_row(([],)) == '{}\n'
+
+
+def test_reader():
+    rows = ((i, f'row {i}') for i in range(1000))
+    expected = ''.join(f'{i}\trow {i}\n' for i in range(1000))
+
+    reader = CopyTextReader(rows)
+    chunks = []
+    while chunk := reader.read(100):
+        assert len(chunk) <= 100
+        chunks.append(chunk)
+
+    assert ''.join(chunks) == expected
+
+
+def test_reader_read_all():
+    assert CopyTextReader([(1,), (2,)]).read() == '1\n2\n'
+    assert CopyTextReader([]).read(100) == ''
+
+
+def test_copy_settings():
+    assert get_copy_settings(parse_function_definition('def foo(a, b) -> None: ...')) is None
+    assert get_copy_settings(parse_function_definition('@copy_into("t")\ndef foo(a, b) -> None: ...')) == CopySettings('t', ['a', 'b'])
+    assert get_copy_settings(parse_function_definition('@copy_into("t", columns=["c"], schema="s")\ndef foo(a) -> None: ...')) == CopySettings('t', ['c'], 's')
+
+
+def test_copy_settings_errors():
+    with pytest.raises(TypeError):
+        get_copy_settings(parse_function_definition('@copy_into("t")\ndef foo(a) -> List[Tuple]: ...'))
+    with pytest.raises(TypeError):
+        get_copy_settings(parse_function_definition('@copy_into("t")\ndef foo() -> None: ...'))
+    with pytest.raises(TypeError):
+        get_copy_settings(parse_function_definition('@copy_into()\ndef foo(a) -> None: ...'))
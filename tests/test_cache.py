@@ -0,0 +1,140 @@
+import pytest
+
+from aesqlapius.cache import (
+    CacheRegistry,
+    CacheSettings,
+    MemoryCacheBackend,
+    ResultCache,
+    generate_cached_method,
+    generate_invalidating_method,
+    get_cache_settings,
+    get_invalidated_tags
+)
+from aesqlapius.function_def import parse_function_definition
+
+
+@pytest.fixture
+def func_def():
+    return parse_function_definition('@cached\ndef foo(a, b=2) -> List[Tuple]: ...')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    class Clock:
+        now = 0.0
+
+    monkeypatch.setattr('aesqlapius.cache.time.monotonic', lambda: Clock.now)
+    return Clock
+
+
+def test_settings():
+    assert get_cache_settings(parse_function_definition('def foo() -> List[Tuple]: ...')) is None
+    assert get_cache_settings(parse_function_definition('@cached(ttl=30, tags=["a"])\ndef foo() -> List[Tuple]: ...')) == CacheSettings(ttl=30, tags=['a'])
+
+
+def test_settings_errors():
+    with pytest.raises(TypeError):
+        get_cache_settings(parse_function_definition('@cached\ndef foo() -> None: ...'))
+    with pytest.raises(TypeError):
+        get_cache_settings(parse_function_definition('@cached\ndef foo() -> Iterator[Tuple]: ...'))
+    with pytest.raises(TypeError):
+        get_cache_settings(parse_function_definition('@cached(maxsize=0)\ndef foo() -> List[Tuple]: ...'))
+
+
+def test_invalidated_tags():
+    assert get_invalidated_tags(parse_function_definition('def foo() -> None: ...')) == []
+    assert get_invalidated_tags(parse_function_definition('@invalidates("a", "b")\ndef foo() -> None: ...')) == ['a', 'b']
+    with pytest.raises(TypeError):
+        get_invalidated_tags(parse_function_definition('@invalidates\ndef foo() -> None: ...'))
+
+
+def test_backend_lru():
+    backend = MemoryCacheBackend(maxsize=2)
+    backend.put(1, 'a')
+    backend.put(2, 'b')
+    assert backend.get(1) == (True, 'a')
+    backend.put(3, 'c')  # evicts 2 as least recently used
+    assert backend.get(2) == (False, None)
+    assert backend.get(1) == (True, 'a')
+    assert backend.get(3) == (True, 'c')
+    assert len(backend) == 2
+
+
+def test_backend_ttl(clock):
+    backend = MemoryCacheBackend(maxsize=10, ttl=10)
+    backend.put(1, 'a')
+    clock.now = 9.0
+    assert backend.get(1) == (True, 'a')
+    clock.now = 10.0
+    assert backend.get(1) == (False, None)
+    assert len(backend) == 0
+
+
+def test_cached_method(func_def):
+    calls = []
+
+    def method(*args, **kwargs):
+        calls.append((args, kwargs))
+        return len(calls)
+
+    cache = ResultCache(func_def, CacheSettings(), MemoryCacheBackend(10))
+    cached = generate_cached_method(cache, method, False)
+
+    assert cached(1) == 1
+    assert cached(a=1, b=2) == 1
+    assert cached(1, 3) == 2
+    assert cached([1]) == 3  # unhashable arguments are not cached
+    assert cached([1]) == 4
+    assert cache.info() == (1, 2, 1024, 2)
+
+
+@pytest.mark.asyncio
+async def test_cached_method_async(func_def):
+    calls = []
+
+    async def method(*args, **kwargs):
+        calls.append((args, kwargs))
+        return len(calls)
+
+    cache = ResultCache(func_def, CacheSettings(), MemoryCacheBackend(10))
+    cached = generate_cached_method(cache, method, True)
+
+    assert await cached(1) == 1
+    assert await cached(1) == 1
+    assert cache.info().hits == 1
+
+
+def test_invalidation_during_read(func_def):
+    registry = CacheRegistry()
+    cache = ResultCache(func_def, CacheSettings(), MemoryCacheBackend(10))
+    registry.register(cache, ['a'])
+
+    def method(*args, **kwargs):
+        # cache is invalidated while the query is running, so the
+        # (possibly stale) result must not be stored
+        registry.invalidate(['a'])
+        return 'stale'
+
+    assert generate_cached_method(cache, method, False)(1) == 'stale'
+    assert cache.info().currsize == 0
+
+
+def test_invalidation(func_def):
+    registry = CacheRegistry()
+    tagged = ResultCache(func_def, CacheSettings(), MemoryCacheBackend(10))
+    untagged = ResultCache(func_def, CacheSettings(), MemoryCacheBackend(10))
+    registry.register(tagged, ['a'])
+    tagged.put((1, 2), 'value', tagged.generation)
+    untagged.put((1, 2), 'value', untagged.generation)
+
+    def write():
+        return 'written'
+
+    assert generate_invalidating_method(lambda: registry.invalidate(['a']), write, False)() == 'written'
+    assert tagged.get((1, 2)) == (False, None)
+    assert untagged.get((1, 2)) == (True, 'value')
+
+    # invalidation keeps counters, explicit clear resets them
+    assert tagged.info().misses == 1
+    tagged.clear()
+    assert tagged.info() == (0, 0, 1024, 0)
@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import aesqlapius.executor
+from aesqlapius import generate_api, memo_scope
+from aesqlapius.executor import generate_executor_iterator_method
+from aesqlapius.pool import ThreadLocalConnectionPool
+
+from .fixtures import *  # noqa
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+@pytest.fixture
+def api(queries_dir, tmp_path, executor):
+    pool = ThreadLocalConnectionPool(lambda: sqlite3.connect(tmp_path / 'db.sqlite'))
+    yield generate_api(queries_dir / 'pool.sql', 'sqlite3', pool, executor=executor)
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_methods(api, monkeypatch):
+    monkeypatch.setattr(aesqlapius.executor, 'EXECUTOR_CHUNK_SIZE', 2)
+
+    await api.create_table()
+    await api.insert.many([(a,) for a in range(5)])
+
+    assert [a async for a in api.iterate()] == [0, 1, 2, 3, 4]
+
+    with pytest.raises(sqlite3.OperationalError):
+        await api.fail()
+
+
+@pytest.mark.asyncio
+async def test_memo_scope_propagated(api):
+    await api.create_table()
+    await api.insert(1)
+
+    async with memo_scope():
+        assert await api.count() == 1
+        await api.insert(2)  # clears memoized results
+        assert await api.count() == 2
+
+
+def test_async_driver():
+    pytest.importorskip('asyncpg')
+    with pytest.raises(TypeError):
+        generate_api('/nonexistent', 'asyncpg', executor=ThreadPoolExecutor())
+
+
+@pytest.mark.asyncio
+async def test_iterator_early_close(executor):
+    closed = threading.Event()
+    threads = set()
+
+    def generate():
+        try:
+            for n in range(100000):
+                threads.add(threading.get_ident())
+                yield n
+        finally:
+            closed.set()
+
+    method = generate_executor_iterator_method(generate, executor, 10)
+
+    iterator = method()
+    assert [await iterator.__anext__() for _ in range(15)] == list(range(15))
+    await iterator.aclose()
+
+    assert closed.is_set()
+    assert len(threads) == 1  # generator is consumed in a single thread
+
+
+@pytest.mark.asyncio
+async def test_iterator_error(executor):
+    def generate():
+        yield 1
+        raise RuntimeError('failed')
+
+    method = generate_executor_iterator_method(generate, executor, 10)
+
+    with pytest.raises(RuntimeError):
+        [item async for item in method()]
@@ -2,6 +2,7 @@ import pytest
 
 from aesqlapius.function_def import (
     ArgumentDefinition,
+    DecoratorDefinition,
     FunctionDefinition,
     ReturnValueDefinition,
     ReturnValueInnerFormat,
@@ -44,6 +45,20 @@ def test_args():
     )
 
 
+def test_list_args():
+    assert parse_function_definition(
+        'def Foo(a: List[int], b: list, c: List, d: Tuple[int]) -> None: ...'
+    ) == FunctionDefinition(
+        name='Foo',
+        args=[
+            ArgumentDefinition(name='a', is_list=True),
+            ArgumentDefinition(name='b', is_list=True),
+            ArgumentDefinition(name='c', is_list=True),
+            ArgumentDefinition(name='d'),
+        ]
+    )
+
+
 def test_default_args():
     assert parse_function_definition(
         'def Foo(a: int, b: int=2, c: int=3) -> None: ...'
@@ -143,6 +158,64 @@ def test_returns_outer_dict_remove_key():
     )
 
 
+def test_returns_outer_group():
+    assert parse_function_definition(
+        'def Foo() -> Group[-"colname", Dict]: ...'
+    ) == FunctionDefinition(
+        name='Foo',
+        returns=ReturnValueDefinition(
+            outer_format=ReturnValueOuterFormat.GROUP,
+            inner_format=ReturnValueInnerFormat.DICT,
+            outer_dict_by='colname',
+            remove_key_column=True
+        )
+    )
+
+
+def test_returns_outer_group_iterator():
+    assert parse_function_definition(
+        'def Foo() -> GroupIterator[0, Tuple]: ...'
+    ) == FunctionDefinition(
+        name='Foo',
+        returns=ReturnValueDefinition(
+            outer_format=ReturnValueOuterFormat.GROUP_ITERATOR,
+            inner_format=ReturnValueInnerFormat.TUPLE,
+            outer_dict_by=0
+        )
+    )
+
+
+def test_returns_outer_nested():
+    assert parse_function_definition(
+        'def Foo() -> Nested[("id", 1), Dict, {"items": "item_"}]: ...'
+    ) == FunctionDefinition(
+        name='Foo',
+        returns=ReturnValueDefinition(
+            outer_format=ReturnValueOuterFormat.NESTED,
+            inner_format=ReturnValueInnerFormat.DICT,
+            nested_by=['id', 1],
+            nested_children={'items': 'item_'}
+        )
+    )
+
+
+def test_returns_outer_pages():
+    assert parse_function_definition(
+        'def Foo(after=0, limit=100) -> Pages["id", Tuple]: ...'
+    ) == FunctionDefinition(
+        name='Foo',
+        args=[
+            ArgumentDefinition(name='after', has_default=True, default=0),
+            ArgumentDefinition(name='limit', has_default=True, default=100),
+        ],
+        returns=ReturnValueDefinition(
+            outer_format=ReturnValueOuterFormat.PAGES,
+            inner_format=ReturnValueInnerFormat.TUPLE,
+            outer_dict_by='id'
+        )
+    )
+
+
 def test_returns_inner_tuple():
     assert parse_function_definition(
         'def Foo() -> Single[Tuple]: ...'
@@ -179,6 +252,18 @@ def test_returns_inner_value():
     )
 
 
+def test_returns_inner_json():
+    assert parse_function_definition(
+        'def Foo() -> List[Json]: ...'
+    ) == FunctionDefinition(
+        name='Foo',
+        returns=ReturnValueDefinition(
+            outer_format=ReturnValueOuterFormat.LIST,
+            inner_format=ReturnValueInnerFormat.JSON
+        )
+    )
+
+
 def test_accepts_complex_arg_annotations():
     assert parse_function_definition(
         'def Foo(arg: Tuple[str, int]) -> None: ...'
@@ -285,3 +370,67 @@ def test_syntax_requires_returns_dict_colref():
 def test_syntax_requires_returns_dict_colref_modifier():
     with pytest.raises(SyntaxError):
         parse_function_definition('def A() -> Dict[+1, Value]: ...')
+
+
+def test_syntax_requires_returns_group_nargs():
+    with pytest.raises(SyntaxError):
+        parse_function_definition('def A() -> Group[Value]: ...')
+
+
+def test_syntax_requires_returns_nested_children():
+    with pytest.raises(SyntaxError):
+        parse_function_definition('def A() -> Nested["id", Dict]: ...')
+
+    with pytest.raises(SyntaxError):
+        parse_function_definition('def A() -> Nested["id", Dict, {}]: ...')
+
+    with pytest.raises(SyntaxError):
+        parse_function_definition('def A() -> Nested["id", Dict, {"items": 1}]: ...')
+
+
+def test_syntax_requires_returns_nested_row():
+    with pytest.raises(TypeError):
+        parse_function_definition('def A() -> Nested["id", Value, {"items": "item_"}]: ...')
+
+
+def test_syntax_requires_returns_pages_key_argument():
+    with pytest.raises(SyntaxError):
+        parse_function_definition('def A(limit=100) -> Pages["id", Tuple]: ...')
+
+
+def test_decorators():
+    assert parse_function_definition(
+        '@spill(1, [2, -3], a="b")\ndef Foo() -> None: ...'
+    ) == FunctionDefinition(
+        name='Foo',
+        decorators={
+            'spill': DecoratorDefinition(name='spill', args=[1, [2, -3]], kwargs={'a': 'b'}),
+        }
+    )
+
+    assert parse_function_definition(
+        '@spill\ndef Foo() -> None: ...'
+    ) == FunctionDefinition(
+        name='Foo',
+        decorators={
+            'spill': DecoratorDefinition(name='spill'),
+        }
+    )
+
+
+def test_syntax_requires_known_decorator():
+    with pytest.raises(TypeError):
+        parse_function_definition('@foo\ndef A() -> None: ...')
+
+
+def test_syntax_requires_unique_decorators():
+    with pytest.raises(SyntaxError):
+        parse_function_definition('@spill\n@spill\ndef A() -> None: ...')
+
+
+def test_syntax_requires_literal_decorator_args():
+    with pytest.raises(SyntaxError):
+        parse_function_definition('@spill(foo)\ndef A() -> None: ...')
+
+    with pytest.raises(SyntaxError):
+        parse_function_definition('@spill.foo\ndef A() -> None: ...')
@@ -0,0 +1,67 @@
+import pytest
+
+from aesqlapius.function_def import parse_function_definition
+from aesqlapius.hook import default_query_hook
+from aesqlapius.inlist import (
+    InListStyle,
+    generate_in_list_hook,
+    get_bucket_size
+)
+
+
+@pytest.fixture
+def func_def():
+    return parse_function_definition('def foo(a: int, ids: List[int], other: list) -> None: ...')
+
+
+def test_bucket_size():
+    assert [get_bucket_size(n) for n in range(10)] == [0, 1, 2, 4, 4, 8, 8, 8, 8, 16]
+
+
+def test_no_lists():
+    func_def = parse_function_definition('def foo(a: int) -> None: ...')
+    args = {'a': 1}
+    assert generate_in_list_hook(func_def, default_query_hook, InListStyle('named'))('SELECT :a', args) == ('SELECT :a', args)
+
+
+def test_any(func_def):
+    hook = generate_in_list_hook(func_def, default_query_hook, InListStyle('pyformat', use_any=True))
+    args = {'a': 1, 'ids': (1, 2), 'other': [3]}
+    assert hook('SELECT * FROM t WHERE id IN %(ids)s AND a = %(a)s', args) == ('SELECT * FROM t WHERE id = ANY(%(ids)s) AND a = %(a)s', {'a': 1, 'ids': [1, 2], 'other': [3]})
+    assert args['ids'] == (1, 2)
+    assert hook('SELECT * FROM t WHERE id not in %(ids)s', args)[0] == 'SELECT * FROM t WHERE id <> ALL(%(ids)s)'
+
+
+def test_any_numeric(func_def):
+    hook = generate_in_list_hook(func_def, default_query_hook, InListStyle('numeric', use_any=True))
+    args = {'a': 1, 'ids': [1, 2], 'other': [3]}
+    assert hook('SELECT * FROM t WHERE id IN $2 AND x IN $3 AND y IN $22', args)[0] == 'SELECT * FROM t WHERE id = ANY($2) AND x = ANY($3) AND y IN $22'
+
+
+def test_expand(func_def):
+    hook = generate_in_list_hook(func_def, default_query_hook, InListStyle('named'))
+    args = {'a': 1, 'ids': [1, 2, 3], 'other': [4]}
+    assert hook('SELECT * FROM t WHERE id IN :ids AND a = :a', args) == (
+        'SELECT * FROM t WHERE id IN (:ids__0, :ids__1, :ids__2, :ids__3) AND a = :a',
+        {'a': 1, 'ids': [1, 2, 3], 'other': [4], 'ids__0': 1, 'ids__1': 2, 'ids__2': 3, 'ids__3': 3}
+    )
+    assert args == {'a': 1, 'ids': [1, 2, 3], 'other': [4]}
+
+
+def test_expand_not_in(func_def):
+    hook = generate_in_list_hook(func_def, default_query_hook, InListStyle('pyformat'))
+    args = {'a': 1, 'ids': [1], 'other': [4, 5]}
+    assert hook('SELECT * FROM t WHERE id NOT IN %(ids)s OR x IN %(other)s', args)[0] == 'SELECT * FROM t WHERE id NOT IN (%(ids__0)s) OR x IN (%(other__0)s, %(other__1)s)'
+
+
+def test_expand_empty(func_def):
+    hook = generate_in_list_hook(func_def, default_query_hook, InListStyle('named', empty_list='()'))
+    args = {'a': 1, 'ids': [], 'other': []}
+    assert hook('SELECT * FROM t WHERE id IN :ids', args)[0] == 'SELECT * FROM t WHERE id IN ()'
+
+
+def test_expand_unused(func_def):
+    hook = generate_in_list_hook(func_def, default_query_hook, InListStyle('named'))
+    args = {'a': 1, 'ids': [1], 'other': [2]}
+    assert hook('SELECT :ids', args) == ('SELECT :ids', args)
+    assert args == {'a': 1, 'ids': [1], 'other': [2]}
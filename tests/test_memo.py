@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from aesqlapius.function_def import parse_function_definition
+from aesqlapius.memo import (
+    clear_memo,
+    generate_memoized_method,
+    is_memoizable,
+    memo_scope
+)
+
+
+@pytest.fixture
+def func_def():
+    return parse_function_definition('def foo(a, b=2) -> List[Tuple]: ...')
+
+
+def test_memoizable():
+    assert is_memoizable(parse_function_definition('def foo() -> List[Tuple]: ...'))
+    assert not is_memoizable(parse_function_definition('def foo() -> None: ...'))
+    assert not is_memoizable(parse_function_definition('def foo() -> Iterator[Tuple]: ...'))
+
+
+def test_memoized_method(func_def):
+    calls = []
+
+    def method(*args, **kwargs):
+        calls.append((args, kwargs))
+        return len(calls)
+
+    memoized = generate_memoized_method(func_def, method, False)
+
+    assert memoized(1) == 1  # no scope
+    with memo_scope():
+        assert memoized(1) == 2
+        assert memoized(a=1, b=2) == 2
+        with memo_scope():  # nested scope shares results
+            assert memoized(1) == 2
+        assert memoized(1) == 2
+        assert memoized([1]) == 3  # unhashable arguments are not memoized
+        clear_memo()
+        assert memoized(1) == 4
+    assert memoized(1) == 5
+
+
+@pytest.mark.asyncio
+async def test_memoized_method_async(func_def):
+    calls = []
+
+    async def method(*args, **kwargs):
+        calls.append((args, kwargs))
+        return len(calls)
+
+    memoized = generate_memoized_method(func_def, method, True)
+
+    async def request():
+        async with memo_scope():
+            return [await memoized(1), await memoized(1)]
+
+    # concurrent scopes do not share results
+    assert sorted(await asyncio.gather(request(), request())) == [[1, 1], [2, 2]]
@@ -0,0 +1,55 @@
+import pytest
+
+from aesqlapius.function_def import ReturnValueInnerFormat
+from aesqlapius.nesting import NestedAssembler
+
+
+@pytest.fixture
+def field_names():
+    return ['id', 'name', 'tag_id', 'tag_name', 'note_id']
+
+
+@pytest.fixture
+def rows():
+    return [
+        (1, 'foo', 10, 'x', 100),
+        (1, 'foo', 11, 'y', 100),
+        (1, 'foo', 10, 'x', 101),
+        (1, 'foo', 11, 'y', 101),
+        (2, 'bar', None, None, None),
+        (3, 'baz', 12, 'z', None),
+    ]
+
+
+def assemble(inner_format, field_names, key_columns, children, rows):
+    assembler = NestedAssembler(inner_format, field_names, key_columns, children)
+    for row in rows:
+        assembler.add(row)
+    return assembler.result()
+
+
+def test_dict(field_names, rows):
+    assert assemble(ReturnValueInnerFormat.DICT, field_names, ['id'], {'tags': 'tag_', 'notes': 'note_'}, rows) == [
+        {'id': 1, 'name': 'foo', 'tags': [{'id': 10, 'name': 'x'}, {'id': 11, 'name': 'y'}], 'notes': [{'id': 100}, {'id': 101}]},
+        {'id': 2, 'name': 'bar', 'tags': [], 'notes': []},
+        {'id': 3, 'name': 'baz', 'tags': [{'id': 12, 'name': 'z'}], 'notes': []},
+    ]
+
+
+def test_tuple(field_names, rows):
+    assert assemble(ReturnValueInnerFormat.TUPLE, field_names, [0], {'tags': 'tag_', 'notes': 'note_'}, rows) == [
+        (1, 'foo', [(10, 'x'), (11, 'y')], [(100,), (101,)]),
+        (2, 'bar', [], []),
+        (3, 'baz', [(12, 'z')], []),
+    ]
+
+
+def test_single_child_not_deduplicated(field_names, rows):
+    assert assemble(ReturnValueInnerFormat.TUPLE, field_names, ['id', 'name'], {'tags': 'tag_'}, rows)[0] == (
+        1, 'foo', 100, [(10, 'x'), (11, 'y'), (10, 'x'), (11, 'y')]
+    )
+
+
+def test_missing_key(field_names):
+    with pytest.raises(KeyError):
+        NestedAssembler(ReturnValueInnerFormat.DICT, field_names, ['missing'], {'tags': 'tag_'})
@@ -0,0 +1,57 @@
+import sqlite3
+import threading
+
+import pytest
+
+from aesqlapius import generate_api
+from aesqlapius.parallel import ParallelRunner
+from aesqlapius.pool import ConnectionPool
+
+from .fixtures import *  # noqa
+
+
+def test_parallel():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def call(value):
+        def run(api):
+            barrier.wait()  # only passes if all calls run concurrently
+            return api.upper(value)
+        return run
+
+    class Api:
+        upper = staticmethod(str.upper)
+
+    runner = ParallelRunner(Api(), 3)
+    assert runner(call('a'), call('b'), call('c')) == ['A', 'B', 'C']
+    assert runner() == []
+
+
+def test_parallel_error():
+    completed = []
+
+    def fail(api):
+        raise ValueError('failed')
+
+    def succeed(api):
+        completed.append(True)
+        return 'ok'
+
+    with pytest.raises(ValueError):
+        ParallelRunner(None)(succeed, fail, succeed)
+
+    assert completed == [True, True]
+
+
+def test_api_parallel(queries_dir, tmp_path):
+    pool = ConnectionPool(lambda: sqlite3.connect(tmp_path / 'db.sqlite', check_same_thread=False), max_size=3)
+    api = generate_api(queries_dir / 'pool.sql', 'sqlite3', pool)
+
+    api.create_table()
+    api.insert.many([(1,), (2,)])
+
+    assert api.parallel(lambda a: a.count(), lambda a: list(a.iterate()), lambda a: a.count()) == [2, [1, 2], 2]
+    assert pool.stats().in_use == 0
+
+    # only provided for pools
+    assert not hasattr(generate_api(queries_dir / 'pool.sql', 'sqlite3', sqlite3.connect(':memory:')), 'parallel')
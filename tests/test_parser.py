@@ -1,6 +1,13 @@
 import io
 
-from aesqlapius.function_def import ArgumentDefinition, FunctionDefinition
+from aesqlapius.function_def import (
+    ArgumentDefinition,
+    DecoratorDefinition,
+    FunctionDefinition,
+    ReturnValueDefinition,
+    ReturnValueInnerFormat,
+    ReturnValueOuterFormat
+)
 from aesqlapius.query import Query, parse_queries_from_fd
 
 
@@ -105,3 +112,30 @@ def test_multiline_definition():
             text=text_baz
         ),
     ]
+
+
+def test_decorators():
+    text = (
+        '-- Some function\n'
+        '-- @spill(max_rows=10)\n'
+        '-- def foo() -> List[Tuple]: ...\n'
+        'SELECT 1;\n'
+    )
+
+    assert parse_queries_from_fd(
+        io.StringIO(text)
+    ) == [
+        Query(
+            func_def=FunctionDefinition(
+                name='foo',
+                returns=ReturnValueDefinition(
+                    outer_format=ReturnValueOuterFormat.LIST,
+                    inner_format=ReturnValueInnerFormat.TUPLE
+                ),
+                decorators={
+                    'spill': DecoratorDefinition(name='spill', kwargs={'max_rows': 10})
+                }
+            ),
+            text=text
+        )
+    ]
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from aesqlapius import generate_api
+from aesqlapius.function_def import parse_function_definition
+from aesqlapius.pinning import (
+    create_unpinned_task,
+    get_pinned_connection,
+    is_pinned,
+    pin
+)
+from aesqlapius.singleflight import generate_singleflight_method
+
+from .fixtures import *  # noqa
+
+
+def test_pin():
+    pool, other_pool = object(), object()
+
+    assert get_pinned_connection(pool) is None
+    with pin(pool, 'a'):
+        assert get_pinned_connection(pool) == 'a'
+        assert get_pinned_connection(other_pool) is None
+        with pin(other_pool, 'b'):
+            assert get_pinned_connection(pool) == 'a'
+            assert get_pinned_connection(other_pool) == 'b'
+        assert get_pinned_connection(other_pool) is None
+    assert get_pinned_connection(pool) is None
+
+
+@pytest.mark.asyncio
+async def test_pin_task_local():
+    pool = object()
+
+    async def task(conn):
+        with pin(pool, conn):
+            await asyncio.sleep(0)
+            return get_pinned_connection(pool)
+
+    assert await asyncio.gather(task('a'), task('b')) == ['a', 'b']
+    assert get_pinned_connection(pool) is None
+
+
+@pytest.mark.asyncio
+async def test_unpinned_task():
+    pool = object()
+
+    async def task():
+        return get_pinned_connection(pool)
+
+    with pin(pool, 'a'):
+        assert is_pinned()
+        assert await create_unpinned_task(task()) is None
+        assert await asyncio.create_task(task()) == 'a'
+    assert not is_pinned()
+
+
+@pytest.mark.asyncio
+async def test_singleflight_bypassed_when_pinned():
+    calls = []
+
+    async def method(a):
+        calls.append(a)
+        await asyncio.sleep(0.01)
+        return a
+
+    method_singleflight = generate_singleflight_method(parse_function_definition('@singleflight\ndef foo(a) -> Single[Value]: ...'), method)
+
+    with pin(object(), 'a'):
+        assert await asyncio.gather(method_singleflight(1), method_singleflight(1)) == [1, 1]
+    assert calls == [1, 1]
+
+    assert await asyncio.gather(method_singleflight(1), method_singleflight(1)) == [1, 1]
+    assert calls == [1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_scopes_only_for_pools(queries_dir):
+    asyncpg = pytest.importorskip('asyncpg')
+
+    # pool is not connected until awaited
+    pool = asyncpg.create_pool('postgresql://localhost/aesqlapius')
+
+    assert hasattr(generate_api(queries_dir / 'ping.sql', 'asyncpg', pool), 'transaction')
+    assert not hasattr(generate_api(queries_dir / 'ping.sql', 'asyncpg', object()), 'transaction')
+
+    # names are only reserved for APIs bound to pools
+    generate_api(queries_dir / 'pinning.sql', 'asyncpg', object())
+    with pytest.raises(ValueError):
+        generate_api(queries_dir / 'pinning.sql', 'asyncpg', pool)
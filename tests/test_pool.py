@@ -0,0 +1,157 @@
+import sqlite3
+import threading
+
+import pytest
+
+from aesqlapius import generate_api
+from aesqlapius.pool import (
+    ConnectionPool,
+    ThreadLocalConnectionPool,
+    is_connection_pool,
+    pooled_connection
+)
+
+from .fixtures import *  # noqa
+
+
+class Connection:
+    def __init__(self):
+        self.log = []
+
+    def commit(self):
+        self.log.append('commit')
+
+    def rollback(self):
+        self.log.append('rollback')
+
+    def close(self):
+        self.log.append('close')
+
+
+class BrokenConnection(Connection):
+    def rollback(self):
+        raise RuntimeError('connection lost')
+
+
+def test_limits():
+    pool = ConnectionPool(Connection, max_size=2, timeout=0.01)
+
+    first = pool.acquire()
+    second = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+
+    pool.release(first)
+    assert pool.acquire() is first
+
+    stats = pool.stats()
+    assert (stats.max_size, stats.size, stats.in_use, stats.acquisitions, stats.waits, stats.timeouts) == (2, 2, 2, 3, 0, 1)
+    assert stats.utilization == 1.0
+
+    pool.release(second, discard=True)
+    assert second.log == ['close']
+    assert pool.stats().size == 1
+
+
+def test_wait():
+    pool = ConnectionPool(Connection, max_size=1)
+    conn = pool.acquire()
+    acquired = []
+
+    thread = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    thread.start()
+    pool.release(conn)
+    thread.join()
+
+    assert acquired == [conn]
+    assert pool.stats().waits <= 1
+
+
+def test_thread_local():
+    pool = ThreadLocalConnectionPool(Connection)
+    conns = []
+
+    def worker():
+        conn = pool.acquire()
+        assert pool.acquire() is conn
+        conns.append(conn)
+        pool.release(conn)
+        pool.release(conn)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(map(id, conns))) == 3
+    assert pool.stats()[:3] == (None, 3, 0)
+
+    pool.close()
+    assert all(conn.log == ['close'] for conn in conns)
+
+
+def test_pooled_connection():
+    pool = ConnectionPool(Connection)
+
+    with pooled_connection(pool) as conn:
+        pass
+    assert conn.log == ['commit']
+
+    with pytest.raises(ValueError):
+        with pooled_connection(pool) as conn:
+            raise ValueError()
+    assert conn.log == ['commit', 'rollback']
+    assert pool.stats()[1:3] == (1, 0)
+
+
+def test_pooled_connection_broken():
+    pool = ConnectionPool(BrokenConnection)
+
+    with pytest.raises(ValueError):
+        with pooled_connection(pool) as conn:
+            raise ValueError()
+    assert conn.log == ['close']
+    assert pool.stats()[1:3] == (0, 0)
+
+
+def test_psycopg2_pool_interface():
+    class Psycopg2Pool:
+        def __init__(self):
+            self.conn = Connection()
+            self.returned = []
+
+        def getconn(self):
+            return self.conn
+
+        def putconn(self, conn, close=False):
+            self.returned.append((conn, close))
+
+    pool = Psycopg2Pool()
+    assert is_connection_pool(pool)
+    assert not is_connection_pool(pool.conn)
+
+    with pooled_connection(pool):
+        pass
+    assert pool.returned == [(pool.conn, False)]
+
+
+def test_iterator_holds_connection(queries_dir, tmp_path):
+    pool = ConnectionPool(lambda: sqlite3.connect(tmp_path / 'db.sqlite', check_same_thread=False), max_size=2)
+    api = generate_api(queries_dir / 'pool.sql', 'sqlite3', pool)
+
+    api.create_table()
+    api.insert.many([(1,), (2,)])
+
+    iterator = api.iterate()
+    assert next(iterator) == 1
+    assert pool.stats().in_use == 1
+    assert list(iterator) == [2]
+    assert pool.stats().in_use == 0
+
+    iterator = api.iterate()
+    next(iterator)
+    iterator.close()
+    assert pool.stats().in_use == 0
+
+    assert pool.stats().size == 1
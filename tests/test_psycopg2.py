@@ -0,0 +1,71 @@
+import io
+import sqlite3
+
+import pytest
+
+from aesqlapius import generate_api
+
+from .fixtures import *  # noqa
+
+pytest.importorskip('psycopg2')
+
+
+class NamedCursor:
+    # emulates psycopg2 named cursor, which only gets description
+    # after the first fetch
+    def __init__(self, cur):
+        self._cur = cur
+        self._fetched = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cur.close()
+
+    @property
+    def description(self):
+        return self._cur.description if self._fetched else None
+
+    def execute(self, query, args):
+        self._cur.execute(query, args)
+
+    def fetchmany(self, size):
+        self._fetched = True
+        return self._cur.fetchmany(size)
+
+    def fetchone(self):
+        self._fetched = True
+        return self._cur.fetchone()
+
+    def __iter__(self):
+        self._fetched = True
+        return iter(self._cur)
+
+
+class Connection:
+    autocommit = True
+
+    def __init__(self):
+        self._db = sqlite3.connect(':memory:')
+
+    def cursor(self, name=None, withhold=False):
+        assert name is not None  # all tested methods use server side cursors
+        return NamedCursor(self._db.cursor())
+
+
+@pytest.fixture
+def api(queries_dir):
+    return generate_api(queries_dir / 'psycopg2.sql', 'psycopg2', Connection())
+
+
+def test_export_named_cursor(api):
+    output = io.StringIO()
+    assert api.get_iterator.to_csv(output) == 2
+    assert output.getvalue().splitlines() == ['a,b', '1,x', '2,y']
+
+
+def test_spill_named_cursor(api):
+    assert list(api.get_spilled_list()) == [(1, 'x'), (2, 'y')]
+    assert dict(api.get_spilled_dict()) == {1: 'x', 2: 'y'}
+    assert list(api.get_spilled_empty()) == []
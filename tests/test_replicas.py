@@ -0,0 +1,150 @@
+import contextvars
+import io
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from aesqlapius import generate_api
+from aesqlapius.function_def import parse_function_definition
+from aesqlapius.pool import ConnectionPool
+from aesqlapius.replicas import is_connection_error, is_readonly
+
+from .fixtures import *  # noqa
+
+
+def _connect(count):
+    db = sqlite3.connect(':memory:', check_same_thread=False)
+    db.execute('CREATE TABLE numbers (a integer)')
+    db.executemany('INSERT INTO numbers VALUES (?)', [(a,) for a in range(count)])
+    return db
+
+
+def _broken_pool():
+    def connect():
+        raise ConnectionRefusedError('replica is down')
+    return ConnectionPool(connect)
+
+
+def test_routing(queries_dir):
+    api = generate_api(queries_dir / 'replicas.sql', 'sqlite3', _connect(0), replicas=[_connect(10), _connect(20)], read_your_writes=0)
+
+    # reads are distributed between replicas
+    assert {api.count(), api.count()} == {10, 20}
+    assert len(list(api.iterate())) in (10, 20)
+    assert api.analyze() is None
+
+    api.insert(1)
+    assert api.count_primary() == 1
+
+
+def test_read_your_writes(queries_dir):
+    api = generate_api(queries_dir / 'replicas.sql', 'sqlite3', _connect(0), replicas=[_connect(10)], read_your_writes=60)
+
+    assert api.count() == 10
+
+    def write_and_read():
+        api.insert(1)
+        return api.count()
+
+    assert contextvars.copy_context().run(write_and_read) == 1
+
+    # writes made in other contexts do not affect reads
+    assert api.count() == 10
+
+
+def test_read_your_writes_expiration(queries_dir):
+    api = generate_api(queries_dir / 'replicas.sql', 'sqlite3', _connect(0), replicas=[_connect(10)], read_your_writes=0)
+    api.insert(1)
+    assert api.count() == 10
+
+
+def test_health(queries_dir):
+    api = generate_api(queries_dir / 'replicas.sql', 'sqlite3', _connect(5), replicas=[_broken_pool(), _connect(10)], read_your_writes=0)
+
+    # failed read is retried on the primary, and the replica is excluded
+    assert [api.count(), api.count()] == [5, 10]
+    assert api.replicas.healthy() == [False, True]
+    assert [api.count() for _ in range(3)] == [10, 10, 10]
+
+    api.replicas.mark_succeeded(0)
+    assert api.replicas.healthy() == [True, True]
+
+
+def test_all_replicas_down(queries_dir):
+    api = generate_api(queries_dir / 'replicas.sql', 'sqlite3', _connect(5), replicas=[_broken_pool()], read_your_writes=0)
+
+    assert api.count() == 5
+    assert api.count() == 5
+    assert api.replicas.healthy() == [False]
+
+
+@pytest.mark.asyncio
+async def test_executor(queries_dir):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        api = generate_api(queries_dir / 'replicas.sql', 'sqlite3', _connect(0), replicas=[_connect(10)], read_your_writes=60, executor=executor)
+
+        assert await api.count() == 10
+        assert [a async for a in api.iterate()] == list(range(10))
+
+        # writes made in executor threads are visible to the caller context
+        await api.insert(1)
+        assert await api.count() == 1
+
+
+def test_is_readonly():
+    assert is_readonly(parse_function_definition('def foo() -> List[Tuple]: ...'))
+    assert not is_readonly(parse_function_definition('def foo() -> None: ...'))
+    assert is_readonly(parse_function_definition('@readonly\ndef foo() -> None: ...'))
+    assert not is_readonly(parse_function_definition('@write\ndef foo() -> List[Tuple]: ...'))
+    assert not is_readonly(parse_function_definition("@invalidates('tag')\ndef foo() -> List[Tuple]: ..."))
+
+    with pytest.raises(TypeError):
+        is_readonly(parse_function_definition('@readonly\n@write\ndef foo() -> None: ...'))
+
+
+def test_is_connection_error():
+    assert is_connection_error(ConnectionRefusedError())
+    assert is_connection_error(sqlite3.OperationalError())
+    assert not is_connection_error(ValueError())
+
+
+def test_export_not_retried(queries_dir):
+    api = generate_api(queries_dir / 'replicas.sql', 'sqlite3', _connect(5), replicas=[_broken_pool()], read_your_writes=0)
+
+    # output may already contain some rows, so the export is not
+    # repeated on the primary
+    output = io.StringIO()
+    with pytest.raises(ConnectionRefusedError):
+        api.iterate.to_csv(output)
+    assert api.replicas.healthy() == [False]
+
+    assert api.iterate.to_csv(output) == 5
+
+
+def test_write_behind(queries_dir, tmp_path):
+    path = tmp_path / 'primary.db'
+    sqlite3.connect(path).execute('CREATE TABLE numbers (a integer)')
+    primary = ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False))
+
+    api = generate_api(queries_dir / 'replicas_writebehind.sql', 'sqlite3', primary, replicas=[_connect(10)], read_your_writes=60)
+
+    def write_and_choose():
+        api.log_number(1).result()
+        return api.replicas.choose()[0]
+
+    # write is marked in the caller context, not in the writer thread
+    assert contextvars.copy_context().run(write_and_choose) is None
+    assert api.replicas.choose()[0] == 0
+
+    api.log_number.stop()
+
+
+def test_replicas_name_clash(queries_dir):
+    with pytest.raises(ValueError):
+        generate_api(queries_dir / 'replicas_clash.sql', 'sqlite3', _connect(0), replicas=[_connect(10)])
+
+
+def test_errors(queries_dir):
+    with pytest.raises(TypeError):
+        generate_api(queries_dir / 'replicas.sql', 'sqlite3', replicas=[_connect(0)])
@@ -0,0 +1,145 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from aesqlapius import generate_api
+from aesqlapius.function_def import parse_function_definition
+from aesqlapius.pool import ConnectionPool
+from aesqlapius.sharding import (
+    ShardedMethodGenerator,
+    _merge_async_iterators,
+    default_shard_router,
+    get_sharding_settings
+)
+
+from .fixtures import *  # noqa
+
+
+@pytest.fixture
+def shards(tmp_path):
+    pools = [
+        ConnectionPool(lambda path=tmp_path / f'shard{index}.sqlite': sqlite3.connect(path, check_same_thread=False), max_size=2)
+        for index in range(2)
+    ]
+    yield pools
+    for pool in pools:
+        pool.close()
+
+
+@pytest.fixture
+def api(queries_dir, shards):
+    api = generate_api(queries_dir / 'sharding.sql', 'sqlite3', shards=shards)
+    api.create_table()
+    api.insert.many([(key, f'user{key}') for key in range(5)])
+    return api
+
+
+def test_routing(api):
+    assert api.get(3) == 'user3'
+    assert api.get(10) is None
+
+    # rows are distributed between shards by the router
+    assert api.count_shards() == [3, 2]
+
+
+def test_merging(api):
+    assert api.list_all() == [{'id': key, 'name': f'user{key}'} for key in range(5)]
+    assert list(api.iterate_desc()) == [(key, f'user{key}') for key in reversed(range(5))]
+    assert list(api.iterate_ids()) == list(range(5))
+    assert api.names() == {key: f'user{key}' for key in range(5)}
+
+
+def test_broadcast_many(api):
+    api.insert_everywhere.many((key, f'user{key}') for key in range(10, 13))
+    assert api.count_shards() == [6, 5]
+
+
+def test_broadcast_iterator_parallel():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def method_func(shard):
+        barrier.wait()  # only passes if shards are queried concurrently
+        yield from shard
+
+    func_def = parse_function_definition('@broadcast\ndef foo() -> Iterator[Value]: ...')
+    method, _ = ShardedMethodGenerator([[1, 2], [3]], default_shard_router, False).generate(func_def, method_func, {})
+
+    assert list(method()) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('decorator', ['@broadcast', '@broadcast(order_by=0)'])
+async def test_broadcast_iterator_parallel_async(decorator):
+    started = []
+    all_started = asyncio.Event()
+
+    async def method_func(shard):
+        started.append(shard)
+        if len(started) == 2:
+            all_started.set()
+        await asyncio.wait_for(all_started.wait(), 5)  # only passes if shards are queried concurrently
+        for value in shard:
+            yield value
+
+    func_def = parse_function_definition(f'{decorator}\ndef foo() -> Iterator[Value]: ...')
+    method, _ = ShardedMethodGenerator([[1, 2], [3]], default_shard_router, True).generate(func_def, method_func, {})
+
+    assert sorted([value async for value in method()]) == [1, 2, 3]
+
+
+def test_custom_router(queries_dir, shards):
+    api = generate_api(queries_dir / 'sharding.sql', 'sqlite3', shards=shards, shard_router=lambda key, count: 0)
+    api.create_table()
+    api.insert(1, 'foo')
+    api.insert(2, 'bar')
+
+    assert api.count_shards() == [2, 0]
+
+
+def test_errors(queries_dir, shards):
+    with pytest.raises(TypeError):
+        generate_api(queries_dir / 'sharding.sql', 'sqlite3', sqlite3.connect(':memory:'), shards=shards)
+
+    # all methods must be annotated
+    with pytest.raises(TypeError):
+        generate_api(queries_dir / 'pool.sql', 'sqlite3', shards=shards)
+
+    # a batch failing on one shard may be already committed on others,
+    # so it cannot be retried by write-behind
+    with pytest.raises(TypeError):
+        generate_api(queries_dir / 'sharding_writebehind.sql', 'sqlite3', shards=shards)
+
+
+def test_settings():
+    with pytest.raises(TypeError):
+        get_sharding_settings(parse_function_definition("@shard_by('missing')\ndef foo(a: int) -> None: ..."))
+
+    with pytest.raises(TypeError):
+        get_sharding_settings(parse_function_definition("@broadcast(order_by='a')\ndef foo() -> Dict['a', Tuple]: ..."))
+
+    with pytest.raises(TypeError):
+        get_sharding_settings(parse_function_definition("@broadcast(order_by='a')\ndef foo() -> List[Tuple]: ..."))
+
+    with pytest.raises(TypeError):
+        get_sharding_settings(parse_function_definition("@broadcast\n@shard_by('a')\ndef foo(a: int) -> None: ..."))
+
+
+def test_default_router():
+    assert default_shard_router(5, 3) == 2
+    assert default_shard_router('foo', 3) == default_shard_router(b'foo', 3)
+    assert all(0 <= default_shard_router(f'key{index}', 3) < 3 for index in range(100))
+
+
+@pytest.mark.asyncio
+async def test_merge_async_iterators():
+    async def iterate(*values):
+        for value in values:
+            yield value
+
+    merged = _merge_async_iterators([iterate(1, 4, 5), iterate(), iterate(2, 3, 6)], None, False)
+    assert [value async for value in merged] == [1, 2, 3, 4, 5, 6]
+
+    merged = _merge_async_iterators([iterate((5, 'a'), (1, 'b')), iterate((3, 'c'))], lambda row: row[0], True)
+    assert [value async for value in merged] == [(5, 'a'), (3, 'c'), (1, 'b')]
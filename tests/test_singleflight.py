@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from aesqlapius.function_def import parse_function_definition
+from aesqlapius.singleflight import (
+    generate_singleflight_method,
+    is_singleflight
+)
+
+
+@pytest.fixture
+def func_def():
+    return parse_function_definition('@singleflight\ndef foo(a, b=2) -> List[Tuple]: ...')
+
+
+class SlowMethod:
+    def __init__(self):
+        self.calls = []
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return [args, kwargs]
+
+
+def test_settings():
+    assert is_singleflight(parse_function_definition('def foo() -> List[Tuple]: ...'), True) is False
+    assert is_singleflight(parse_function_definition('@singleflight\ndef foo() -> List[Tuple]: ...'), True) is True
+    with pytest.raises(TypeError):
+        is_singleflight(parse_function_definition('@singleflight\ndef foo() -> List[Tuple]: ...'), False)
+    with pytest.raises(TypeError):
+        is_singleflight(parse_function_definition('@singleflight\ndef foo() -> None: ...'), True)
+    with pytest.raises(TypeError):
+        is_singleflight(parse_function_definition('@singleflight\ndef foo() -> Iterator[Tuple]: ...'), True)
+
+
+@pytest.mark.asyncio
+async def test_coalesce(func_def):
+    method = SlowMethod()
+    singleflight = generate_singleflight_method(func_def, method)
+
+    tasks = [asyncio.ensure_future(singleflight(1)), asyncio.ensure_future(singleflight(a=1, b=2)), asyncio.ensure_future(singleflight(2))]
+    await method.started.wait()
+    method.release.set()
+
+    assert await asyncio.gather(*tasks) == [[(1,), {}], [(1,), {}], [(2,), {}]]
+    assert len(method.calls) == 2
+
+    # finished flights are not reused
+    await singleflight(1)
+    assert len(method.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_error(func_def):
+    async def method(*args, **kwargs):
+        await asyncio.sleep(0)
+        raise RuntimeError('failed')
+
+    singleflight = generate_singleflight_method(func_def, method)
+
+    results = await asyncio.gather(singleflight(1), singleflight(1), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cancel_one(func_def):
+    method = SlowMethod()
+    singleflight = generate_singleflight_method(func_def, method)
+
+    first = asyncio.ensure_future(singleflight(1))
+    second = asyncio.ensure_future(singleflight(1))
+    await method.started.wait()
+
+    first.cancel()
+    await asyncio.sleep(0)
+    method.release.set()
+
+    assert await second == [(1,), {}]
+    assert first.cancelled()
+    assert not method.cancelled
+
+
+@pytest.mark.asyncio
+async def test_cancel_all(func_def):
+    method = SlowMethod()
+    singleflight = generate_singleflight_method(func_def, method)
+
+    tasks = [asyncio.ensure_future(singleflight(1)) for _ in range(2)]
+    await method.started.wait()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert method.cancelled
+
+
+@pytest.mark.asyncio
+async def test_cancel_all_then_call(func_def):
+    method = SlowMethod()
+    singleflight = generate_singleflight_method(func_def, method)
+
+    task = asyncio.ensure_future(singleflight(1))
+    await method.started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # cancelled flight is not joined, even if it has not finished yet
+    method.release.set()
+    assert await singleflight(1) == [(1,), {}]
+    assert len(method.calls) == 2
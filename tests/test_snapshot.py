@@ -0,0 +1,163 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from aesqlapius import generate_api
+from aesqlapius.function_def import parse_function_definition
+from aesqlapius.snapshot import (
+    SnapshotSettings,
+    generate_snapshot_method,
+    get_snapshot_settings
+)
+
+from .fixtures import *  # noqa
+
+
+class Table:
+    def __init__(self):
+        self.rows = {1: {'id': 1, 'version': 1}}
+        self.calls = []
+
+    def __call__(self, *args):
+        self.calls.append(args)
+        since = args[0] if args else None
+        return {key: row for key, row in self.rows.items() if since is None or row['version'] >= since}
+
+
+def test_settings():
+    assert get_snapshot_settings(parse_function_definition("def foo() -> Dict['id', Dict]: ...")) is None
+    assert get_snapshot_settings(parse_function_definition("@snapshot(10)\ndef foo() -> Dict['id', Dict]: ...")) == SnapshotSettings(interval=10)
+    assert get_snapshot_settings(parse_function_definition("@snapshot(watermark='v')\ndef foo(since) -> Dict['id', Dict]: ...")) == SnapshotSettings(watermark='v')
+
+
+def test_settings_errors():
+    with pytest.raises(TypeError):
+        get_snapshot_settings(parse_function_definition('@snapshot\ndef foo() -> List[Dict]: ...'))
+    with pytest.raises(TypeError):
+        get_snapshot_settings(parse_function_definition("@snapshot\ndef foo(a) -> Dict['id', Dict]: ..."))
+    with pytest.raises(TypeError):
+        get_snapshot_settings(parse_function_definition("@snapshot(watermark='v')\ndef foo() -> Dict['id', Dict]: ..."))
+    with pytest.raises(TypeError):
+        get_snapshot_settings(parse_function_definition("@snapshot(watermark='v')\ndef foo(since) -> Dict['id', Tuple]: ..."))
+    with pytest.raises(TypeError):
+        get_snapshot_settings(parse_function_definition("@snapshot(interval=0)\ndef foo() -> Dict['id', Dict]: ..."))
+
+
+def test_full_refresh():
+    table = Table()
+    method, refresh, stop, info = generate_snapshot_method(SnapshotSettings(), table, False)
+
+    first = method()
+    assert first == {1: {'id': 1, 'version': 1}}
+
+    table.rows = {2: {'id': 2, 'version': 1}}
+    assert method() is first
+
+    refresh()
+    assert method() == {2: {'id': 2, 'version': 1}}
+    assert first == {1: {'id': 1, 'version': 1}}  # previous snapshot is not modified
+    assert table.calls == [(), ()]
+
+
+def test_background_refresh():
+    table = Table()
+    method, refresh, stop, info = generate_snapshot_method(SnapshotSettings(interval=0.01, watermark='version'), table, False)
+
+    assert method() == {1: {'id': 1, 'version': 1}}
+    table.rows[2] = {'id': 2, 'version': 2}
+
+    deadline = time.monotonic() + 5
+    while len(method()) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    stop()
+
+    assert method() == {1: {'id': 1, 'version': 1}, 2: {'id': 2, 'version': 2}}
+    assert table.calls[:2] == [(None,), (1,)]
+
+
+@pytest.mark.asyncio
+async def test_notifications():
+    table = Table()
+    subscriptions = []
+
+    async def listen(channel, callback):
+        subscriptions.append((channel, callback))
+
+        async def unlisten():
+            subscriptions.clear()
+
+        return unlisten
+
+    async def method_func(*args):
+        return table(*args)
+
+    method, refresh, stop, info = generate_snapshot_method(SnapshotSettings(watermark='version', channel='changes'), method_func, True, listen)
+
+    assert await method() == {1: {'id': 1, 'version': 1}}
+    assert [channel for channel, _ in subscriptions] == ['changes']
+
+    table.rows[1] = {'id': 1, 'version': 2}
+    subscriptions[0][1]()
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    assert await method() == {1: {'id': 1, 'version': 2}}
+
+    await stop()
+    assert subscriptions == []
+
+
+@pytest.mark.asyncio
+async def test_refresh_error():
+    failing = False
+
+    async def method_func():
+        if failing:
+            raise RuntimeError('failed')
+        return {1: 'a'}
+
+    method, refresh, stop, info = generate_snapshot_method(SnapshotSettings(), method_func, True)
+
+    assert await method() == {1: 'a'}
+    assert info().last_error is None
+    failing = True
+    with pytest.raises(RuntimeError):
+        await refresh()
+    assert await method() == {1: 'a'}
+    assert isinstance(info().last_error, RuntimeError)
+    assert info().age >= 0
+
+    failing = False
+    await refresh()
+    assert info().last_error is None
+
+
+def test_background_refresh_error(caplog):
+    failing = threading.Event()
+    failed = threading.Event()
+
+    def method_func():
+        if failing.is_set():
+            failed.set()
+            raise RuntimeError('failed')
+        return {1: 'a'}
+
+    method, refresh, stop, info = generate_snapshot_method(SnapshotSettings(interval=0.01), method_func, False)
+
+    assert info().age is None
+    assert method() == {1: 'a'}
+    failing.set()
+    assert failed.wait(5)
+    stop()
+
+    assert isinstance(info().last_error, RuntimeError)
+    assert 'background refresh of snapshot failed' in caplog.text
+
+
+def test_connection_pool_required(queries_dir):
+    with pytest.raises(TypeError):
+        generate_api(queries_dir / 'snapshot.sql', 'sqlite3', sqlite3.connect(':memory:'))
@@ -0,0 +1,85 @@
+import pytest
+
+from aesqlapius.function_def import parse_function_definition
+from aesqlapius.spill import (
+    DictBuilder,
+    ListBuilder,
+    SpilledDict,
+    SpilledList,
+    SpillLimits,
+    get_spill_limits
+)
+
+
+def build_list(limits, values):
+    builder = ListBuilder(limits)
+    for value in values:
+        builder.append(value)
+    return builder.finish()
+
+
+def build_dict(limits, items):
+    builder = DictBuilder(limits)
+    for key, value in items:
+        builder.put(key, value)
+    return builder.finish()
+
+
+def test_list_in_memory():
+    res = build_list(SpillLimits(max_rows=10), range(5))
+    assert isinstance(res, list)
+    assert res == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize('limits', [SpillLimits(max_rows=3), SpillLimits(max_bytes=100)])
+def test_list_spilled(limits):
+    values = [(n, f'value {n}') for n in range(2500)]
+    res = build_list(limits, values)
+    assert isinstance(res, SpilledList)
+    assert len(res) == 2500
+    assert list(res) == values
+    assert res[0] == values[0]
+    assert res[2] == values[2]
+    assert res[3] == values[3]
+    assert res[-1] == values[-1]
+    assert res[1:6] == values[1:6]
+    with pytest.raises(IndexError):
+        res[2500]
+
+
+def test_dict_in_memory():
+    res = build_dict(SpillLimits(max_rows=10), [(1, 'a'), (2, 'b'), (1, 'c')])
+    assert isinstance(res, dict)
+    assert res == {1: 'c', 2: 'b'}
+
+
+def test_dict_spilled():
+    res = build_dict(SpillLimits(max_rows=2), [(n, str(n)) for n in range(2500)] + [(1, 'x'), (2000, 'y')])
+    assert isinstance(res, SpilledDict)
+    assert len(res) == 2500
+    assert res[0] == '0'
+    assert res[1] == 'x'
+    assert res[2] == '2'
+    assert res[2000] == 'y'
+    assert 2499 in res
+    assert 2500 not in res
+    with pytest.raises(KeyError):
+        res[2500]
+    assert list(res.keys()) == list(range(2500))
+
+
+def test_limits():
+    assert get_spill_limits(parse_function_definition('def foo() -> List[Tuple]: ...')) is None
+    assert get_spill_limits(parse_function_definition('@spill(max_rows=10)\ndef foo() -> List[Tuple]: ...')) == SpillLimits(max_rows=10)
+    assert get_spill_limits(parse_function_definition('@spill(1, 2)\ndef foo() -> Dict[0, Tuple]: ...')) == SpillLimits(max_rows=1, max_bytes=2)
+
+
+def test_limits_errors():
+    with pytest.raises(TypeError):
+        get_spill_limits(parse_function_definition('@spill\ndef foo() -> List[Tuple]: ...'))
+
+    with pytest.raises(TypeError):
+        get_spill_limits(parse_function_definition('@spill(max_rows=10)\ndef foo() -> Iterator[Tuple]: ...'))
+
+    with pytest.raises(TypeError):
+        get_spill_limits(parse_function_definition('@spill(rows=10)\ndef foo() -> List[Tuple]: ...'))
@@ -0,0 +1,56 @@
+import pytest
+
+from aesqlapius.cache import CacheSettings
+from aesqlapius.sqlitecache import SqliteCacheStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache.sqlite')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    class Clock:
+        now = 1000.0
+
+    monkeypatch.setattr('aesqlapius.sqlitecache.time.time', lambda: Clock.now)
+    return Clock
+
+
+def test_shared(path):
+    # separate stores emulate separate processes
+    writer = SqliteCacheStore(path).create_backend('foo', CacheSettings())
+    reader = SqliteCacheStore(path).create_backend('foo', CacheSettings())
+    other = SqliteCacheStore(path).create_backend('bar', CacheSettings())
+
+    writer.put((1, 'a'), [{'a': 1}])
+    assert reader.get((1, 'a')) == (True, [{'a': 1}])
+    assert reader.get((2, 'a')) == (False, None)
+    assert other.get((1, 'a')) == (False, None)
+    assert len(reader) == 1
+
+    reader.clear()
+    assert writer.get((1, 'a')) == (False, None)
+
+
+def test_eviction(path, clock):
+    backend = SqliteCacheStore(path).create_backend('foo', CacheSettings(maxsize=2))
+    for key in range(3):
+        clock.now += 1
+        backend.put(key, str(key))
+
+    assert backend.get(0) == (False, None)
+    assert backend.get(1) == (True, '1')
+    assert backend.get(2) == (True, '2')
+    assert len(backend) == 2
+
+
+def test_ttl(path, clock):
+    backend = SqliteCacheStore(path).create_backend('foo', CacheSettings(ttl=10))
+    backend.put(1, 'a')
+    clock.now += 9
+    assert backend.get(1) == (True, 'a')
+    clock.now += 1
+    assert backend.get(1) == (False, None)
+    assert len(backend) == 0
@@ -0,0 +1,34 @@
+import pytest
+
+from aesqlapius.function_def import parse_function_definition
+from aesqlapius.staging import (
+    StageSettings,
+    get_stage_settings,
+    iter_stage_rows
+)
+
+
+def test_settings():
+    assert get_stage_settings(parse_function_definition('def foo(ids) -> None: ...')) is None
+    assert get_stage_settings(parse_function_definition('@stage("ids", "t", {"id": "int"})\ndef foo(ids) -> None: ...')) == StageSettings('ids', 't', {'id': 'int'})
+
+
+def test_settings_errors():
+    with pytest.raises(TypeError):
+        get_stage_settings(parse_function_definition('@stage("other", "t", {"id": "int"})\ndef foo(ids) -> None: ...'))
+    with pytest.raises(TypeError):
+        get_stage_settings(parse_function_definition('@stage("ids", "t", {})\ndef foo(ids) -> None: ...'))
+    with pytest.raises(TypeError):
+        get_stage_settings(parse_function_definition('@stage("ids", "t", {"id": "int"})\ndef foo(ids, after) -> Pages[0, Tuple]: ...'))
+
+
+def test_statements():
+    settings = StageSettings('ids', 't', {'id': 'int', 'name': 'text'})
+    assert settings.create_statement == 'CREATE TEMPORARY TABLE IF NOT EXISTS t (id int, name text)'
+    assert settings.clear_statement == 'DELETE FROM t'
+    assert settings.get_insert_statement('?') == 'INSERT INTO t (id, name) VALUES (?, ?)'
+
+
+def test_rows():
+    assert list(iter_stage_rows(StageSettings('ids', 't', {'id': 'int'}), [1, 2])) == [(1,), (2,)]
+    assert list(iter_stage_rows(StageSettings('ids', 't', {'id': 'int', 'name': 'text'}), [[1, 'a']])) == [(1, 'a')]
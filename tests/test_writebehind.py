@@ -0,0 +1,206 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from aesqlapius import generate_api
+from aesqlapius.function_def import parse_function_definition
+from aesqlapius.writebehind import (
+    WriteBehindSettings,
+    generate_write_behind_method,
+    get_write_behind_settings
+)
+
+from .fixtures import *  # noqa
+
+
+@pytest.fixture
+def func_def():
+    return parse_function_definition('@write_behind\ndef foo(a, b=2) -> None: ...')
+
+
+def test_settings():
+    assert get_write_behind_settings(parse_function_definition('def foo() -> None: ...')) is None
+    assert get_write_behind_settings(parse_function_definition('@write_behind\ndef foo() -> None: ...')) == WriteBehindSettings()
+    assert get_write_behind_settings(parse_function_definition('@write_behind(10, max_queue=20)\ndef foo() -> None: ...')) == WriteBehindSettings(max_batch=10, max_queue=20)
+
+
+def test_settings_errors():
+    with pytest.raises(TypeError):
+        get_write_behind_settings(parse_function_definition('@write_behind\ndef foo() -> List[Tuple]: ...'))
+    with pytest.raises(TypeError):
+        get_write_behind_settings(parse_function_definition('@write_behind(max_batch=0)\ndef foo() -> None: ...'))
+
+
+def test_sync(func_def):
+    batches = []
+
+    def method_many(batch, page_size):
+        batches.append(list(batch))
+
+    method, flush, stop = generate_write_behind_method(func_def, WriteBehindSettings(max_batch=2, max_delay=10), method_many, False)
+
+    futures = [method(1), method(a=3, b=4), method(5)]
+    flush()
+
+    assert all(future.result() is None for future in futures)
+    assert batches == [[{'a': 1, 'b': 2}, {'a': 3, 'b': 4}], [{'a': 5, 'b': 2}]]
+
+
+def test_sync_error(func_def):
+    def method_many(batch, page_size):
+        raise RuntimeError('failed')
+
+    method, flush, stop = generate_write_behind_method(func_def, WriteBehindSettings(), method_many, False)
+
+    future = method(1)
+    flush()
+
+    with pytest.raises(RuntimeError):
+        future.result()
+
+
+def test_sync_error_per_call(func_def):
+    batches = []
+
+    def method_many(batch, page_size):
+        batches.append([args['a'] for args in batch])
+        if any(args['a'] < 0 for args in batch):
+            raise ValueError('negative')
+
+    method, flush, stop = generate_write_behind_method(func_def, WriteBehindSettings(max_delay=10), method_many, False)
+
+    futures = [method(1), method(-1), method(2)]
+    flush()
+
+    assert futures[0].result() is None
+    with pytest.raises(ValueError):
+        futures[1].result()
+    assert futures[2].result() is None
+
+    # failed batch is retried row by row
+    assert batches == [[1, -1, 2], [1], [-1], [2]]
+
+
+def test_sync_stop(func_def):
+    threads = set(threading.enumerate())
+    batches = []
+
+    def method_many(batch, page_size):
+        batches.append(list(batch))
+
+    method, flush, stop = generate_write_behind_method(func_def, WriteBehindSettings(max_delay=10), method_many, False)
+
+    future = method(1)
+    stop()
+    assert future.result() is None
+    assert set(threading.enumerate()) <= threads
+
+    # writer is restarted on demand
+    method(2)
+    stop()
+    assert batches == [[{'a': 1, 'b': 2}], [{'a': 2, 'b': 2}]]
+
+
+def test_sync_backpressure(func_def):
+    release = threading.Event()
+
+    def method_many(batch, page_size):
+        release.wait()
+
+    method, flush, stop = generate_write_behind_method(func_def, WriteBehindSettings(max_batch=1, max_queue=1), method_many, False)
+
+    method(1)  # taken by the writer thread which blocks
+    method(2)  # fills the queue
+
+    thread = threading.Thread(target=method, args=(3,))
+    thread.start()
+    thread.join(0.1)
+    assert thread.is_alive()  # blocked by full queue
+
+    release.set()
+    thread.join()
+    flush()
+
+
+@pytest.mark.asyncio
+async def test_async(func_def):
+    batches = []
+
+    async def method_many(batch, page_size):
+        batches.append(list(batch))
+
+    method, flush, stop = generate_write_behind_method(func_def, WriteBehindSettings(max_batch=2, max_delay=10), method_many, True)
+
+    futures = [await method(1), await method(a=3, b=4), await method(5)]
+    await flush()
+
+    assert await asyncio.gather(*futures) == [None, None, None]
+    assert batches == [[{'a': 1, 'b': 2}, {'a': 3, 'b': 4}], [{'a': 5, 'b': 2}]]
+
+
+@pytest.mark.asyncio
+async def test_async_delay(func_def):
+    batches = []
+
+    async def method_many(batch, page_size):
+        batches.append(list(batch))
+
+    method, flush, stop = generate_write_behind_method(func_def, WriteBehindSettings(max_delay=0.01), method_many, True)
+
+    await (await method(1))
+    assert batches == [[{'a': 1, 'b': 2}]]
+
+
+@pytest.mark.asyncio
+async def test_async_error(func_def):
+    async def method_many(batch, page_size):
+        raise RuntimeError('failed')
+
+    method, flush, stop = generate_write_behind_method(func_def, WriteBehindSettings(), method_many, True)
+
+    future = await method(1)
+    await flush()
+
+    with pytest.raises(RuntimeError):
+        await future
+
+
+@pytest.mark.asyncio
+async def test_async_error_per_call(func_def):
+    async def method_many(batch, page_size):
+        if any(args['a'] < 0 for args in batch):
+            raise ValueError('negative')
+
+    method, flush, stop = generate_write_behind_method(func_def, WriteBehindSettings(max_delay=10), method_many, True)
+
+    futures = [await method(1), await method(-1)]
+    await flush()
+
+    assert await futures[0] is None
+    with pytest.raises(ValueError):
+        await futures[1]
+
+    await stop()
+
+
+@pytest.mark.asyncio
+async def test_async_stop(func_def):
+    batches = []
+
+    async def method_many(batch, page_size):
+        batches.append(list(batch))
+
+    method, flush, stop = generate_write_behind_method(func_def, WriteBehindSettings(max_delay=10), method_many, True)
+
+    future = await method(1)
+    await stop()
+    assert future.done()
+    assert batches == [[{'a': 1, 'b': 2}]]
+    assert not [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+
+def test_connection_pool_required(queries_dir):
+    with pytest.raises(TypeError):
+        generate_api(queries_dir / 'writebehind.sql', 'sqlite3', sqlite3.connect(':memory:'))